@@ -0,0 +1,144 @@
+import asyncio
+import itertools
+import logging
+from collections import deque
+from collections.abc import AsyncIterator
+
+from agents.openclaw_client import AsyncOpenClawClient
+
+logger = logging.getLogger(__name__)
+
+
+class _AgentTail:
+    def __init__(self, agent_id: str, max_lines: int):
+        self.agent_id = agent_id
+        self.lines: deque[str] = deque(maxlen=max_lines)
+        self.next_offset = 0
+        self.resets = 0
+        self.viewers = 0
+        self.changed = asyncio.Condition()
+        self.primed = asyncio.Event()
+        self.task: asyncio.Task | None = None
+
+    @property
+    def first_offset(self) -> int:
+        return self.next_offset - len(self.lines)
+
+    def read_from(self, offset: int) -> tuple[int, list[str]]:
+        start = min(max(offset, self.first_offset), self.next_offset)
+        return start, list(
+            itertools.islice(self.lines, start - self.first_offset, None)
+        )
+
+
+class LogTailHub:
+    """Multiplexes log viewers of one agent onto a single upstream poller.
+
+    Each tailed agent gets one background task that asks the gateway only for
+    lines past the last offset it has seen and appends them to a bounded ring.
+    Viewers read from the ring at their own cursor and wait on a condition for
+    new lines; the poller stops once the last viewer leaves. When the upstream
+    log shrinks (rotated or truncated), the ring is cleared and viewers
+    restart from the new position.
+    """
+
+    def __init__(
+        self,
+        gateway: AsyncOpenClawClient,
+        poll_interval: float = 1.0,
+        max_lines: int = 5000,
+        heartbeat: float = 15.0,
+    ):
+        self.gateway = gateway
+        self.poll_interval = poll_interval
+        self.max_lines = max_lines
+        self.heartbeat = heartbeat
+        self._tails: dict[str, _AgentTail] = {}
+
+    @property
+    def upstreams(self) -> int:
+        return len(self._tails)
+
+    @property
+    def viewers(self) -> int:
+        return sum(t.viewers for t in self._tails.values())
+
+    async def _poll(self, tail: _AgentTail):
+        while True:
+            try:
+                lines, next_offset = await self.gateway.get_agent_logs_since(
+                    tail.agent_id, tail.next_offset
+                )
+                if next_offset < tail.next_offset:
+                    tail.lines.clear()
+                    tail.resets += 1
+                if lines or next_offset != tail.next_offset:
+                    tail.lines.extend(lines)
+                    tail.next_offset = next_offset
+                    async with tail.changed:
+                        tail.changed.notify_all()
+            except Exception:
+                logger.exception("log poll for agent %s failed", tail.agent_id)
+            finally:
+                # Viewers block on ``primed``; a failed poll must not strand them.
+                tail.primed.set()
+            await asyncio.sleep(self.poll_interval)
+
+    def _acquire(self, agent_id: str) -> _AgentTail:
+        tail = self._tails.get(agent_id)
+        if tail is None:
+            tail = self._tails[agent_id] = _AgentTail(agent_id, self.max_lines)
+            tail.task = asyncio.create_task(self._poll(tail))
+        tail.viewers += 1
+        return tail
+
+    def _release(self, tail: _AgentTail):
+        tail.viewers -= 1
+        if tail.viewers == 0 and self._tails.get(tail.agent_id) is tail:
+            del self._tails[tail.agent_id]
+            tail.task.cancel()
+
+    async def subscribe(
+        self,
+        agent_id: str,
+        cursor: int | None = None,
+        backlog: int = 100,
+        follow: bool = True,
+    ) -> AsyncIterator[tuple[int, str] | None]:
+        """Yield ``(offset, line)`` pairs; ``None`` marks an idle heartbeat."""
+        tail = self._acquire(agent_id)
+        try:
+            await tail.primed.wait()
+            offset = cursor if cursor is not None else tail.next_offset - backlog
+            resets = tail.resets
+            while True:
+                if tail.resets != resets:
+                    resets = tail.resets
+                    offset = tail.first_offset
+                start, lines = tail.read_from(offset)
+                for i, line in enumerate(lines):
+                    yield start + i, line
+                offset = start + len(lines)
+                if not follow:
+                    return
+                idle = False
+                async with tail.changed:
+                    try:
+                        await asyncio.wait_for(
+                            tail.changed.wait_for(
+                                lambda: tail.next_offset > offset
+                                or tail.resets != resets
+                            ),
+                            self.heartbeat,
+                        )
+                    except asyncio.TimeoutError:
+                        idle = True
+                if idle:
+                    yield None
+        finally:
+            self._release(tail)
+
+    async def aclose(self):
+        for tail in self._tails.values():
+            tail.task.cancel()
+        self._tails.clear()
@@ -1,19 +1,110 @@
+import asyncio
 import os
+import threading
+from collections.abc import Awaitable, Callable, Sequence
 
 import httpx
 
+from circuit_breaker import STATE_CODES, CircuitBreaker
+
+gateway_breaker = CircuitBreaker(
+    failure_threshold=int(os.getenv("OPENCLAW_BREAKER_FAILURES", "5")),
+    reset_timeout=float(os.getenv("OPENCLAW_BREAKER_RESET_SEC", "30")),
+)
+gateway_stats = {"requests": 0, "failures": 0, "short_circuited": 0, "in_flight": 0}
+_stats_lock = threading.Lock()
+
+
+def _gateway_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=int(os.getenv("OPENCLAW_MAX_CONNECTIONS", "500")),
+        max_keepalive_connections=int(os.getenv("OPENCLAW_MAX_KEEPALIVE", "100")),
+        keepalive_expiry=float(os.getenv("OPENCLAW_KEEPALIVE_SEC", "30")),
+    )
+
+
+def _count(key: str, delta: int = 1):
+    with _stats_lock:
+        gateway_stats[key] += delta
+
+
+def _begin() -> bool:
+    if not gateway_breaker.allow():
+        _count("short_circuited")
+        return False
+    _count("requests")
+    _count("in_flight")
+    return True
+
+
+def _finish(resp: httpx.Response | None, abandoned: bool = False):
+    _count("in_flight", -1)
+    if abandoned:
+        # The caller went away (e.g. a client disconnect); that says nothing about the gateway.
+        gateway_breaker.record_abandoned()
+    # 4xx means the gateway is up and answered; only transport errors and 5xx trip the breaker.
+    elif resp is None or resp.status_code >= 500:
+        _count("failures")
+        gateway_breaker.record_failure()
+    else:
+        gateway_breaker.record_success()
+
+
+def _pool_connections(client: httpx.Client | httpx.AsyncClient | None) -> int:
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    return len(getattr(pool, "connections", ()))
+
+
+def gateway_metrics(
+    async_client: "AsyncOpenClawClient | None" = None,
+) -> dict[str, float]:
+    with _stats_lock:
+        stats = dict(gateway_stats)
+    connections = 0
+    if async_client is not None:
+        connections = _pool_connections(async_client._client)
+    return {
+        "forge_gateway_requests_total": stats["requests"],
+        "forge_gateway_failures_total": stats["failures"],
+        "forge_gateway_short_circuited_total": stats["short_circuited"],
+        "forge_gateway_in_flight": stats["in_flight"],
+        "forge_gateway_pool_connections": connections,
+        "forge_gateway_breaker_state": STATE_CODES[gateway_breaker.state],
+        "forge_gateway_breaker_opened_total": gateway_breaker.opened_total,
+    }
+
+
+_CIRCUIT_OPEN = {"status": "gateway_unavailable", "detail": "circuit open"}
+
 
 class OpenClawClient:
-    def __init__(self):
+    def __init__(self, client: httpx.Client | None = None):
         self.base_url = os.getenv("OPENCLAW_GATEWAY_URL", "http://openclaw-gateway:8001")
         self.timeout = float(os.getenv("OPENCLAW_TIMEOUT_SEC", "5"))
+        self._client = client or httpx.Client(
+            timeout=self.timeout, limits=_gateway_limits()
+        )
+
+    def close(self):
+        self._client.close()
+
+    def _request(self, method: str, path: str, **kwargs) -> httpx.Response | None:
+        if not _begin():
+            return None
+        resp = None
+        try:
+            resp = self._client.request(method, f"{self.base_url}{path}", **kwargs)
+            return resp
+        finally:
+            _finish(resp)
 
     def _post(self, path: str, payload: dict) -> dict:
         try:
-            with httpx.Client(timeout=self.timeout) as client:
-                resp = client.post(f"{self.base_url}{path}", json=payload)
-                resp.raise_for_status()
-                return resp.json()
+            resp = self._request("POST", path, json=payload)
+            if resp is None:
+                return dict(_CIRCUIT_OPEN)
+            resp.raise_for_status()
+            return resp.json()
         except Exception as exc:
             return {"status": "gateway_unavailable", "detail": str(exc)}
 
@@ -31,10 +122,135 @@ class OpenClawClient:
 
     def get_agent_logs(self, agent_id: str) -> list[str]:
         try:
-            with httpx.Client(timeout=self.timeout) as client:
-                resp = client.get(f"{self.base_url}/agents/{agent_id}/logs")
-                resp.raise_for_status()
-                data = resp.json()
-                return data.get("logs", [])
+            resp = self._request("GET", f"/agents/{agent_id}/logs")
+            if resp is None:
+                return []
+            resp.raise_for_status()
+            data = resp.json()
+            return data.get("logs", [])
+        except Exception:
+            return []
+
+
+class AsyncOpenClawClient:
+    """Non-blocking gateway client sharing one keep-alive pool per process."""
+
+    def __init__(self, client: httpx.AsyncClient | None = None):
+        self.base_url = os.getenv(
+            "OPENCLAW_GATEWAY_URL", "http://openclaw-gateway:8001"
+        )
+        self.timeout = float(os.getenv("OPENCLAW_TIMEOUT_SEC", "5"))
+        self._client = client or httpx.AsyncClient(
+            timeout=self.timeout, limits=_gateway_limits()
+        )
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    async def _request(self, method: str, path: str, **kwargs) -> httpx.Response | None:
+        if not _begin():
+            return None
+        resp = None
+        abandoned = False
+        try:
+            resp = await self._client.request(
+                method, f"{self.base_url}{path}", **kwargs
+            )
+            return resp
+        except asyncio.CancelledError:
+            abandoned = True
+            raise
+        finally:
+            _finish(resp, abandoned)
+
+    async def _post(self, path: str, payload: dict) -> dict:
+        try:
+            resp = await self._request("POST", path, json=payload)
+            if resp is None:
+                return dict(_CIRCUIT_OPEN)
+            resp.raise_for_status()
+            return resp.json()
+        except Exception as exc:
+            return {"status": "gateway_unavailable", "detail": str(exc)}
+
+    async def spawn_agent(self, agent_id: str, agent_type: str, config: dict) -> dict:
+        return await self._post(
+            "/agents/spawn",
+            {"agent_id": agent_id, "agent_type": agent_type, "config": config},
+        )
+
+    async def pause_agent(self, agent_id: str) -> dict:
+        return await self._post(f"/agents/{agent_id}/pause", {})
+
+    async def kill_agent(self, agent_id: str) -> dict:
+        return await self._post(f"/agents/{agent_id}/kill", {})
+
+    @staticmethod
+    async def _fan_out(
+        calls: Sequence[Callable[[], Awaitable[dict]]], concurrency: int
+    ) -> list[dict]:
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def _run(call):
+            async with semaphore:
+                return await call()
+
+        return await asyncio.gather(*(_run(call) for call in calls))
+
+    async def spawn_many(
+        self, specs: Sequence[tuple[str, str, dict]], concurrency: int
+    ) -> list[dict]:
+        return await self._fan_out(
+            [lambda s=spec: self.spawn_agent(*s) for spec in specs], concurrency
+        )
+
+    async def pause_many(
+        self, agent_ids: Sequence[str], concurrency: int
+    ) -> list[dict]:
+        return await self._fan_out(
+            [lambda a=agent_id: self.pause_agent(a) for agent_id in agent_ids],
+            concurrency,
+        )
+
+    async def kill_many(self, agent_ids: Sequence[str], concurrency: int) -> list[dict]:
+        return await self._fan_out(
+            [lambda a=agent_id: self.kill_agent(a) for agent_id in agent_ids],
+            concurrency,
+        )
+
+    async def get_agent_logs(self, agent_id: str) -> list[str]:
+        try:
+            resp = await self._request("GET", f"/agents/{agent_id}/logs")
+            if resp is None:
+                return []
+            resp.raise_for_status()
+            data = resp.json()
+            return data.get("logs", [])
         except Exception:
             return []
+
+    async def get_agent_logs_since(
+        self, agent_id: str, offset: int
+    ) -> tuple[list[str], int]:
+        """Fetch log lines from ``offset`` on, returning them with the next offset.
+
+        Gateways that understand ``?offset=`` answer with ``next_offset`` and only
+        the new lines; older ones return the whole list, which is sliced here.
+        """
+        try:
+            resp = await self._request(
+                "GET", f"/agents/{agent_id}/logs", params={"offset": offset}
+            )
+            if resp is None:
+                return [], offset
+            resp.raise_for_status()
+            data = resp.json()
+            logs = list(data.get("logs", []))
+            if "next_offset" in data:
+                return logs, int(data["next_offset"])
+        except Exception:
+            return [], offset
+        if len(logs) < offset:
+            # Log was rotated/truncated upstream; resume from its new end.
+            return [], len(logs)
+        return logs[offset:], len(logs)
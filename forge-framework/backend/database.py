@@ -1,7 +1,10 @@
-from collections.abc import Mapping, Sequence
+from collections.abc import Callable, Mapping, Sequence
 
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, func, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import Session, declarative_base, sessionmaker
+from sqlalchemy.sql import ColumnCollection
 
 from config import get_settings
 
@@ -11,6 +14,86 @@ engine = create_engine(settings.database_url, future=True)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+_ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+
+def async_database_url(url: str) -> str:
+    parsed = make_url(url)
+    driver = _ASYNC_DRIVERS.get(parsed.drivername, parsed.drivername)
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+async_engine = create_async_engine(
+    settings.async_database_url or async_database_url(settings.database_url)
+)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
+
+
+def days_between(dialect_name: str, later, earlier):
+    """SQL expression for the fractional number of days from ``earlier`` to ``later``."""
+    if dialect_name == "sqlite":
+        return func.julianday(later) - func.julianday(earlier)
+    return func.extract("epoch", later - earlier) / 86400.0
+
+
+def _conflict_insert(db: Session, model):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"ON CONFLICT inserts are not supported on {dialect}")
+    return insert(model)
+
+
+def insert_ignoring_conflicts(db: Session, model, rows: Sequence[Mapping[str, object]]):
+    """``INSERT ... ON CONFLICT DO NOTHING`` for the session's dialect.
+
+    The result's ``rowcount`` is the number of rows actually inserted.
+    """
+    return db.execute(
+        _conflict_insert(db, model).values(list(rows)).on_conflict_do_nothing()
+    )
+
+
+def upsert(
+    db: Session,
+    model,
+    rows: Sequence[Mapping[str, object]],
+    keys: Sequence[str],
+    update: Callable[[ColumnCollection, ColumnCollection], Mapping[str, object]],
+    batch_size: int = 500,
+):
+    """``INSERT ... ON CONFLICT (keys) DO UPDATE`` for the session's dialect.
+
+    ``update(table_columns, excluded)`` returns the ``SET`` clause, so callers
+    can merge the proposed row into the stored one (e.g. add counters).
+    Rows are sent ``batch_size`` at a time to stay under bind-parameter limits.
+
+    Conflicting rows are locked in ``VALUES`` order until commit, so rows are
+    sorted by ``keys`` first: concurrent upserts touching the same keys then
+    lock them in the same order and cannot deadlock each other.
+    """
+    columns = model.__table__.c
+    rows = sorted(rows, key=lambda row: tuple(row[k] for k in keys))
+    for start in range(0, len(rows), batch_size):
+        stmt = _conflict_insert(db, model).values(
+            list(rows[start : start + batch_size])
+        )
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=keys, set_=update(columns, stmt.excluded)
+            )
+        )
+
 
 def get_db():
     db = SessionLocal()
@@ -20,6 +103,11 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 def execute_safe_query(
     db: Session, query: str, params: Mapping[str, object] | None = None
 ) -> Sequence[object]:
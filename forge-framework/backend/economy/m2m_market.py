@@ -1,8 +1,64 @@
-from datetime import datetime, timedelta
+from collections.abc import Sequence
+from datetime import datetime
 
+from sqlalchemy import case, func, select, update
 from sqlalchemy.orm import Session
 
-from models import Agent, AgentBudget, Trade
+from database import insert_ignoring_conflicts, upsert
+from economy.market_rollups import record_trade_candles
+from economy.pricing import price_engine, record_trade_flow
+from economy.trade_ledger import agent_trades, record_trade_stats
+from models import Agent, AgentBudget, AgentSpendBucket, Trade
+
+DAY_HOURS = 24
+WEEK_HOURS = 7 * 24
+_EPOCH = datetime(1970, 1, 1)
+
+TRADE_FIELDS = (
+    "id",
+    "buyer_agent",
+    "seller_agent",
+    "resource_type",
+    "amount",
+    "price",
+    "status",
+    "escrow_tx",
+    "created_at",
+    "completed_at",
+)
+TRADE_DEFAULT_FIELDS = TRADE_FIELDS[:7]
+
+
+def hour_index(at: datetime) -> int:
+    """Whole hours since the Unix epoch; identifies a spend bucket."""
+    return int((at - _EPOCH).total_seconds() // 3600)
+
+
+def migrate_budget_windows(db: Session, chunk_size: int = 1000) -> int:
+    """Move every budget still on fixed reset windows onto the hourly ring.
+
+    Unconverted rows are otherwise converted on first use; this does them
+    all up front, committing every ``chunk_size`` rows.
+    """
+    svc = M2MMarketService(db)
+    hour = hour_index(datetime.utcnow())
+    converted = 0
+    while True:
+        ids = (
+            db.execute(
+                select(AgentBudget.agent_id)
+                .where(AgentBudget.window_hour.is_(None))
+                .limit(chunk_size)
+            )
+            .scalars()
+            .all()
+        )
+        if not ids:
+            return converted
+        for agent_id in ids:
+            svc._advance_window(agent_id, hour)
+        db.commit()
+        converted += len(ids)
 
 
 class M2MMarketService:
@@ -11,53 +67,293 @@ class M2MMarketService:
 
     @staticmethod
     def quote(resource: str, amount: float) -> float:
-        base = {
-            "compute": 0.04,
-            "energy": 0.01,
-            "data": 0.02,
-            "api_call": 0.03,
-            "storage": 0.015,
-        }.get(resource, 0.05)
-        return round(base * amount, 6)
+        return round(price_engine.unit_price(resource) * amount, 6)
 
     def _ensure_budget(self, agent_id: str) -> AgentBudget:
         budget = self.db.query(AgentBudget).filter(AgentBudget.agent_id == agent_id).first()
         if budget:
             return budget
-        budget = AgentBudget(agent_id=agent_id)
+        budget = AgentBudget(
+            agent_id=agent_id, window_hour=hour_index(datetime.utcnow())
+        )
         self.db.add(budget)
         self.db.commit()
         self.db.refresh(budget)
         return budget
 
-    def _refresh_budget_windows(self, budget: AgentBudget):
-        now = datetime.utcnow()
-        if now - budget.last_reset_daily >= timedelta(days=1):
-            budget.spent_today = 0
-            budget.last_reset_daily = now
-        if now - budget.last_reset_weekly >= timedelta(days=7):
-            budget.spent_this_week = 0
-            budget.last_reset_weekly = now
+    def _spent_between(self, agent_id, after_hour, through_hour):
+        return (
+            select(func.coalesce(func.sum(AgentSpendBucket.amount), 0.0))
+            .where(
+                AgentSpendBucket.agent_id == agent_id,
+                AgentSpendBucket.hour > after_hour,
+                AgentSpendBucket.hour <= through_hour,
+            )
+            .scalar_subquery()
+        )
+
+    def _advanced_sums(self, agent_id, start, hour: int) -> dict[str, object]:
+        """``SET`` values sliding the spend sums from window hour ``start`` to ``hour``.
+
+        ``agent_id`` and ``start`` may be columns of the row being updated, so
+        the same expressions serve the single-row and set-based advances.
+        """
+        values: dict[str, object] = {"window_hour": hour}
+        for column, span in (
+            ("spent_today", DAY_HOURS),
+            ("spent_this_week", WEEK_HOURS),
+        ):
+            left = getattr(AgentBudget, column) - self._spent_between(
+                agent_id, start - span, hour - span
+            )
+            expired = hour - start >= span
+            if isinstance(expired, bool):
+                values[column] = 0.0 if expired else case((left > 0, left), else_=0.0)
+            else:
+                values[column] = case((expired, 0.0), (left > 0, left), else_=0.0)
+        return values
+
+    def _advance_window(self, agent_id: str, hour: int) -> int | None:
+        """Slide ``agent_id``'s 24h/7d spend sums forward to ``hour``; returns the window hour.
+
+        ``spent_today``/``spent_this_week`` are kept equal to the sum of the
+        hourly buckets inside each window, so moving the window only
+        subtracts the buckets that fell out of it. That is one indexed read
+        of at most the elapsed hours, and nothing at all within the same
+        hour. The ``window_hour`` compare-and-swap makes concurrent advances
+        subtract each bucket exactly once. Returns ``None`` without a budget row.
+        """
+        while True:
+            row = self.db.execute(
+                select(
+                    AgentBudget.window_hour,
+                    AgentBudget.spent_today,
+                    AgentBudget.spent_this_week,
+                    AgentBudget.last_reset_daily,
+                    AgentBudget.last_reset_weekly,
+                ).where(AgentBudget.agent_id == agent_id)
+            ).one_or_none()
+            if row is None:
+                return None
+            start = row.window_hour
+            if start is None:
+                self._convert_legacy_budget(agent_id, row, hour)
+                continue
+            if start >= hour:
+                return start
+
+            swapped = self.db.execute(
+                update(AgentBudget)
+                .where(
+                    AgentBudget.agent_id == agent_id, AgentBudget.window_hour == start
+                )
+                .values(**self._advanced_sums(agent_id, start, hour))
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if swapped:
+                return hour
+
+    def _advance_windows(self, agent_ids: set[str], hour: int):
+        """Slide every budget in ``agent_ids`` forward to ``hour`` in one statement.
+
+        The set-based form of :meth:`_advance_window`: each row's buckets
+        are read through a correlated subquery on its own ``window_hour``, and
+        rows already at ``hour`` are left alone. Only budgets still on the
+        legacy fixed windows are converted one by one.
+        """
+        self.db.execute(
+            update(AgentBudget)
+            .where(AgentBudget.agent_id.in_(agent_ids), AgentBudget.window_hour < hour)
+            .values(
+                **self._advanced_sums(
+                    AgentBudget.agent_id, AgentBudget.window_hour, hour
+                )
+            )
+            .execution_options(synchronize_session=False)
+        )
+        legacy = self.db.execute(
+            select(AgentBudget.agent_id).where(
+                AgentBudget.agent_id.in_(agent_ids), AgentBudget.window_hour.is_(None)
+            )
+        ).scalars()
+        for agent_id in legacy.all():
+            self._advance_window(agent_id, hour)
+
+    def _convert_legacy_budget(self, agent_id: str, row, hour: int):
+        """Move a pre-ring budget (fixed reset windows) onto the hourly ring.
+
+        When the spend inside a fixed window happened is unknown, so it is
+        assumed to be as recent as possible: today's spend goes into the
+        current hour, and the rest of the week's spend goes into the newest
+        hour outside the 24h window. A converted row never allows more spend
+        than the fixed windows did.
+        """
+        today = (
+            row.spent_today
+            if hour_index(row.last_reset_daily) > hour - DAY_HOURS
+            else 0.0
+        )
+        week = (
+            row.spent_this_week
+            if hour_index(row.last_reset_weekly) > hour - WEEK_HOURS
+            else 0.0
+        )
+        older = max(week - today, 0.0)
+        converted = self.db.execute(
+            update(AgentBudget)
+            .where(AgentBudget.agent_id == agent_id, AgentBudget.window_hour.is_(None))
+            .values(window_hour=hour, spent_today=today, spent_this_week=today + older)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if converted:
+            if today:
+                self._add_spend(agent_id, hour, today)
+            if older:
+                self._add_spend(agent_id, hour - DAY_HOURS, older)
+
+    def _add_spend(self, agent_id: str, hour: int, amount: float):
+        """Add ``amount`` to the ring slot for ``hour``, recycling the slot from a week ago."""
+        upsert(
+            self.db,
+            AgentSpendBucket,
+            [
+                {
+                    "agent_id": agent_id,
+                    "slot": hour % WEEK_HOURS,
+                    "hour": hour,
+                    "amount": amount,
+                }
+            ],
+            ["agent_id", "slot"],
+            lambda c, new: {
+                "amount": case(
+                    (c.hour == new.hour, c.amount + new.amount), else_=new.amount
+                ),
+                "hour": new.hour,
+            },
+        )
+
+    def _consume_budget(self, agent_id: str, price: float, now: datetime) -> bool:
+        """Atomically spend ``price`` from ``agent_id``'s budget if both rolling limits allow it.
+
+        After the window is advanced, one conditional ``UPDATE`` checks both
+        limits and adds the spend, pinned to the window hour so it cannot
+        race a concurrent advance. Concurrent trades can therefore never
+        overspend. The spend is then added to the current hourly bucket. A
+        missing budget row is created with defaults first.
+        """
+        hour = hour_index(now)
+        while True:
+            window = self._advance_window(agent_id, hour)
+            if window is None:
+                insert_ignoring_conflicts(
+                    self.db, AgentBudget, [{"agent_id": agent_id, "window_hour": hour}]
+                )
+                continue
+            spent = self.db.execute(
+                update(AgentBudget)
+                .where(
+                    AgentBudget.agent_id == agent_id,
+                    AgentBudget.window_hour == window,
+                    AgentBudget.spent_today + price <= AgentBudget.daily_limit,
+                    AgentBudget.spent_this_week + price <= AgentBudget.weekly_limit,
+                )
+                .values(
+                    spent_today=AgentBudget.spent_today + price,
+                    spent_this_week=AgentBudget.spent_this_week + price,
+                )
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if spent:
+                self._add_spend(agent_id, window, price)
+                return True
+            current = self.db.execute(
+                select(AgentBudget.window_hour).where(AgentBudget.agent_id == agent_id)
+            ).scalar()
+            if current == window:
+                return False
+
+    def _budget_rejection(self, agent_id: str, price: float) -> str:
+        row = self.db.execute(
+            select(AgentBudget.spent_today, AgentBudget.daily_limit).where(
+                AgentBudget.agent_id == agent_id
+            )
+        ).one()
+        if row.spent_today + price > row.daily_limit:
+            return "daily budget exceeded"
+        return "weekly budget exceeded"
+
+    def reserve_budget(self, agent_id: str, amount: float, now: datetime):
+        """Spend ``amount`` from ``agent_id``'s budget up front, e.g. for an order.
+
+        Raises ``ValueError`` with the rejection reason when a limit would be
+        exceeded. Whatever the order does not end up spending is handed back
+        with :meth:`release_budget`.
+        """
+        if not self._consume_budget(agent_id, amount, now):
+            reason = self._budget_rejection(agent_id, amount)
+            self.db.rollback()
+            raise ValueError(reason)
+        self.db.commit()
+
+    def release_budget(self, agent_id: str, amount: float, reserved_at: datetime):
+        """Hand back ``amount`` of a reservation made at ``reserved_at``.
+
+        The refund comes out of the hourly bucket the reservation went into,
+        and out of each rolling sum that still covers that hour. Once the
+        bucket has been recycled there is nothing left to refund.
+        """
+        hour = hour_index(reserved_at)
+        while True:
+            window = self._advance_window(agent_id, hour_index(datetime.utcnow()))
+            if window is None or hour <= window - WEEK_HOURS:
+                return
+            values = {}
+            for column, span in (
+                ("spent_today", DAY_HOURS),
+                ("spent_this_week", WEEK_HOURS),
+            ):
+                if hour > window - span:
+                    left = getattr(AgentBudget, column) - amount
+                    values[column] = case((left > 0, left), else_=0.0)
+            released = self.db.execute(
+                update(AgentBudget)
+                .where(
+                    AgentBudget.agent_id == agent_id, AgentBudget.window_hour == window
+                )
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if released:
+                break
+        left = AgentSpendBucket.amount - amount
+        self.db.execute(
+            update(AgentSpendBucket)
+            .where(
+                AgentSpendBucket.agent_id == agent_id,
+                AgentSpendBucket.slot == hour % WEEK_HOURS,
+                AgentSpendBucket.hour == hour,
+            )
+            .values(amount=case((left > 0, left), else_=0.0))
+            .execution_options(synchronize_session=False)
+        )
+        self.db.commit()
 
     def request_trade(
         self, buyer_agent: str, seller_agent: str, resource: str, amount: float
     ) -> Trade:
-        buyer = self.db.query(Agent).filter(Agent.agentid == buyer_agent).first()
-        seller = self.db.query(Agent).filter(Agent.agentid == seller_agent).first()
-        if not buyer or not seller:
+        found = self.db.execute(
+            select(Agent.agentid).where(Agent.agentid.in_({buyer_agent, seller_agent}))
+        ).scalars()
+        if {buyer_agent, seller_agent} - set(found):
             raise ValueError("buyer or seller agent not found")
 
+        now = datetime.utcnow()
         price = self.quote(resource, amount)
-        budget = self._ensure_budget(buyer_agent)
-        self._refresh_budget_windows(budget)
-
-        if budget.spent_today + price > budget.daily_limit:
-            raise ValueError("daily budget exceeded")
-        if budget.spent_this_week + price > budget.weekly_limit:
-            raise ValueError("weekly budget exceeded")
-
-        budget.spent_today += price
-        budget.spent_this_week += price
+        if not self._consume_budget(buyer_agent, price, now):
+            reason = self._budget_rejection(buyer_agent, price)
+            self.db.rollback()
+            raise ValueError(reason)
 
         trade = Trade(
             buyer_agent=buyer_agent,
@@ -67,22 +363,144 @@ class M2MMarketService:
             price=price,
             status="requested",
         )
-        self.db.add(trade)
+        self._insert_trades([trade])
         self.db.commit()
         self.db.refresh(trade)
         return trade
 
-    def list_trades_for_agent(self, agent_id: str) -> list[Trade]:
-        return (
-            self.db.query(Trade)
-            .filter((Trade.buyer_agent == agent_id) | (Trade.seller_agent == agent_id))
-            .order_by(Trade.id.desc())
-            .all()
+    def _insert_trades(
+        self, trades: list[Trade], taker_sides: Sequence[str] | None = None
+    ):
+        """Single write path for new trades; flushes so ids are assigned.
+
+        Per-agent aggregates and market candles are updated in the same
+        transaction, and each trade is queued as flow for the pricing engine,
+        buyer-initiated unless ``taker_sides`` says otherwise.
+        """
+        self.db.add_all(trades)
+        self.db.flush()
+        record_trade_stats(self.db, trades)
+        record_trade_candles(self.db, trades)
+        for i, trade in enumerate(trades):
+            side = taker_sides[i] if taker_sides is not None else "buy"
+            record_trade_flow(self.db, trade.resource_type, trade.amount, side)
+
+    def request_trades_batch(
+        self, specs: Sequence[tuple[str, str, str, float]]
+    ) -> list[dict]:
+        """Validate, budget and insert ``(buyer, seller, resource, amount)`` trades in one transaction.
+
+        Agents and budgets are each loaded with one ``IN`` query and trades are
+        planned in order against the running budget, so a later trade sees the
+        spend of earlier accepted ones. Each buyer's planned total is then
+        consumed with one conditional ``UPDATE``; if a concurrent writer got
+        there first, that buyer's trades fall back to one conditional update
+        each. Each result is the serialised trade or ``{"error": ...}``.
+        """
+        now = datetime.utcnow()
+        agent_ids = {a for buyer, seller, _, _ in specs for a in (buyer, seller)}
+        known = set(
+            self.db.execute(
+                select(Agent.agentid).where(Agent.agentid.in_(agent_ids))
+            ).scalars()
         )
+        buyers = {buyer for buyer, _, _, _ in specs if buyer in known}
+        hour = hour_index(now)
+        if buyers:
+            insert_ignoring_conflicts(
+                self.db,
+                AgentBudget,
+                [{"agent_id": b, "window_hour": hour} for b in buyers],
+            )
+            self._advance_windows(buyers, hour)
+        running = {
+            row.agent_id: [
+                row.spent_today,
+                row.spent_this_week,
+                row.daily_limit,
+                row.weekly_limit,
+            ]
+            for row in self.db.execute(
+                select(
+                    AgentBudget.agent_id,
+                    AgentBudget.spent_today,
+                    AgentBudget.spent_this_week,
+                    AgentBudget.daily_limit,
+                    AgentBudget.weekly_limit,
+                ).where(AgentBudget.agent_id.in_(buyers))
+            )
+        }
+
+        results: list[dict | Trade] = []
+        planned: dict[str, list[int]] = {}
+        for buyer, seller, resource, amount in specs:
+            if buyer not in known or seller not in known:
+                results.append({"error": "buyer or seller agent not found"})
+                continue
+            price = self.quote(resource, amount)
+            budget = running[buyer]
+            if budget[0] + price > budget[2]:
+                results.append({"error": "daily budget exceeded"})
+                continue
+            if budget[1] + price > budget[3]:
+                results.append({"error": "weekly budget exceeded"})
+                continue
+            budget[0] += price
+            budget[1] += price
+            planned.setdefault(buyer, []).append(len(results))
+            results.append(
+                Trade(
+                    buyer_agent=buyer,
+                    seller_agent=seller,
+                    resource_type=resource,
+                    amount=amount,
+                    price=price,
+                    status="requested",
+                    created_at=now,
+                )
+            )
+
+        for buyer, slots in planned.items():
+            if self._consume_budget(buyer, sum(results[i].price for i in slots), now):
+                continue
+            for i in slots:
+                price = results[i].price
+                if not self._consume_budget(buyer, price, now):
+                    results[i] = {"error": self._budget_rejection(buyer, price)}
+
+        trades = [r for r in results if isinstance(r, Trade)]
+        if trades:
+            self._insert_trades(trades)
+        serialized = [r if isinstance(r, dict) else self._serialize(r) for r in results]
+        self.db.commit()
+        return serialized
+
+    @staticmethod
+    def _serialize(trade: Trade) -> dict:
+        return {
+            "id": trade.id,
+            "buyer_agent": trade.buyer_agent,
+            "seller_agent": trade.seller_agent,
+            "resource_type": trade.resource_type,
+            "amount": trade.amount,
+            "price": trade.price,
+            "status": trade.status,
+        }
+
+    def list_trades_for_agent(
+        self,
+        agent_id: str,
+        limit: int | None = None,
+        before: tuple[datetime, int] | None = None,
+        fields: tuple[str, ...] | list[str] = TRADE_DEFAULT_FIELDS,
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> list[dict]:
+        return agent_trades(self.db, agent_id, fields, limit, before, since, until)
 
     def get_budget(self, agent_id: str) -> AgentBudget:
         budget = self._ensure_budget(agent_id)
-        self._refresh_budget_windows(budget)
+        self._advance_window(agent_id, hour_index(datetime.utcnow()))
         self.db.commit()
         self.db.refresh(budget)
         return budget
@@ -0,0 +1,171 @@
+from collections.abc import Iterable
+from datetime import datetime
+
+from sqlalchemy import case, delete, select, text
+from sqlalchemy.orm import Session
+
+from database import upsert
+from models import MarketCandle, Trade
+
+INTERVALS = ("1m", "1h", "1d")
+BACKFILL_CHUNK = 5000
+CANDLE_FIELDS = ("open", "high", "low", "close", "volume", "notional", "trades")
+
+
+def bucket_start(at: datetime, interval: str) -> datetime:
+    if interval == "1m":
+        return at.replace(second=0, microsecond=0)
+    if interval == "1h":
+        return at.replace(minute=0, second=0, microsecond=0)
+    if interval == "1d":
+        return at.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"interval must be one of {', '.join(INTERVALS)}")
+
+
+def _fold(
+    candles: dict[tuple, dict], resource: str, at: datetime, amount: float, price: float
+):
+    unit = price / amount
+    for interval in INTERVALS:
+        key = (resource, interval, bucket_start(at, interval))
+        c = candles.get(key)
+        if c is None:
+            candles[key] = {
+                "resource_type": resource,
+                "period": interval,
+                "bucket_start": key[2],
+                "open": unit,
+                "high": unit,
+                "low": unit,
+                "close": unit,
+                "volume": amount,
+                "notional": price,
+                "trades": 1,
+                "open_at": at,
+                "close_at": at,
+            }
+            continue
+        c["high"] = max(c["high"], unit)
+        c["low"] = min(c["low"], unit)
+        if at < c["open_at"]:
+            c["open"], c["open_at"] = unit, at
+        if at >= c["close_at"]:
+            c["close"], c["close_at"] = unit, at
+        c["volume"] += amount
+        c["notional"] += price
+        c["trades"] += 1
+
+
+def _merge(c, new) -> dict:
+    """``SET`` clause folding a pre-aggregated candle into the stored one."""
+    return {
+        "open": case((new.open_at < c.open_at, new.open), else_=c.open),
+        "open_at": case((new.open_at < c.open_at, new.open_at), else_=c.open_at),
+        "high": case((new.high > c.high, new.high), else_=c.high),
+        "low": case((new.low < c.low, new.low), else_=c.low),
+        "close": case((new.close_at >= c.close_at, new.close), else_=c.close),
+        "close_at": case((new.close_at >= c.close_at, new.close_at), else_=c.close_at),
+        "volume": c.volume + new.volume,
+        "notional": c.notional + new.notional,
+        "trades": c.trades + new.trades,
+    }
+
+
+def _apply(db: Session, candles: dict[tuple, dict]):
+    if candles:
+        upsert(
+            db,
+            MarketCandle,
+            list(candles.values()),
+            ["resource_type", "period", "bucket_start"],
+            _merge,
+        )
+
+
+def record_trade_candles(db: Session, trades: Iterable[Trade]):
+    """Roll newly inserted (flushed) trades into 1m/1h/1d candles in the caller's transaction.
+
+    ``Trade.price`` is the total for ``amount``, so candles track the unit
+    price ``price / amount``; zero-amount trades carry no price and are skipped.
+    """
+    candles: dict[tuple, dict] = {}
+    for t in trades:
+        if t.amount > 0:
+            _fold(candles, t.resource_type, t.created_at, t.amount, t.price)
+    _apply(db, candles)
+
+
+def backfill_candles(db: Session, since: datetime | None = None) -> int:
+    """Rebuild candles from ``trades``, entirely or from the day containing ``since``.
+
+    Affected candles are deleted and trades are re-rolled in id order,
+    ``BACKFILL_CHUNK`` rows per read, all in one transaction. On Postgres
+    ``market_candles`` is locked against writes first, so trades committed
+    meanwhile wait and roll in incrementally after the rebuild instead of
+    being counted by both. Returns the number of trades read.
+    """
+    start = bucket_start(since, "1d") if since is not None else None
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("LOCK TABLE market_candles IN EXCLUSIVE MODE"))
+    stmt = delete(MarketCandle)
+    if start is not None:
+        stmt = stmt.where(MarketCandle.bucket_start >= start)
+    db.execute(stmt)
+
+    last_id, processed = 0, 0
+    try:
+        while True:
+            query = select(
+                Trade.id,
+                Trade.resource_type,
+                Trade.created_at,
+                Trade.amount,
+                Trade.price,
+            ).where(Trade.id > last_id, Trade.amount > 0)
+            if start is not None:
+                query = query.where(Trade.created_at >= start)
+            rows = db.execute(query.order_by(Trade.id).limit(BACKFILL_CHUNK)).all()
+            if not rows:
+                break
+            candles: dict[tuple, dict] = {}
+            for _, resource, at, amount, price in rows:
+                _fold(candles, resource, at, amount, price)
+            _apply(db, candles)
+            last_id = rows[-1][0]
+            processed += len(rows)
+    except Exception:
+        db.rollback()
+        raise
+    db.commit()
+    return processed
+
+
+def list_candles(
+    db: Session,
+    resource: str,
+    interval: str,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    limit: int = 500,
+) -> list[dict]:
+    """Candles for ``resource`` oldest first; reads only ``market_candles``."""
+    if interval not in INTERVALS:
+        raise ValueError(f"interval must be one of {', '.join(INTERVALS)}")
+    stmt = select(MarketCandle).where(
+        MarketCandle.resource_type == resource, MarketCandle.period == interval
+    )
+    if since is not None:
+        stmt = stmt.where(MarketCandle.bucket_start >= bucket_start(since, interval))
+    if until is not None:
+        stmt = stmt.where(MarketCandle.bucket_start < until)
+    rows = db.execute(
+        stmt.order_by(MarketCandle.bucket_start.desc()).limit(limit)
+    ).scalars()
+    return [
+        {
+            "bucket_start": c.bucket_start.isoformat(),
+            **{f: getattr(c, f) for f in CANDLE_FIELDS},
+            "vwap": c.notional / c.volume if c.volume else None,
+        }
+        for c in reversed(rows.all())
+    ]
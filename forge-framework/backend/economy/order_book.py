@@ -0,0 +1,394 @@
+import heapq
+import itertools
+import logging
+import threading
+from collections import deque
+from collections.abc import Callable
+from datetime import datetime
+
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.orm import Session
+
+from economy.m2m_market import M2MMarketService
+from models import Trade
+
+RESOURCE_TYPES = ("compute", "energy", "data", "api_call", "storage")
+BUY = "buy"
+SELL = "sell"
+# Float slack when a budget-capped market order spends its last cent.
+_EPSILON = 1e-9
+
+logger = logging.getLogger(__name__)
+
+
+class Order:
+    __slots__ = (
+        "order_id",
+        "agent_id",
+        "side",
+        "price",
+        "remaining",
+        "owner",
+        "placed_at",
+        "cancelled",
+    )
+
+    def __init__(
+        self,
+        order_id: int,
+        agent_id: str,
+        side: str,
+        price: float | None,
+        quantity: float,
+        owner: str | None = None,
+        placed_at: datetime | None = None,
+    ):
+        self.order_id = order_id
+        self.agent_id = agent_id
+        self.side = side
+        self.price = price
+        self.remaining = quantity
+        self.owner = owner
+        self.placed_at = placed_at
+        self.cancelled = 0.0
+
+
+class Fill:
+    __slots__ = (
+        "resource",
+        "side",
+        "buyer",
+        "seller",
+        "quantity",
+        "price",
+        "buy_order",
+        "sell_order",
+        "at",
+    )
+
+    def __init__(
+        self, resource, side, buyer, seller, quantity, price, buy_order, sell_order, at
+    ):
+        self.resource = resource
+        self.side = side
+        self.buyer = buyer
+        self.seller = seller
+        self.quantity = quantity
+        self.price = price
+        self.buy_order = buy_order
+        self.sell_order = sell_order
+        self.at = at
+
+    @property
+    def cost(self) -> float:
+        return round(self.price * self.quantity, 6)
+
+    def as_dict(self) -> dict:
+        return {
+            "buyer_agent": self.buyer,
+            "seller_agent": self.seller,
+            "quantity": self.quantity,
+            "price": self.price,
+            "buy_order_id": self.buy_order,
+            "sell_order_id": self.sell_order,
+        }
+
+
+class _BookSide:
+    """Price levels of one side: FIFO queues keyed by price plus a heap of live prices."""
+
+    __slots__ = ("levels", "heap", "sign")
+
+    def __init__(self, sign: int):
+        self.levels: dict[float, deque[Order]] = {}
+        self.heap: list[float] = []
+        self.sign = sign
+
+    def best(self) -> tuple[float, deque[Order]] | None:
+        heap, levels = self.heap, self.levels
+        while heap:
+            price = heap[0] * self.sign
+            queue = levels.get(price)
+            if queue is not None:
+                while queue and not queue[0].remaining:
+                    queue.popleft()
+                if queue:
+                    return price, queue
+                del levels[price]
+            heapq.heappop(heap)
+        return None
+
+    def walk(self):
+        """Yield ``(price, queue)`` levels from the best price outwards.
+
+        Levels behind the best one are only sorted out of the heap when a
+        caller actually walks past it.
+        """
+        best = self.best()
+        if best is None:
+            return
+        yield best
+        for key in sorted(self.heap):
+            price = key * self.sign
+            queue = self.levels.get(price)
+            if price != best[0] and queue:
+                yield price, queue
+
+    def add(self, order: Order):
+        queue = self.levels.get(order.price)
+        if queue is None:
+            queue = self.levels[order.price] = deque()
+            heapq.heappush(self.heap, order.price * self.sign)
+        queue.append(order)
+
+    def depth(self, n: int) -> list[tuple[float, float]]:
+        out = []
+        for key in sorted(self.heap):
+            queue = self.levels.get(key * self.sign)
+            size = sum(o.remaining for o in queue) if queue else 0.0
+            if size:
+                out.append((key * self.sign, size))
+                if len(out) == n:
+                    break
+        return out
+
+
+class OrderBook:
+    """Price-time priority limit order book for one resource.
+
+    Limit orders rest at their price level in arrival order; market orders
+    and the marketable part of limit orders fill against the best opposite
+    level at the resting order's price. Resting orders of the same agent are
+    passed over, so an agent never trades with itself. Cancels and fills
+    only zero the order, and levels are cleaned up lazily when matching
+    reaches them.
+    """
+
+    def __init__(self, resource: str):
+        self.resource = resource
+        self.bids = _BookSide(-1)
+        self.asks = _BookSide(1)
+        self.orders: dict[int, Order] = {}
+
+    def match(
+        self,
+        order: Order,
+        fills: list[Fill],
+        now: datetime,
+        max_cost: float | None = None,
+    ):
+        """Fill ``order`` against the opposite side; ``max_cost`` caps what it spends."""
+        buying = order.side == BUY
+        opposite = self.asks if buying else self.bids
+        limit = order.price
+        for price, queue in opposite.walk():
+            if limit is not None and (price > limit if buying else price < limit):
+                return
+            for resting in queue:
+                if not resting.remaining or resting.agent_id == order.agent_id:
+                    continue
+                if max_cost is not None and max_cost <= _EPSILON:
+                    return
+                qty = min(order.remaining, resting.remaining)
+                if max_cost is not None:
+                    qty = min(qty, max_cost / price)
+                    max_cost -= qty * price
+                order.remaining -= qty
+                resting.remaining -= qty
+                buy, sell = (order, resting) if buying else (resting, order)
+                fills.append(
+                    Fill(
+                        self.resource,
+                        order.side,
+                        buy.agent_id,
+                        sell.agent_id,
+                        qty,
+                        price,
+                        buy.order_id,
+                        sell.order_id,
+                        now,
+                    )
+                )
+                if not resting.remaining:
+                    del self.orders[resting.order_id]
+                if order.remaining <= 0:
+                    return
+
+    def rest(self, order: Order):
+        (self.bids if order.side == BUY else self.asks).add(order)
+        self.orders[order.order_id] = order
+
+    def cancel(self, order_id: int) -> Order | None:
+        order = self.orders.pop(order_id, None)
+        if order is not None:
+            order.cancelled, order.remaining = order.remaining, 0.0
+        return order
+
+    def best_bid(self) -> float | None:
+        best = self.bids.best()
+        return best[0] if best else None
+
+    def best_ask(self) -> float | None:
+        best = self.asks.best()
+        return best[0] if best else None
+
+
+class MatchingEngine:
+    """One :class:`OrderBook` per resource with buffered fill persistence.
+
+    Fills accumulate in memory and are written to ``trades`` by
+    :meth:`flush` in batches of at most ``batch_size``, through the market
+    service's single trade insert path. Fills the database refuses outright
+    are moved to ``dead_letters`` instead of being retried forever.
+    """
+
+    def __init__(
+        self, resources: tuple[str, ...] = RESOURCE_TYPES, batch_size: int = 5000
+    ):
+        self.books = {r: OrderBook(r) for r in resources}
+        self.batch_size = batch_size
+        self.pending: list[Fill] = []
+        self.dead_letters: list[Fill] = []
+        self.fills_total = 0
+        self._ids = itertools.count(1)
+        self._resource_of: dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def _book(self, resource: str) -> OrderBook:
+        book = self.books.get(resource)
+        if book is None:
+            raise ValueError(f"unknown resource: {resource}")
+        return book
+
+    def submit(
+        self,
+        agent_id: str,
+        resource: str,
+        side: str,
+        quantity: float,
+        price: float | None = None,
+        owner: str | None = None,
+        max_cost: float | None = None,
+        now: datetime | None = None,
+    ) -> tuple[Order, list[Fill]]:
+        """Match a limit (``price`` set) or market order; a limit remainder rests.
+
+        ``owner`` is the caller allowed to cancel the order, and ``max_cost``
+        caps what a buy order may spend on fills.
+        """
+        if side not in (BUY, SELL):
+            raise ValueError("side must be buy or sell")
+        if quantity <= 0:
+            raise ValueError("quantity must be > 0")
+        if price is not None and price <= 0:
+            raise ValueError("price must be > 0")
+        book = self._book(resource)
+        now = now or datetime.utcnow()
+        fills: list[Fill] = []
+        with self._lock:
+            order = Order(next(self._ids), agent_id, side, price, quantity, owner, now)
+            book.match(order, fills, now, max_cost)
+            for fill in fills:
+                resting = fill.sell_order if side == BUY else fill.buy_order
+                if resting not in book.orders:
+                    self._resource_of.pop(resting, None)
+            if order.remaining > 0 and price is not None:
+                book.rest(order)
+                self._resource_of[order.order_id] = resource
+            self.pending.extend(fills)
+            self.fills_total += len(fills)
+        return order, fills
+
+    def sweep_cost(self, resource: str, quantity: float, agent_id: str) -> float:
+        """What a market buy of ``quantity`` by ``agent_id`` would spend on the book now."""
+        book = self._book(resource)
+        cost = 0.0
+        with self._lock:
+            for price, queue in book.asks.walk():
+                for resting in queue:
+                    if not resting.remaining or resting.agent_id == agent_id:
+                        continue
+                    qty = min(quantity, resting.remaining)
+                    cost += qty * price
+                    quantity -= qty
+                    if quantity <= 0:
+                        return cost
+        return cost
+
+    def cancel(self, order_id: int, owner: str | None = None) -> Order | None:
+        """Cancel a resting order; raises ``PermissionError`` if ``owner`` did not place it."""
+        with self._lock:
+            resource = self._resource_of.get(order_id)
+            if resource is None:
+                return None
+            book = self.books[resource]
+            if owner is not None and book.orders[order_id].owner != owner:
+                raise PermissionError("order belongs to another caller")
+            del self._resource_of[order_id]
+            return book.cancel(order_id)
+
+    def depth(self, resource: str, levels: int = 10) -> dict:
+        book = self._book(resource)
+        with self._lock:
+            return {
+                "resource": resource,
+                "bids": book.bids.depth(levels),
+                "asks": book.asks.depth(levels),
+            }
+
+    @staticmethod
+    def _write(session_factory: Callable[[], Session], fills: list[Fill]):
+        with session_factory() as db:
+            M2MMarketService(db)._insert_trades(
+                [
+                    Trade(
+                        buyer_agent=f.buyer,
+                        seller_agent=f.seller,
+                        resource_type=f.resource,
+                        amount=f.quantity,
+                        price=f.cost,
+                        status="matched",
+                        created_at=f.at,
+                    )
+                    for f in fills
+                ],
+                taker_sides=[f.side for f in fills],
+            )
+            db.commit()
+
+    def flush(self, session_factory: Callable[[], Session]) -> int:
+        """Persist buffered fills as ``matched`` trades; returns how many were written.
+
+        A batch the database rejects is retried one fill at a time, and fills
+        that still violate a constraint go to ``dead_letters``. Any other
+        error puts the unwritten fills back in the buffer and is re-raised.
+        """
+        with self._lock:
+            fills, self.pending = self.pending, []
+        written = done = 0
+        try:
+            for start in range(0, len(fills), self.batch_size):
+                batch = fills[start : start + self.batch_size]
+                try:
+                    self._write(session_factory, batch)
+                    written += len(batch)
+                except (IntegrityError, DataError):
+                    for i, fill in enumerate(batch):
+                        done = start + i
+                        try:
+                            self._write(session_factory, [fill])
+                            written += 1
+                        except (IntegrityError, DataError):
+                            logger.exception(
+                                "dead-lettering order fill %s/%s",
+                                fill.buy_order,
+                                fill.sell_order,
+                            )
+                            with self._lock:
+                                self.dead_letters.append(fill)
+                done = start + len(batch)
+        except Exception:
+            with self._lock:
+                self.pending[:0] = fills[done:]
+            raise
+        return written
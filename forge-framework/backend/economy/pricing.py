@@ -0,0 +1,218 @@
+import threading
+import time
+from collections.abc import Sequence
+from datetime import datetime
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from models import ResourcePrice
+
+BASE_PRICES = {
+    "compute": 0.04,
+    "energy": 0.01,
+    "data": 0.02,
+    "api_call": 0.03,
+    "storage": 0.015,
+}
+DEFAULT_BASE_PRICE = 0.05
+PRICING_MODES = ("static", "dynamic")
+
+# Multiplier = 1 + IMBALANCE_WEIGHT * imbalance * min(utilization, 1)
+#                + UTILIZATION_WEIGHT * max(utilization - 1, 0), clamped.
+IMBALANCE_WEIGHT = 0.5
+UTILIZATION_WEIGHT = 0.25
+MIN_MULTIPLIER = 0.5
+MAX_MULTIPLIER = 3.0
+# Below this share of the reference volume a resource is cold and quotes the base price.
+COLD_SHARE = 0.01
+
+_PENDING_KEY = "forge_trade_flow"
+_EPOCH = datetime(1970, 1, 1)
+
+
+def base_price(resource: str) -> float:
+    return BASE_PRICES.get(resource, DEFAULT_BASE_PRICE)
+
+
+class _FlowState:
+    __slots__ = ("demand", "supply", "updated", "price", "priced_at")
+
+    def __init__(self, demand: float, supply: float, updated: float, price: float):
+        self.demand = demand
+        self.supply = supply
+        self.updated = updated
+        self.price = price
+        self.priced_at = updated
+
+
+class PricingEngine:
+    """Per-resource unit prices driven by recent trade flow.
+
+    Buyer- and seller-initiated volume are kept as exponentially weighted
+    moving sums with half-life ``half_life`` seconds, updated in O(1) per
+    committed trade. Utilization is their total against ``reference_volume``
+    and imbalance is ``(demand - supply) / volume``; together they move the
+    static base price within ``[MIN_MULTIPLIER, MAX_MULTIPLIER]``. Each
+    resource caches its current price, refreshed at most every
+    ``refresh_seconds`` between trades, so :meth:`unit_price` never reads
+    trade history. In ``static`` mode, and for cold resources, the base
+    table is returned unchanged.
+    """
+
+    def __init__(
+        self,
+        mode: str = "static",
+        half_life: float = 3600.0,
+        reference_volume: float = 1000.0,
+        refresh_seconds: float = 1.0,
+    ):
+        self.mode = mode
+        self.half_life = half_life
+        self.reference_volume = reference_volume
+        self.refresh_seconds = refresh_seconds
+        self._states: dict[str, _FlowState] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def dynamic(self) -> bool:
+        return self.mode == "dynamic"
+
+    def configure(self, mode: str, half_life: float, reference_volume: float):
+        if mode not in PRICING_MODES:
+            raise ValueError(f"pricing mode must be one of {', '.join(PRICING_MODES)}")
+        with self._lock:
+            self.mode = mode
+            self.half_life = half_life
+            self.reference_volume = reference_volume
+            self._states.clear()
+
+    def reset(self):
+        with self._lock:
+            self._states.clear()
+
+    # -- pricing ---------------------------------------------------------
+
+    def _price(self, resource: str, demand: float, supply: float) -> float:
+        base = base_price(resource)
+        volume = demand + supply
+        if volume < self.reference_volume * COLD_SHARE:
+            return base
+        utilization = volume / self.reference_volume
+        imbalance = (demand - supply) / volume
+        multiplier = (
+            1
+            + IMBALANCE_WEIGHT * imbalance * min(utilization, 1.0)
+            + UTILIZATION_WEIGHT * max(utilization - 1.0, 0.0)
+        )
+        return base * min(MAX_MULTIPLIER, max(MIN_MULTIPLIER, multiplier))
+
+    def _decay_to(self, state: _FlowState, now: float):
+        if now > state.updated:
+            factor = 0.5 ** ((now - state.updated) / self.half_life)
+            state.demand *= factor
+            state.supply *= factor
+            state.updated = now
+
+    def unit_price(self, resource: str) -> float:
+        state = self._states.get(resource)
+        if not self.dynamic or state is None:
+            return base_price(resource)
+        now = time.time()
+        if now - state.priced_at > self.refresh_seconds:
+            with self._lock:
+                self._decay_to(state, now)
+                state.price = self._price(resource, state.demand, state.supply)
+                state.priced_at = now
+        return state.price
+
+    def observe(self, flows: Sequence[tuple[str, float, str]]):
+        """Fold committed ``(resource, quantity, taker_side)`` flows into the averages."""
+        if not self.dynamic:
+            return
+        now = time.time()
+        with self._lock:
+            for resource, quantity, side in flows:
+                state = self._states.get(resource)
+                if state is None:
+                    state = self._states[resource] = _FlowState(0.0, 0.0, now, 0.0)
+                else:
+                    self._decay_to(state, now)
+                if side == "sell":
+                    state.supply += quantity
+                else:
+                    state.demand += quantity
+            for resource in {r for r, _, _ in flows}:
+                state = self._states[resource]
+                state.price = self._price(resource, state.demand, state.supply)
+                state.priced_at = now
+
+    def snapshot(self) -> dict[str, dict[str, float]]:
+        with self._lock:
+            return {
+                resource: {
+                    "price": state.price,
+                    "demand": state.demand,
+                    "supply": state.supply,
+                }
+                for resource, state in self._states.items()
+            }
+
+    # -- persistence -----------------------------------------------------
+
+    def checkpoint(self, db: Session) -> int:
+        """Write every resource's averages and price to ``resource_prices``."""
+        with self._lock:
+            rows = [
+                ResourcePrice(
+                    resource_type=resource,
+                    demand_ewma=state.demand,
+                    supply_ewma=state.supply,
+                    price=state.price,
+                    updated_at=datetime.utcfromtimestamp(state.updated),
+                )
+                for resource, state in self._states.items()
+            ]
+        for row in rows:
+            db.merge(row)
+        db.commit()
+        return len(rows)
+
+    def restore(self, db: Session) -> int:
+        """Load checkpointed averages; they decay forward from their ``updated_at``."""
+        if not self.dynamic:
+            return 0
+        rows = db.execute(select(ResourcePrice)).scalars().all()
+        with self._lock:
+            for row in rows:
+                updated = (row.updated_at - _EPOCH).total_seconds()
+                self._states[row.resource_type] = _FlowState(
+                    row.demand_ewma, row.supply_ewma, updated, row.price
+                )
+        return len(rows)
+
+
+price_engine = PricingEngine()
+
+
+def record_trade_flow(
+    session: Session, resource: str, quantity: float, side: str = "buy"
+):
+    """Queue a trade for the pricing engine; it is applied when ``session`` commits."""
+    session.info.setdefault(_PENDING_KEY, []).append((resource, quantity, side))
+
+
+def _after_commit(session: Session):
+    flows = session.info.pop(_PENDING_KEY, None)
+    if flows:
+        price_engine.observe(flows)
+
+
+def _after_rollback(session: Session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def install_pricing_listeners():
+    if not event.contains(Session, "after_commit", _after_commit):
+        event.listen(Session, "after_commit", _after_commit)
+        event.listen(Session, "after_rollback", _after_rollback)
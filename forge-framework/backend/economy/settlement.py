@@ -0,0 +1,374 @@
+import os
+import time
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from typing import Protocol
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session, aliased
+
+from models import Agent, Trade
+
+PENDING_STATUSES = ("requested", "matched")
+SETTLING = "settling"
+SUBMITTED = "submitted"
+SETTLED = "settled"
+FAILED = "settlement_failed"
+# On-chain fixed-point scales: prices are paid in wei, quantities carry 6 decimals.
+PRICE_DECIMALS = 18
+AMOUNT_DECIMALS = 6
+
+SETTLE_BATCH_ABI = [
+    {
+        "type": "function",
+        "name": "settleBatch",
+        "stateMutability": "payable",
+        "inputs": [
+            {
+                "name": "settlements",
+                "type": "tuple[]",
+                "components": [
+                    {"name": "tradeId", "type": "uint256"},
+                    {"name": "buyer", "type": "address"},
+                    {"name": "seller", "type": "address"},
+                    {"name": "resource", "type": "string"},
+                    {"name": "amount", "type": "uint256"},
+                    {"name": "price", "type": "uint256"},
+                ],
+            }
+        ],
+        "outputs": [{"name": "batchHash", "type": "bytes32"}],
+    }
+]
+
+
+def _scaled(value: float, decimals: int) -> int:
+    return int(Decimal(str(value)).scaleb(decimals))
+
+
+@dataclass(frozen=True)
+class SettlementItem:
+    trade_id: int
+    buyer: str
+    seller: str
+    resource: str
+    amount: int
+    price: int
+
+
+class SettlementRejected(Exception):
+    """The escrow refused the batch and nothing was paid; the trades themselves are at fault."""
+
+
+class EscrowBackend(Protocol):
+    def settle_batch(
+        self, items: Sequence[SettlementItem], on_signed: Callable[[str], None]
+    ) -> str:
+        """Settle ``items`` in one transaction and return its hash once it succeeded.
+
+        ``on_signed(tx_hash)`` is called after signing and before the
+        transaction is broadcast; if it raises, nothing is sent. Raises
+        :class:`SettlementRejected` when the batch fails simulation or gas
+        estimation, or was mined and reverted. Any other exception is
+        transient, and after ``on_signed`` the transaction may be on chain.
+        """
+
+    def receipt_status(self, tx_hash: str) -> bool | None:
+        """``True``/``False`` for a mined, succeeded/reverted transaction; ``None`` if not mined."""
+
+
+class Web3EscrowBackend:
+    """``M2MEscrow.settleBatch`` over JSON-RPC, signed with the escrow owner's key.
+
+    Works against any node, including a local Anvil. Each batch is
+    simulated with ``eth_call`` and gas-estimated first, so a batch that
+    would revert (a rejecting seller, out of gas, an already settled trade)
+    is rejected deterministically without spending gas.
+    """
+
+    def __init__(
+        self, w3, escrow_address: str, private_key: str, receipt_timeout: float = 120
+    ):
+        from web3.exceptions import ContractLogicError, TransactionNotFound
+
+        self.w3 = w3
+        self.contract = w3.eth.contract(
+            address=w3.to_checksum_address(escrow_address), abi=SETTLE_BATCH_ABI
+        )
+        self.account = w3.eth.account.from_key(private_key)
+        self.receipt_timeout = receipt_timeout
+        self._logic_error = ContractLogicError
+        self._not_found = TransactionNotFound
+
+    @classmethod
+    def from_env(cls) -> "Web3EscrowBackend":
+        from dependencies import get_web3
+
+        address = os.getenv("ESCROW_ADDRESS")
+        key = os.getenv("SETTLEMENT_PRIVATE_KEY")
+        if not address or not key:
+            raise ValueError("ESCROW_ADDRESS and SETTLEMENT_PRIVATE_KEY must be set")
+        return cls(get_web3(), address, key)
+
+    def settle_batch(
+        self, items: Sequence[SettlementItem], on_signed: Callable[[str], None]
+    ) -> str:
+        try:
+            args = [
+                (
+                    i.trade_id,
+                    self.w3.to_checksum_address(i.buyer),
+                    self.w3.to_checksum_address(i.seller),
+                    i.resource,
+                    i.amount,
+                    i.price,
+                )
+                for i in items
+            ]
+        except ValueError as exc:
+            raise SettlementRejected(f"invalid address: {exc}") from exc
+        fn = self.contract.functions.settleBatch(args)
+        params = {"from": self.account.address, "value": sum(i.price for i in items)}
+        params["nonce"] = self.w3.eth.get_transaction_count(
+            self.account.address, "pending"
+        )
+        try:
+            # Node errors here (revert, out of gas, gas above the block limit) depend on
+            # the batch, not the connection, so they are rejections to bisect.
+            fn.call(params)
+            params["gas"] = fn.estimate_gas(params)
+            tx = fn.build_transaction(params)
+        except (self._logic_error, ValueError) as exc:
+            raise SettlementRejected(str(exc)) from exc
+
+        signed = self.account.sign_transaction(tx)
+        tx_hash = signed.hash.to_0x_hex()
+        on_signed(tx_hash)
+        self.w3.eth.send_raw_transaction(signed.raw_transaction)
+        receipt = self.w3.eth.wait_for_transaction_receipt(
+            tx_hash, timeout=self.receipt_timeout
+        )
+        if receipt.status != 1:
+            raise SettlementRejected(f"settleBatch reverted in {tx_hash}")
+        return tx_hash
+
+    def receipt_status(self, tx_hash: str) -> bool | None:
+        try:
+            receipt = self.w3.eth.get_transaction_receipt(tx_hash)
+        except self._not_found:
+            return None
+        return receipt.status == 1
+
+
+@dataclass
+class SettlementReport:
+    batches: int = 0
+    transactions: int = 0
+    settled: int = 0
+    failed: int = 0
+    reconciled: int = 0
+    seconds: float = 0.0
+
+    @property
+    def trades_per_second(self) -> float:
+        return self.settled / self.seconds if self.seconds else 0.0
+
+
+class SettlementWorker:
+    """Moves pending trades through escrow settlement in batches.
+
+    A batch of ``requested``/``matched`` trades is claimed by flipping it to
+    ``settling`` in one statement (``SKIP LOCKED`` on Postgres, so several
+    workers can run side by side). Once its ``settleBatch`` transaction is
+    signed, and before it is broadcast, the batch is committed as
+    ``submitted`` with the transaction hash in ``escrow_tx``; it is marked
+    ``settled`` when the receipt confirms it. If the escrow rejects a
+    batch, it is split in half until the offending trades are isolated and
+    marked ``settlement_failed``.
+
+    A transient error before signing returns the batch to its previous
+    statuses and is raised. After signing, the trades are never released:
+    they stay ``submitted`` and :meth:`reconcile` settles or fails them from
+    the receipt, so a batch is never broadcast twice. The escrow also
+    refuses to settle a trade id twice.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        backend: EscrowBackend,
+        batch_size: int = 200,
+    ):
+        self.session_factory = session_factory
+        self.backend = backend
+        self.batch_size = batch_size
+
+    def _claim(self, db: Session) -> tuple[list[SettlementItem], dict[int, str]]:
+        buyer, seller = aliased(Agent), aliased(Agent)
+        stmt = (
+            select(
+                Trade.id,
+                Trade.status,
+                buyer.owneraddress,
+                seller.owneraddress,
+                Trade.resource_type,
+                Trade.amount,
+                Trade.price,
+            )
+            .join(buyer, buyer.agentid == Trade.buyer_agent)
+            .join(seller, seller.agentid == Trade.seller_agent)
+            .where(Trade.status.in_(PENDING_STATUSES))
+            .order_by(Trade.id)
+            .limit(self.batch_size)
+        )
+        if db.get_bind().dialect.name == "postgresql":
+            stmt = stmt.with_for_update(skip_locked=True, of=Trade)
+        rows = db.execute(stmt).all()
+        if not rows:
+            return [], {}
+        claimed = set(
+            db.execute(
+                update(Trade)
+                .where(
+                    Trade.id.in_([r[0] for r in rows]),
+                    Trade.status.in_(PENDING_STATUSES),
+                )
+                .values(status=SETTLING)
+                .returning(Trade.id)
+                .execution_options(synchronize_session=False)
+            ).scalars()
+        )
+        db.commit()
+        rows = [r for r in rows if r[0] in claimed]
+        items = [
+            SettlementItem(
+                trade_id,
+                buyer_address,
+                seller_address,
+                resource,
+                _scaled(amount, AMOUNT_DECIMALS),
+                _scaled(price, PRICE_DECIMALS),
+            )
+            for trade_id, _, buyer_address, seller_address, resource, amount, price in rows
+        ]
+        return items, {r[0]: r[1] for r in rows}
+
+    def _mark(self, db: Session, ids: Sequence[int], **values):
+        db.execute(
+            update(Trade)
+            .where(Trade.id.in_(ids))
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+
+    def _settle(
+        self, db: Session, items: list[SettlementItem], report: SettlementReport
+    ):
+        ids = [i.trade_id for i in items]
+        sent: list[str] = []
+
+        def _record(tx_hash: str):
+            self._mark(db, ids, status=SUBMITTED, escrow_tx=tx_hash)
+            db.commit()
+            sent.append(tx_hash)
+
+        try:
+            tx = self.backend.settle_batch(items, _record)
+        except SettlementRejected:
+            if sent:
+                # Mined and reverted: nothing was paid, so the batch can still be split.
+                report.transactions += 1
+                self._mark(db, ids, status=SETTLING, escrow_tx=None)
+                db.commit()
+            if len(items) == 1:
+                self._mark(db, ids, status=FAILED, completed_at=datetime.utcnow())
+                db.commit()
+                report.failed += 1
+                return
+            half = len(items) // 2
+            self._settle(db, items[:half], report)
+            self._settle(db, items[half:], report)
+            return
+        report.transactions += 1
+        self._mark(
+            db, ids, status=SETTLED, escrow_tx=tx, completed_at=datetime.utcnow()
+        )
+        db.commit()
+        report.settled += len(items)
+
+    def reconcile(self, report: SettlementReport | None = None) -> SettlementReport:
+        """Resolve ``submitted`` trades from their transaction receipts.
+
+        A succeeded transaction settles its trades and a reverted one marks
+        them ``settlement_failed``, keeping ``escrow_tx`` for review. Trades
+        whose transaction is not mined yet are left for a later pass.
+        """
+        report = report or SettlementReport()
+        with self.session_factory() as db:
+            pending = db.execute(
+                select(Trade.escrow_tx).where(Trade.status == SUBMITTED).distinct()
+            ).scalars()
+            for tx in pending.all():
+                ok = self.backend.receipt_status(tx)
+                if ok is None:
+                    continue
+                resolved = db.execute(
+                    update(Trade)
+                    .where(Trade.escrow_tx == tx, Trade.status == SUBMITTED)
+                    .values(
+                        status=SETTLED if ok else FAILED, completed_at=datetime.utcnow()
+                    )
+                    .execution_options(synchronize_session=False)
+                ).rowcount
+                db.commit()
+                report.reconciled += 1
+                if ok:
+                    report.settled += resolved
+                else:
+                    report.failed += resolved
+        return report
+
+    def run_once(self, report: SettlementReport | None = None) -> SettlementReport:
+        """Claim and settle one batch; ``report.batches`` is unchanged if nothing was pending."""
+        report = report or SettlementReport()
+        started = time.perf_counter()
+        with self.session_factory() as db:
+            items, previous = self._claim(db)
+            if items:
+                report.batches += 1
+                try:
+                    self._settle(db, items, report)
+                except Exception:
+                    db.rollback()
+                    unsettled = set(
+                        db.execute(
+                            select(Trade.id).where(
+                                Trade.id.in_(list(previous)), Trade.status == SETTLING
+                            )
+                        ).scalars()
+                    )
+                    for status in set(previous.values()):
+                        ids = [
+                            i
+                            for i, s in previous.items()
+                            if s == status and i in unsettled
+                        ]
+                        if ids:
+                            self._mark(db, ids, status=status)
+                    db.commit()
+                    raise
+        report.seconds += time.perf_counter() - started
+        return report
+
+    def run(self, max_batches: int | None = None) -> SettlementReport:
+        """Reconcile submitted trades, then settle batches until none are pending or
+        ``max_batches`` have been claimed."""
+        report = self.reconcile()
+        while max_batches is None or report.batches < max_batches:
+            claimed = report.batches
+            self.run_once(report)
+            if report.batches == claimed:
+                break
+        return report
@@ -0,0 +1,232 @@
+from collections.abc import Iterable, Sequence
+from datetime import datetime
+
+from sqlalchemy import and_, case, delete, func, or_, select, union_all
+from sqlalchemy.orm import Session
+
+from database import upsert
+from models import AgentCounterparty, AgentTradeStats, Trade
+
+STATS_COUNTERS = (
+    "trades_bought",
+    "trades_sold",
+    "volume_bought",
+    "volume_sold",
+    "spend",
+    "revenue",
+)
+PAIR_COUNTERS = ("trades", "volume", "spend", "revenue")
+
+
+def agent_trades(
+    db: Session,
+    agent_id: str,
+    fields: Sequence[str],
+    limit: int | None = None,
+    before: tuple[datetime, int] | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+) -> list[dict]:
+    """Trades where ``agent_id`` is buyer or seller, newest first.
+
+    The two roles are read as separate branches joined with ``UNION ALL`` so
+    each one can use its ``(agent, created_at, id)`` index, where a single
+    ``OR`` predicate falls back to scanning ``trades``. Rows are ordered and
+    paged by ``(created_at, id)``, the index order, so each branch stops
+    after ``limit`` index entries instead of sorting the agent's history;
+    ``before`` is the ``(created_at, id)`` of the last row already seen.
+    Self-trades are only taken from the buyer branch. ``since`` is
+    inclusive and ``until`` exclusive.
+    """
+    names = list(dict.fromkeys(["id", "created_at", *fields]))
+    columns = [getattr(Trade, f) for f in names]
+
+    def _branch(*criteria):
+        stmt = select(*columns).where(*criteria)
+        if before is not None:
+            at, last_id = before
+            # The plain ``<=`` gives the planner a range bound on the index.
+            stmt = stmt.where(
+                Trade.created_at <= at,
+                or_(
+                    Trade.created_at < at,
+                    and_(Trade.created_at == at, Trade.id < last_id),
+                ),
+            )
+        if since is not None:
+            stmt = stmt.where(Trade.created_at >= since)
+        if until is not None:
+            stmt = stmt.where(Trade.created_at < until)
+        stmt = stmt.order_by(Trade.created_at.desc(), Trade.id.desc())
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        return select(stmt.subquery())
+
+    merged = union_all(
+        _branch(Trade.buyer_agent == agent_id),
+        _branch(Trade.seller_agent == agent_id, Trade.buyer_agent != agent_id),
+    ).subquery()
+    stmt = select(*(merged.c[f] for f in fields)).order_by(
+        merged.c.created_at.desc(), merged.c.id.desc()
+    )
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return [dict(row._mapping) for row in db.execute(stmt)]
+
+
+def _add(
+    stats: dict[str, dict],
+    pairs: dict[tuple[str, str], dict],
+    buyer: str,
+    seller: str,
+    trades: int,
+    amount: float,
+    price: float,
+    first: datetime | None,
+    last: datetime | None,
+):
+    for agent, counterparty, bought in ((buyer, seller, True), (seller, buyer, False)):
+        row = stats.get(agent)
+        if row is None:
+            row = stats[agent] = {"agent_id": agent, **dict.fromkeys(STATS_COUNTERS, 0)}
+            row["first_trade_at"] = row["last_trade_at"] = None
+        row["trades_bought" if bought else "trades_sold"] += trades
+        row["volume_bought" if bought else "volume_sold"] += amount
+        row["spend" if bought else "revenue"] += price
+        row["first_trade_at"] = min(
+            filter(None, (row["first_trade_at"], first)), default=None
+        )
+        row["last_trade_at"] = max(
+            filter(None, (row["last_trade_at"], last)), default=None
+        )
+
+        pair = pairs.get((agent, counterparty))
+        if pair is None:
+            pair = pairs[agent, counterparty] = {
+                "agent_id": agent,
+                "counterparty": counterparty,
+            }
+            pair.update(dict.fromkeys(PAIR_COUNTERS, 0), last_trade_at=None)
+        pair["trades"] += trades
+        pair["volume"] += amount
+        pair["spend" if bought else "revenue"] += price
+        pair["last_trade_at"] = max(
+            filter(None, (pair["last_trade_at"], last)), default=None
+        )
+
+
+def _earliest(stored, proposed):
+    return case(
+        (stored.is_(None), proposed), (proposed < stored, proposed), else_=stored
+    )
+
+
+def _latest(stored, proposed):
+    return case(
+        (stored.is_(None), proposed), (proposed > stored, proposed), else_=stored
+    )
+
+
+def _apply(db: Session, stats: dict[str, dict], pairs: dict[tuple[str, str], dict]):
+    upsert(
+        db,
+        AgentTradeStats,
+        list(stats.values()),
+        ["agent_id"],
+        lambda c, new: {
+            **{name: c[name] + new[name] for name in STATS_COUNTERS},
+            "first_trade_at": _earliest(c.first_trade_at, new.first_trade_at),
+            "last_trade_at": _latest(c.last_trade_at, new.last_trade_at),
+        },
+    )
+    upsert(
+        db,
+        AgentCounterparty,
+        list(pairs.values()),
+        ["agent_id", "counterparty"],
+        lambda c, new: {
+            **{name: c[name] + new[name] for name in PAIR_COUNTERS},
+            "last_trade_at": _latest(c.last_trade_at, new.last_trade_at),
+        },
+    )
+
+
+def record_trade_stats(db: Session, trades: Iterable[Trade]):
+    """Fold newly inserted (flushed) trades into the per-agent aggregates.
+
+    Runs in the caller's transaction, so aggregates commit or roll back
+    together with the trades themselves.
+    """
+    stats: dict[str, dict] = {}
+    pairs: dict[tuple[str, str], dict] = {}
+    for t in trades:
+        at = t.created_at
+        _add(stats, pairs, t.buyer_agent, t.seller_agent, 1, t.amount, t.price, at, at)
+    if stats:
+        _apply(db, stats, pairs)
+
+
+def rebuild_trade_stats(db: Session) -> int:
+    """Recompute all aggregates from ``trades`` (backfill); returns the number of agents."""
+    db.execute(delete(AgentTradeStats))
+    db.execute(delete(AgentCounterparty))
+    grouped = db.execute(
+        select(
+            Trade.buyer_agent,
+            Trade.seller_agent,
+            func.count(),
+            func.sum(Trade.amount),
+            func.sum(Trade.price),
+            func.min(Trade.created_at),
+            func.max(Trade.created_at),
+        ).group_by(Trade.buyer_agent, Trade.seller_agent)
+    )
+    stats: dict[str, dict] = {}
+    pairs: dict[tuple[str, str], dict] = {}
+    for row in grouped:
+        _add(stats, pairs, *row)
+    if stats:
+        _apply(db, stats, pairs)
+    db.commit()
+    return len(stats)
+
+
+def agent_trade_summary(
+    db: Session, agent_id: str, counterparties: int = 10
+) -> dict | None:
+    stats = db.get(AgentTradeStats, agent_id)
+    if stats is None:
+        return None
+    top = db.execute(
+        select(AgentCounterparty)
+        .where(AgentCounterparty.agent_id == agent_id)
+        .order_by(AgentCounterparty.volume.desc(), AgentCounterparty.counterparty)
+        .limit(counterparties)
+    ).scalars()
+    distinct = db.execute(
+        select(func.count())
+        .select_from(AgentCounterparty)
+        .where(AgentCounterparty.agent_id == agent_id)
+    ).scalar()
+    return {
+        "agent_id": agent_id,
+        **{name: getattr(stats, name) for name in STATS_COUNTERS},
+        "volume": stats.volume_bought + stats.volume_sold,
+        "first_trade_at": (
+            stats.first_trade_at.isoformat() if stats.first_trade_at else None
+        ),
+        "last_trade_at": (
+            stats.last_trade_at.isoformat() if stats.last_trade_at else None
+        ),
+        "counterparty_count": distinct,
+        "counterparties": [
+            {
+                "agent_id": p.counterparty,
+                **{name: getattr(p, name) for name in PAIR_COUNTERS},
+                "last_trade_at": (
+                    p.last_trade_at.isoformat() if p.last_trade_at else None
+                ),
+            }
+            for p in top
+        ],
+    }
@@ -1,6 +1,23 @@
+from datetime import datetime
+
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
 
-from models import Member, Proposal
+from database import insert_ignoring_conflicts
+from models import Member, Proposal, Vote
+from reputation.redqueen import effective_tier
+
+PROPOSAL_FIELDS = (
+    "id",
+    "title",
+    "body",
+    "proposer",
+    "status",
+    "votes_for",
+    "votes_against",
+    "created_at",
+)
+PROPOSAL_DEFAULT_FIELDS = PROPOSAL_FIELDS[:-1]
 
 
 class MetaDAOService:
@@ -9,7 +26,7 @@ class MetaDAOService:
 
     def submit_proposal(self, proposer: str, title: str, body: str) -> dict:
         member = self.db.query(Member).filter(Member.address == proposer).first()
-        if not member or member.tier < 2:
+        if not member or effective_tier(member) < 2:
             raise ValueError("proposer tier too low")
 
         proposal = Proposal(title=title, body=body, proposer=proposer, status="active")
@@ -18,27 +35,85 @@ class MetaDAOService:
         self.db.refresh(proposal)
         return self._serialize(proposal)
 
-    def list_proposals(self, status: str | None = None) -> list[dict]:
-        query = self.db.query(Proposal)
+    def list_proposals(
+        self,
+        status: str | None = None,
+        limit: int | None = None,
+        before_id: int | None = None,
+        fields: tuple[str, ...] | list[str] = PROPOSAL_DEFAULT_FIELDS,
+    ) -> list[dict]:
+        stmt = select(*(getattr(Proposal, f) for f in fields))
         if status:
-            query = query.filter(Proposal.status == status)
-        return [self._serialize(p) for p in query.order_by(Proposal.id.desc()).all()]
+            stmt = stmt.where(Proposal.status == status)
+        if before_id is not None:
+            stmt = stmt.where(Proposal.id < before_id)
+        stmt = stmt.order_by(Proposal.id.desc())
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        return [dict(row._mapping) for row in self.db.execute(stmt)]
 
     def vote(self, proposal_id: int, voter: str, support: bool) -> dict:
+        """Record ``voter``'s ballot on ``proposal_id``, or change it.
+
+        ``votes`` holds one row per (proposal, voter). A first ballot is an
+        ``INSERT ... ON CONFLICT DO NOTHING`` and a change is an ``UPDATE``
+        guarded on the previous choice, so concurrent requests from the same
+        voter count at most once. The tallies move with ``SET col = col + 1``
+        in the same transaction instead of a read-modify-write of the row;
+        repeating the current ballot leaves them unchanged.
+        """
         member = self.db.query(Member).filter(Member.address == voter).first()
-        if not member or member.tier < 1:
+        if not member or effective_tier(member) < 1:
             raise ValueError("voter tier too low")
-        proposal = self.db.query(Proposal).filter(Proposal.id == proposal_id).first()
-        if not proposal:
+        exists = self.db.execute(
+            select(Proposal.id).where(Proposal.id == proposal_id)
+        ).first()
+        if not exists:
             raise ValueError("proposal not found")
 
-        if support:
-            proposal.votes_for += 1
+        now = datetime.utcnow()
+        delta_for = delta_against = 0
+        inserted = insert_ignoring_conflicts(
+            self.db,
+            Vote,
+            [
+                {
+                    "proposal_id": proposal_id,
+                    "voter": voter,
+                    "support": support,
+                    "voted_at": now,
+                }
+            ],
+        )
+        if inserted.rowcount:
+            delta_for, delta_against = (1, 0) if support else (0, 1)
         else:
-            proposal.votes_against += 1
+            changed = self.db.execute(
+                update(Vote)
+                .where(
+                    Vote.proposal_id == proposal_id,
+                    Vote.voter == voter,
+                    Vote.support != support,
+                )
+                .values(support=support, voted_at=now)
+                .execution_options(synchronize_session=False)
+            )
+            if changed.rowcount:
+                delta_for, delta_against = (1, -1) if support else (-1, 1)
+        if delta_for or delta_against:
+            self.db.execute(
+                update(Proposal)
+                .where(Proposal.id == proposal_id)
+                .values(
+                    votes_for=Proposal.votes_for + delta_for,
+                    votes_against=Proposal.votes_against + delta_against,
+                )
+                .execution_options(synchronize_session=False)
+            )
         self.db.commit()
-        self.db.refresh(proposal)
-        return self._serialize(proposal)
+        return self._serialize(
+            self.db.get(Proposal, proposal_id, populate_existing=True)
+        )
 
     @staticmethod
     def _serialize(proposal: Proposal) -> dict:
@@ -1,50 +1,167 @@
+import asyncio
 import base64
 import hashlib
 import hmac
 import json
+import logging
 import time
 from collections import defaultdict
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime, timezone
+from typing import Literal
 
-from fastapi import Body, Depends, FastAPI, HTTPException, Request
-from fastapi.responses import PlainTextResponse, Response
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from pydantic import BaseModel
-from sqlalchemy import func
+from pydantic import BaseModel, Field
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 
-from agents.openclaw_client import OpenClawClient
+from agents.log_stream import LogTailHub
+from agents.openclaw_client import AsyncOpenClawClient, gateway_metrics
 from config import get_settings
-from database import Base, engine, get_db
-from economy.m2m_market import M2MMarketService
-from governance.meta_dao import MetaDAOService
-from models import Agent, Member, Trade
-from reputation.agent_staking import deploy_agent_with_staking
-from reputation.redqueen import apply_daily_rep_decay
+from database import Base, SessionLocal, async_engine, engine, get_async_db, get_db
+from economy.m2m_market import TRADE_DEFAULT_FIELDS, TRADE_FIELDS, M2MMarketService
+from economy.market_rollups import backfill_candles, list_candles
+from economy.order_book import MatchingEngine
+from economy.pricing import install_pricing_listeners, price_engine
+from economy.settlement import EscrowBackend, SettlementWorker, Web3EscrowBackend
+from economy.trade_ledger import agent_trade_summary, rebuild_trade_stats
+from governance.meta_dao import PROPOSAL_DEFAULT_FIELDS, PROPOSAL_FIELDS, MetaDAOService
+from models import Agent
+from monitoring.gauges import install_gauge_listeners, record_gauge_delta, state_gauges
+from monitoring.metrics import (
+    InstrumentationMiddleware,
+    instrument_engine,
+    render_instrumentation,
+)
+from pagination import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    decode_cursor,
+    next_cursor,
+    select_fields,
+)
+from rate_limit import SlidingWindowRateLimiter
+from reputation.agent_staking import (
+    StakeConflictError,
+    deploy_agent_with_staking,
+    deploy_agents_for_owner,
+    deploy_agents_with_staking,
+)
+from reputation.leaderboard import install_rank_listeners, rep_index
+from reputation.redqueen import configure_decay, decay_policy, run_bulk_decay
+from reputation.rep_ledger import compact_rep_history, rep_at, take_rep_snapshots
 from reputation.rli_oracle_client import RLIOracleClient, RLIRequest
-from storage.ipfs_client import IPFSStorage
-
-
-class SlowAPIRateLimiter:
-    """Lightweight in-process limiter compatible with SlowAPI-style semantics."""
-
-    def __init__(self, max_per_minute: int):
-        self.max_per_minute = max_per_minute
-        self.hits: dict[str, list[float]] = defaultdict(list)
-
-    def enforce(self, key: str):
-        now = time.time()
-        window_start = now - 60
-        self.hits[key] = [ts for ts in self.hits[key] if ts > window_start]
-        if len(self.hits[key]) >= self.max_per_minute:
-            raise HTTPException(status_code=429, detail="Rate limit exceeded")
-        self.hits[key].append(now)
-
-
+from reputation.tier_engine import reload_tier_profiles, retier_members, tier_table
+from storage.ipfs_client import (
+    AsyncIPFSStorage,
+    ContentIntegrityError,
+    cache_from_env,
+    is_valid_cid,
+    iter_file_range,
+    parse_byte_range,
+)
+from token_cache import VerifiedTokenCache
+
+
+logger = logging.getLogger(__name__)
 settings = get_settings()
 Base.metadata.create_all(bind=engine)
-app = FastAPI(title=settings.app_name)
+
+
+async def _flush_fills_periodically(order_engine: MatchingEngine, interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        if order_engine.pending:
+            try:
+                await run_in_threadpool(order_engine.flush, SessionLocal)
+            except Exception:
+                # Unwritten fills stay buffered and are retried on the next tick.
+                logger.exception(
+                    "order fill flush failed; %d fills stay buffered",
+                    len(order_engine.pending),
+                )
+
+
+def _with_session(fn):
+    with SessionLocal() as db:
+        return fn(db)
+
+
+async def _checkpoint_prices_periodically(interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(_with_session, price_engine.checkpoint)
+        except Exception:
+            # The in-memory averages stay authoritative; the next tick retries.
+            continue
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.gateway = AsyncOpenClawClient()
+    app.state.ipfs = AsyncIPFSStorage(cache=cache_from_env())
+    app.state.log_hub = LogTailHub(app.state.gateway)
+    app.state.order_engine = MatchingEngine(batch_size=settings.order_fill_batch_size)
+    fill_flusher = asyncio.create_task(
+        _flush_fills_periodically(
+            app.state.order_engine, settings.order_fill_flush_seconds
+        )
+    )
+    price_checkpointer = None
+    if price_engine.dynamic:
+        await run_in_threadpool(_with_session, price_engine.restore)
+        price_checkpointer = asyncio.create_task(
+            _checkpoint_prices_periodically(settings.pricing_checkpoint_seconds)
+        )
+    try:
+        yield
+    finally:
+        fill_flusher.cancel()
+        try:
+            await run_in_threadpool(app.state.order_engine.flush, SessionLocal)
+        except Exception:
+            logger.exception(
+                "dropping %d unwritten order fills at shutdown",
+                len(app.state.order_engine.pending),
+            )
+        if price_checkpointer is not None:
+            price_checkpointer.cancel()
+            try:
+                await run_in_threadpool(_with_session, price_engine.checkpoint)
+            except Exception:
+                logger.exception("final price checkpoint failed")
+        await app.state.log_hub.aclose()
+        await app.state.gateway.aclose()
+        await app.state.ipfs.aclose()
+        await async_engine.dispose()
+
+
+app = FastAPI(title=settings.app_name, lifespan=lifespan)
+app.add_middleware(InstrumentationMiddleware)
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+install_gauge_listeners()
+install_rank_listeners()
+configure_decay(settings.rep_decay_mode, settings.rep_decay_rate)
+install_pricing_listeners()
+price_engine.configure(
+    settings.pricing_mode,
+    settings.pricing_half_life_seconds,
+    settings.pricing_reference_volume,
+)
 security = HTTPBearer(auto_error=False)
-limiter = SlowAPIRateLimiter(settings.api_rate_limit_per_minute)
+limiter = SlidingWindowRateLimiter(
+    settings.api_rate_limit_per_minute,
+    tier_quotas=settings.api_rate_limit_tier_quotas,
+    max_keys=settings.api_rate_limit_max_keys,
+)
+token_cache = VerifiedTokenCache(settings.jwt_cache_max_entries)
 request_counter: dict[str, int] = defaultdict(int)
 
 
@@ -61,14 +178,17 @@ def _decode_jwt(credentials: HTTPAuthorizationCredentials | None) -> dict:
         raise HTTPException(status_code=401, detail="Missing bearer token")
 
     token = credentials.credentials
-    try:
-        header_b64, payload_b64, signature_b64 = token.split(".")
-    except ValueError as exc:
-        raise HTTPException(status_code=401, detail="Malformed token") from exc
+    signed, _, signature_b64 = token.rpartition(".")
+    if signed.count(".") != 1:
+        raise HTTPException(status_code=401, detail="Malformed token")
 
-    signed = f"{header_b64}.{payload_b64}".encode("utf-8")
+    cached = token_cache.get(signature_b64, signed)
+    if cached is not None:
+        return cached
+
+    header_b64, payload_b64 = signed.split(".")
     expected_sig = hmac.new(
-        settings.jwt_secret.encode("utf-8"), signed, hashlib.sha256
+        settings.jwt_secret.encode("utf-8"), signed.encode("utf-8"), hashlib.sha256
     ).digest()
     token_sig = _b64url_decode(signature_b64)
     if not hmac.compare_digest(expected_sig, token_sig):
@@ -77,25 +197,80 @@ def _decode_jwt(credentials: HTTPAuthorizationCredentials | None) -> dict:
     payload = json.loads(_b64url_decode(payload_b64))
     if "exp" in payload and int(payload["exp"]) < int(time.time()):
         raise HTTPException(status_code=401, detail="Token expired")
+    token_cache.put(signature_b64, signed, payload)
     return payload
 
 
 def require_tier(min_tier: int):
     def _validator(
+        request: Request,
         credentials: HTTPAuthorizationCredentials | None = Depends(security),
     ):
         claims = _decode_jwt(credentials)
         tier = int(claims.get("tier", 0))
         if tier < min_tier:
             raise HTTPException(status_code=403, detail=f"Tier {min_tier}+ required")
+        request.state.claims = claims
         return claims
 
     return _validator
 
 
+def get_gateway(request: Request) -> AsyncOpenClawClient:
+    return request.app.state.gateway
+
+
+def get_ipfs(request: Request) -> AsyncIPFSStorage:
+    return request.app.state.ipfs
+
+
+def get_log_hub(request: Request) -> LogTailHub:
+    return request.app.state.log_hub
+
+
+def get_order_engine(request: Request) -> MatchingEngine:
+    return request.app.state.order_engine
+
+
+def get_escrow_backend(request: Request) -> EscrowBackend:
+    backend = getattr(request.app.state, "escrow_backend", None)
+    if backend is None:
+        try:
+            backend = Web3EscrowBackend.from_env()
+        except (ImportError, ValueError) as exc:
+            raise HTTPException(
+                status_code=503, detail=f"escrow unavailable: {exc}"
+            ) from exc
+        request.app.state.escrow_backend = backend
+    return backend
+
+
+def _naive_utc(value: datetime | None) -> datetime | None:
+    """Timestamps are stored as naive UTC; convert aware query parameters to match."""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _set_next_cursor(response: Response, cursor: str | None):
+    if cursor:
+        response.headers["X-Next-Cursor"] = cursor
+
+
+@contextmanager
+def _staking_errors():
+    try:
+        yield
+    except StakeConflictError as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
 def mark_request(request: Request):
     ip = request.client.host if request.client else "unknown"
-    limiter.enforce(ip)
+    claims = getattr(request.state, "claims", None) or {}
+    limiter.enforce(ip, int(claims.get("tier", 0)))
     key = f"{request.method} {request.url.path}"
     request_counter[key] += 1
 
@@ -106,10 +281,30 @@ class DeployAgentRequest(BaseModel):
     stake_percentage: float = 0.15
 
 
+class OwnerAgentSpec(BaseModel):
+    agent_type: str
+    stake_percentage: float = 0.15
+
+
+class BatchDeployRequest(BaseModel):
+    owner_address: str
+    agents: list[OwnerAgentSpec] = Field(..., min_length=1, max_length=1000)
+
+
 class SpawnAgentRequest(DeployAgentRequest):
     config: dict = {}
 
 
+class BulkSpawnRequest(BaseModel):
+    agents: list[SpawnAgentRequest] = Field(..., min_length=1, max_length=1000)
+    concurrency: int = Field(50, ge=1, le=200)
+
+
+class BulkAgentIdsRequest(BaseModel):
+    agent_ids: list[str] = Field(..., min_length=1, max_length=1000)
+    concurrency: int = Field(50, ge=1, le=200)
+
+
 class RLIRequestPayload(BaseModel):
     member: str
     task_id: str
@@ -136,6 +331,19 @@ class TradeRequest(BaseModel):
     amount: float
 
 
+class BatchTradeRequest(BaseModel):
+    trades: list[TradeRequest] = Field(..., min_length=1, max_length=1000)
+
+
+class OrderRequest(BaseModel):
+    agent_id: str
+    resource: str
+    side: Literal["buy", "sell"]
+    order_type: Literal["limit", "market"] = "limit"
+    quantity: float = Field(..., gt=0)
+    price: float | None = Field(default=None, gt=0)
+
+
 @app.get("/")
 def health(request: Request):
     mark_request(request)
@@ -148,35 +356,85 @@ def healthz():
 
 
 @app.get("/metrics")
-def metrics(db: Session = Depends(get_db)):
-    total_rep = db.query(func.coalesce(func.sum(Member.rep), 0.0)).scalar() or 0.0
-    active_agents = db.query(Agent).filter(Agent.status == "active").count()
-    total_trades = db.query(Trade).count()
-
+def metrics(request: Request, db: Session = Depends(get_db)):
     lines = [
         f'forge_requests_total{{endpoint="{k}"}} {v}'
         for k, v in request_counter.items()
     ]
+    lines.extend(f"{name} {value}" for name, value in state_gauges.snapshot(db).items())
     lines.extend(
         [
-            f"forge_rep_total {float(total_rep)}",
-            f"forge_agents_active {active_agents}",
-            f"forge_trades_total {total_trades}",
+            f"forge_jwt_cache_hits_total {token_cache.hits}",
+            f"forge_jwt_cache_misses_total {token_cache.misses}",
+            f"forge_jwt_cache_entries {len(token_cache)}",
         ]
     )
+    gateway = getattr(request.app.state, "gateway", None)
+    lines.extend(f"{name} {value}" for name, value in gateway_metrics(gateway).items())
+    log_hub = getattr(request.app.state, "log_hub", None)
+    if log_hub is not None:
+        lines.append(f"forge_log_stream_upstreams {log_hub.upstreams}")
+        lines.append(f"forge_log_stream_viewers {log_hub.viewers}")
+    ipfs_cache = getattr(getattr(request.app.state, "ipfs", None), "cache", None)
+    if ipfs_cache is not None:
+        lines.extend(
+            [
+                f"forge_ipfs_cache_hits_total {ipfs_cache.hits}",
+                f"forge_ipfs_cache_misses_total {ipfs_cache.misses}",
+                f"forge_ipfs_cache_bytes {ipfs_cache.total_bytes}",
+            ]
+        )
+    order_engine = getattr(request.app.state, "order_engine", None)
+    if order_engine is not None:
+        lines.append(f"forge_order_fills_total {order_engine.fills_total}")
+        lines.append(f"forge_order_fills_pending {len(order_engine.pending)}")
+        lines.append(f"forge_order_fills_dead {len(order_engine.dead_letters)}")
+    for resource, state in sorted(price_engine.snapshot().items()):
+        lines.append(
+            f'forge_resource_unit_price{{resource="{resource}"}} {state["price"]}'
+        )
+    lines.extend(render_instrumentation())
     return PlainTextResponse("\n".join(lines) + "\n")
 
 
+AGENT_FIELDS = (
+    "agentid",
+    "agenttype",
+    "owneraddress",
+    "ownerrep",
+    "tier",
+    "status",
+    "createdat",
+    "lastheartbeat",
+)
+
+
 @app.get("/agents")
 def list_agents(
-    request: Request, db: Session = Depends(get_db), _: dict = Depends(require_tier(1))
+    request: Request,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    fields: str | None = None,
+    db: Session = Depends(get_db),
+    _: dict = Depends(require_tier(1)),
 ):
     mark_request(request)
-    rows = db.query(Agent).all()
-    return [
-        {"agentid": a.agentid, "agenttype": a.agenttype, "status": a.status}
-        for a in rows
+    try:
+        after = decode_cursor(cursor, str)
+        names = select_fields(
+            fields, AGENT_FIELDS, ("agentid", "agenttype", "status"), "agentid"
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    stmt = select(*(getattr(Agent, f) for f in names))
+    if after is not None:
+        stmt = stmt.where(Agent.agentid > after)
+    rows = [
+        dict(r._mapping) for r in db.execute(stmt.order_by(Agent.agentid).limit(limit))
     ]
+    _set_next_cursor(response, next_cursor(rows, "agentid", limit))
+    return rows
 
 
 @app.post("/agents/deploy")
@@ -187,9 +445,10 @@ def deploy_agent(
     _: dict = Depends(require_tier(2)),
 ):
     mark_request(request)
-    agent = deploy_agent_with_staking(
-        db, payload.owner_address, payload.agent_type, payload.stake_percentage
-    )
+    with _staking_errors():
+        agent = deploy_agent_with_staking(
+            db, payload.owner_address, payload.agent_type, payload.stake_percentage
+        )
     return {
         "agentid": agent.agentid,
         "owner": agent.owneraddress,
@@ -197,57 +456,241 @@ def deploy_agent(
     }
 
 
+@app.post("/agents/deploy/batch")
+def deploy_agents_batch(
+    request: Request,
+    payload: BatchDeployRequest,
+    db: Session = Depends(get_db),
+    _: dict = Depends(require_tier(2)),
+):
+    mark_request(request)
+    with _staking_errors():
+        agents = deploy_agents_for_owner(
+            db,
+            payload.owner_address,
+            [(a.agent_type, a.stake_percentage) for a in payload.agents],
+        )
+    return {
+        "owner": payload.owner_address,
+        "agents": [{"agentid": a.agentid, "staked_rep": a.ownerrep} for a in agents],
+    }
+
+
 @app.post("/agents/spawn")
-def spawn_agent(
+async def spawn_agent(
     request: Request,
     payload: SpawnAgentRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
+    gateway: AsyncOpenClawClient = Depends(get_gateway),
     _: dict = Depends(require_tier(2)),
 ):
     mark_request(request)
-    agent = deploy_agent_with_staking(
-        db, payload.owner_address, payload.agent_type, payload.stake_percentage
+    with _staking_errors():
+        agent = await db.run_sync(
+            deploy_agent_with_staking,
+            payload.owner_address,
+            payload.agent_type,
+            payload.stake_percentage,
+        )
+    result = await gateway.spawn_agent(
+        agent.agentid, payload.agent_type, payload.config
     )
-    result = OpenClawClient().spawn_agent(agent.agentid, payload.agent_type, payload.config)
     return {"agentid": agent.agentid, "status": agent.status, "runtime": result}
 
 
+async def _bulk_set_status(
+    db: AsyncSession, agent_ids: list[str], status: str
+) -> list[str]:
+    rows = (
+        await db.execute(
+            select(Agent.agentid, Agent.status).where(Agent.agentid.in_(agent_ids))
+        )
+    ).all()
+    found = [agentid for agentid, _ in rows]
+    if found:
+        await db.execute(
+            update(Agent).where(Agent.agentid.in_(found)).values(status=status),
+            execution_options={"synchronize_session": False},
+        )
+        was_active = sum(1 for _, old in rows if old == "active")
+        record_gauge_delta(
+            db.sync_session,
+            agents_active=int(status == "active") * len(found) - was_active,
+        )
+        await db.commit()
+    return found
+
+
+def _bulk_results(
+    agent_ids: list[str], found: list[str], status: str, runtimes: list[dict]
+):
+    by_id = dict(zip(found, runtimes))
+    return {
+        "results": [
+            (
+                {"agentid": agent_id, "status": status, "runtime": by_id[agent_id]}
+                if agent_id in by_id
+                else {"agentid": agent_id, "error": "agent not found"}
+            )
+            for agent_id in agent_ids
+        ]
+    }
+
+
+@app.post("/agents/bulk/spawn")
+async def bulk_spawn_agents(
+    request: Request,
+    payload: BulkSpawnRequest,
+    db: AsyncSession = Depends(get_async_db),
+    gateway: AsyncOpenClawClient = Depends(get_gateway),
+    _: dict = Depends(require_tier(2)),
+):
+    mark_request(request)
+    staked = await db.run_sync(
+        deploy_agents_with_staking,
+        [(a.owner_address, a.agent_type, a.stake_percentage) for a in payload.agents],
+    )
+    spawned = [
+        (agent, spec)
+        for agent, spec in zip(staked, payload.agents)
+        if not isinstance(agent, ValueError)
+    ]
+    runtimes = await gateway.spawn_many(
+        [(agent.agentid, spec.agent_type, spec.config) for agent, spec in spawned],
+        payload.concurrency,
+    )
+    by_agent = {id(agent): runtime for (agent, _), runtime in zip(spawned, runtimes)}
+    return {
+        "results": [
+            (
+                {"owner_address": spec.owner_address, "error": str(agent)}
+                if isinstance(agent, ValueError)
+                else {
+                    "agentid": agent.agentid,
+                    "status": agent.status,
+                    "runtime": by_agent[id(agent)],
+                }
+            )
+            for agent, spec in zip(staked, payload.agents)
+        ]
+    }
+
+
+@app.post("/agents/bulk/pause")
+async def bulk_pause_agents(
+    request: Request,
+    payload: BulkAgentIdsRequest,
+    db: AsyncSession = Depends(get_async_db),
+    gateway: AsyncOpenClawClient = Depends(get_gateway),
+    _: dict = Depends(require_tier(2)),
+):
+    mark_request(request)
+    found = await _bulk_set_status(db, payload.agent_ids, "paused")
+    runtimes = await gateway.pause_many(found, payload.concurrency)
+    return _bulk_results(payload.agent_ids, found, "paused", runtimes)
+
+
+@app.post("/agents/bulk/kill")
+async def bulk_kill_agents(
+    request: Request,
+    payload: BulkAgentIdsRequest,
+    db: AsyncSession = Depends(get_async_db),
+    gateway: AsyncOpenClawClient = Depends(get_gateway),
+    _: dict = Depends(require_tier(3)),
+):
+    mark_request(request)
+    found = await _bulk_set_status(db, payload.agent_ids, "killed")
+    runtimes = await gateway.kill_many(found, payload.concurrency)
+    return _bulk_results(payload.agent_ids, found, "killed", runtimes)
+
+
 @app.post("/agents/{agent_id}/pause")
-def pause_agent(
+async def pause_agent(
     agent_id: str,
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
+    gateway: AsyncOpenClawClient = Depends(get_gateway),
     _: dict = Depends(require_tier(2)),
 ):
     mark_request(request)
-    agent = db.query(Agent).filter(Agent.agentid == agent_id).first()
+    agent = await db.scalar(select(Agent).where(Agent.agentid == agent_id))
     if not agent:
         raise HTTPException(status_code=404, detail="agent not found")
     agent.status = "paused"
-    db.commit()
-    return {"agentid": agent_id, "status": "paused", "runtime": OpenClawClient().pause_agent(agent_id)}
+    await db.commit()
+    return {
+        "agentid": agent_id,
+        "status": "paused",
+        "runtime": await gateway.pause_agent(agent_id),
+    }
 
 
 @app.post("/agents/{agent_id}/kill")
-def kill_agent(
+async def kill_agent(
     agent_id: str,
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
+    gateway: AsyncOpenClawClient = Depends(get_gateway),
     _: dict = Depends(require_tier(3)),
 ):
     mark_request(request)
-    agent = db.query(Agent).filter(Agent.agentid == agent_id).first()
+    agent = await db.scalar(select(Agent).where(Agent.agentid == agent_id))
     if not agent:
         raise HTTPException(status_code=404, detail="agent not found")
     agent.status = "killed"
-    db.commit()
-    return {"agentid": agent_id, "status": "killed", "runtime": OpenClawClient().kill_agent(agent_id)}
+    await db.commit()
+    return {
+        "agentid": agent_id,
+        "status": "killed",
+        "runtime": await gateway.kill_agent(agent_id),
+    }
 
 
 @app.get("/agents/{agent_id}/logs")
-def agent_logs(agent_id: str, request: Request, _: dict = Depends(require_tier(1))):
+async def agent_logs(
+    agent_id: str,
+    request: Request,
+    gateway: AsyncOpenClawClient = Depends(get_gateway),
+    _: dict = Depends(require_tier(1)),
+):
+    mark_request(request)
+    return {"agentid": agent_id, "logs": await gateway.get_agent_logs(agent_id)}
+
+
+@app.get("/agents/{agent_id}/logs/stream")
+async def agent_logs_stream(
+    agent_id: str,
+    request: Request,
+    cursor: int | None = Query(None, ge=0),
+    backlog: int = Query(100, ge=0, le=5000),
+    follow: bool = True,
+    hub: LogTailHub = Depends(get_log_hub),
+    _: dict = Depends(require_tier(1)),
+):
+    """Server-sent events tail of an agent's log.
+
+    Each event's ``id`` is the line offset, so reconnecting clients resume via
+    ``Last-Event-ID`` (or ``cursor``) without re-downloading earlier lines.
+    """
     mark_request(request)
-    return {"agentid": agent_id, "logs": OpenClawClient().get_agent_logs(agent_id)}
+    last_event_id = request.headers.get("last-event-id")
+    if cursor is None and last_event_id and last_event_id.isdigit():
+        cursor = int(last_event_id) + 1
+
+    async def _events():
+        async for item in hub.subscribe(agent_id, cursor, backlog, follow):
+            if item is None:
+                yield ": keep-alive\n\n"
+                continue
+            offset, line = item
+            data = "".join(f"data: {part}\n" for part in str(line).split("\n"))
+            yield f"id: {offset}\n{data}\n"
+
+    return StreamingResponse(
+        _events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.post("/reputation/decay")
@@ -255,8 +698,127 @@ def trigger_decay(
     request: Request, db: Session = Depends(get_db), _: dict = Depends(require_tier(3))
 ):
     mark_request(request)
-    changed = apply_daily_rep_decay(db)
-    return {"updated_members": changed}
+    report = run_bulk_decay(db, chunk_size=settings.rep_decay_chunk_size)
+    return {
+        "updated_members": report.processed,
+        "run_id": report.run_id,
+        "chunks": report.chunks,
+        "resumed": report.resumed,
+        "members_per_second": round(report.members_per_second, 1),
+    }
+
+
+@app.post("/reputation/retier")
+def trigger_retier(
+    request: Request, db: Session = Depends(get_db), _: dict = Depends(require_tier(3))
+):
+    mark_request(request)
+    reload_tier_profiles()
+    try:
+        table = tier_table()
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    policy = decay_policy()
+    changed = retier_members(db, table.profile, policy.rate if policy.lazy else 0.0)
+    return {"profile": table.profile, "retiered_members": changed}
+
+
+@app.post("/reputation/snapshots")
+def trigger_rep_snapshots(
+    request: Request, db: Session = Depends(get_db), _: dict = Depends(require_tier(3))
+):
+    mark_request(request)
+    return {"snapshots": take_rep_snapshots(db)}
+
+
+@app.post("/reputation/history/compact")
+def trigger_rep_history_compaction(
+    request: Request,
+    retain_days: int = Query(default=90, ge=1),
+    db: Session = Depends(get_db),
+    _: dict = Depends(require_tier(3)),
+):
+    mark_request(request)
+    return compact_rep_history(db, retain_days)
+
+
+LORENZ_SHARES = (0.1, 0.25, 0.5, 0.75, 0.9, 0.99)
+PERCENTILES = (10, 25, 50, 75, 90, 99)
+
+
+@app.get("/reputation/leaderboard")
+def get_rep_leaderboard(
+    request: Request,
+    limit: int = Query(default=10, ge=1, le=MAX_PAGE_SIZE),
+    address: str | None = None,
+    db: Session = Depends(get_db),
+    _: dict = Depends(require_tier(0)),
+):
+    mark_request(request)
+    rep_index.ensure_seeded(db)
+    top = [
+        {"rank": i, "address": addr, "rep": rep}
+        for i, (addr, rep) in enumerate(rep_index.top(limit), start=1)
+    ]
+    body: dict = {"members": len(rep_index), "top": top}
+    if address is not None:
+        rank = rep_index.rank(address)
+        if rank is None:
+            raise HTTPException(status_code=404, detail="member not found")
+        body["member"] = {
+            "address": address,
+            "rank": rank,
+            "rep": rep_index.rep_of(address),
+            "percentile": 100.0 * (len(rep_index) - rank + 1) / len(rep_index),
+        }
+    return body
+
+
+@app.get("/reputation/stats")
+def get_rep_stats(
+    request: Request, db: Session = Depends(get_db), _: dict = Depends(require_tier(0))
+):
+    mark_request(request)
+    rep_index.ensure_seeded(db)
+    n = len(rep_index)
+    table = tier_table()
+    at_least = [n, *(rep_index.count_at_least(t) for t in table.thresholds[1:]), 0]
+    return {
+        "members": n,
+        "total_rep": rep_index.total,
+        "mean_rep": rep_index.total / n if n else 0.0,
+        "gini": rep_index.gini(),
+        "percentiles": {f"p{p}": rep_index.percentile(p) for p in PERCENTILES},
+        "lorenz": [
+            {"population_share": pop, "rep_share": share}
+            for pop, share in rep_index.lorenz(LORENZ_SHARES)
+        ],
+        "tiers": {
+            str(tier): at_least[i] - at_least[i + 1]
+            for i, tier in enumerate(table.tiers)
+        },
+    }
+
+
+@app.get("/reputation/{address}/at")
+def get_rep_at(
+    address: str,
+    request: Request,
+    timestamp: datetime,
+    db: Session = Depends(get_db),
+    _: dict = Depends(require_tier(1)),
+):
+    mark_request(request)
+    result = rep_at(db, address, _naive_utc(timestamp))
+    if result is None:
+        raise HTTPException(status_code=404, detail="member not found")
+    return {
+        "address": result.address,
+        "timestamp": result.at.isoformat(),
+        "rep": result.rep,
+        "tier": result.tier,
+        "snapshot_at": result.snapshot_at.isoformat() if result.snapshot_at else None,
+    }
 
 
 @app.post("/rli/request")
@@ -282,22 +844,88 @@ def rli_stats(member: str, request: Request, _: dict = Depends(require_tier(1)))
     return {"member": member, "avg_automation": 0, "tasks": 0, "qualified": False}
 
 
-@app.post("/storage/upload")
-def storage_upload(
+@app.post(
+    "/storage/upload",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/octet-stream": {
+                    "schema": {"type": "string", "format": "binary"}
+                }
+            },
+        }
+    },
+)
+async def storage_upload(
     request: Request,
-    content: bytes = Body(..., media_type="application/octet-stream"),
+    ipfs: AsyncIPFSStorage = Depends(get_ipfs),
     _: dict = Depends(require_tier(1)),
 ):
     mark_request(request)
-    cid = IPFSStorage().upload(content)
+    cid = await ipfs.upload_stream(request.stream())
     return {"cid": cid}
 
 
+def _cached_file_response(cid: str, fh, size: int, range_header: str | None):
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": f'"{cid}"',
+        "Cache-Control": "public, max-age=31536000, immutable",
+    }
+    try:
+        byte_range = parse_byte_range(range_header, size)
+    except ValueError:
+        fh.close()
+        headers["Content-Range"] = f"bytes */{size}"
+        return Response(status_code=416, headers=headers)
+    status = 200
+    start, end = 0, size - 1
+    if byte_range is not None:
+        start, end = byte_range
+        status = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        iter_file_range(fh, start, end),
+        status_code=status,
+        media_type="application/octet-stream",
+        headers=headers,
+    )
+
+
 @app.get("/storage/{cid}")
-def storage_download(cid: str, request: Request):
+async def storage_download(
+    cid: str, request: Request, ipfs: AsyncIPFSStorage = Depends(get_ipfs)
+):
     mark_request(request)
-    content = IPFSStorage().download(cid)
-    return Response(content=content, media_type="application/octet-stream")
+    if not is_valid_cid(cid):
+        raise HTTPException(status_code=400, detail="invalid cid")
+    range_header = request.headers.get("range")
+
+    if ipfs.cache is not None:
+        cached = await run_in_threadpool(ipfs.cache.open_entry, cid)
+        if cached is None and range_header:
+            try:
+                cached = await ipfs.fill_cache(cid)
+            except ContentIntegrityError as exc:
+                raise HTTPException(status_code=502, detail=str(exc)) from exc
+        if cached is not None:
+            return _cached_file_response(cid, cached[0], cached[1], range_header)
+
+    upstream = await ipfs.open_download(cid)
+    headers = {}
+    if (
+        "content-length" in upstream.headers
+        and "content-encoding" not in upstream.headers
+    ):
+        headers["Content-Length"] = upstream.headers["content-length"]
+    return StreamingResponse(
+        ipfs.stream_and_cache(upstream, cid),
+        media_type="application/octet-stream",
+        headers=headers,
+        background=BackgroundTask(upstream.aclose),
+    )
 
 
 @app.post("/webhook/sms")
@@ -309,12 +937,25 @@ def sms_webhook(body: str = ""):
 @app.get("/governance/proposals")
 def list_governance_proposals(
     request: Request,
+    response: Response,
     status: str | None = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    fields: str | None = None,
     db: Session = Depends(get_db),
     _: dict = Depends(require_tier(1)),
 ):
     mark_request(request)
-    return MetaDAOService(db).list_proposals(status=status)
+    try:
+        before = decode_cursor(cursor, int)
+        names = select_fields(fields, PROPOSAL_FIELDS, PROPOSAL_DEFAULT_FIELDS, "id")
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    rows = MetaDAOService(db).list_proposals(
+        status=status, limit=limit, before_id=before, fields=names
+    )
+    _set_next_cursor(response, next_cursor(rows, "id", limit))
+    return rows
 
 
 @app.post("/governance/proposals")
@@ -371,27 +1012,250 @@ def trade_request(
     }
 
 
+@app.post("/economy/trades/batch")
+def trade_request_batch(
+    request: Request,
+    payload: BatchTradeRequest,
+    db: Session = Depends(get_db),
+    _: dict = Depends(require_tier(1)),
+):
+    mark_request(request)
+    results = M2MMarketService(db).request_trades_batch(
+        [(t.buyer_agent, t.seller_agent, t.resource, t.amount) for t in payload.trades]
+    )
+    accepted = sum(1 for r in results if "error" not in r)
+    return {
+        "accepted": accepted,
+        "rejected": len(results) - accepted,
+        "results": [
+            (
+                {"index": i, "status": "rejected", **r}
+                if "error" in r
+                else {"index": i, "status": "accepted", "trade": r}
+            )
+            for i, r in enumerate(results)
+        ],
+    }
+
+
+@app.post("/economy/orders")
+def submit_order(
+    request: Request,
+    payload: OrderRequest,
+    db: Session = Depends(get_db),
+    order_engine: MatchingEngine = Depends(get_order_engine),
+    claims: dict = Depends(require_tier(1)),
+):
+    mark_request(request)
+    if (payload.order_type == "limit") != (payload.price is not None):
+        raise HTTPException(
+            status_code=400,
+            detail="limit orders need a price, market orders must not set one",
+        )
+    if db.get(Agent, payload.agent_id) is None:
+        raise HTTPException(status_code=400, detail="agent not found")
+    market = M2MMarketService(db)
+    now = datetime.utcnow()
+    reserved = None
+    try:
+        if payload.side == "buy":
+            # Buyers pay at most their limit; market buys reserve the current sweep.
+            reserved = (
+                payload.price * payload.quantity
+                if payload.price is not None
+                else order_engine.sweep_cost(
+                    payload.resource, payload.quantity, payload.agent_id
+                )
+            )
+            market.reserve_budget(payload.agent_id, reserved, now)
+        order, fills = order_engine.submit(
+            payload.agent_id,
+            payload.resource,
+            payload.side,
+            payload.quantity,
+            payload.price,
+            owner=claims.get("sub"),
+            max_cost=reserved,
+            now=now,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    if reserved is not None:
+        # Price improvement and an unrested market remainder go back to the budget.
+        unused = reserved - sum(f.price * f.quantity for f in fills)
+        if payload.price is not None:
+            unused -= order.remaining * payload.price
+        if unused > 1e-9:
+            market.release_budget(payload.agent_id, unused, now)
+    # Fills are persisted by the lifespan flusher; the order has matched either way.
+    filled = payload.quantity - order.remaining
+    if not order.remaining:
+        status = "filled"
+    elif filled:
+        status = "partially_filled"
+    else:
+        status = "resting" if payload.order_type == "limit" else "unfilled"
+    return {
+        "order_id": order.order_id,
+        "status": status,
+        "filled": filled,
+        # Market orders never rest: whatever did not fill is dropped.
+        "remaining": order.remaining if payload.order_type == "limit" else 0.0,
+        "fills": [f.as_dict() for f in fills],
+    }
+
+
+@app.delete("/economy/orders/{order_id}")
+def cancel_order(
+    order_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    order_engine: MatchingEngine = Depends(get_order_engine),
+    claims: dict = Depends(require_tier(1)),
+):
+    mark_request(request)
+    try:
+        order = order_engine.cancel(order_id, claims.get("sub"))
+    except PermissionError as exc:
+        raise HTTPException(status_code=403, detail=str(exc)) from exc
+    if order is None:
+        raise HTTPException(status_code=404, detail="order not found or already filled")
+    if order.side == "buy":
+        M2MMarketService(db).release_budget(
+            order.agent_id, order.cancelled * order.price, order.placed_at
+        )
+    return {"order_id": order_id, "status": "cancelled"}
+
+
+@app.get("/economy/orderbook/{resource}")
+def get_order_book(
+    resource: str,
+    request: Request,
+    levels: int = Query(default=10, ge=1, le=100),
+    order_engine: MatchingEngine = Depends(get_order_engine),
+    _: dict = Depends(require_tier(1)),
+):
+    mark_request(request)
+    try:
+        return order_engine.depth(resource, levels)
+    except ValueError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+
+
 @app.get("/economy/trades/{agent_id}")
 def trade_list(
     agent_id: str,
     request: Request,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    fields: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
     db: Session = Depends(get_db),
     _: dict = Depends(require_tier(1)),
 ):
     mark_request(request)
-    trades = M2MMarketService(db).list_trades_for_agent(agent_id)
-    return [
-        {
-            "id": t.id,
-            "buyer_agent": t.buyer_agent,
-            "seller_agent": t.seller_agent,
-            "resource_type": t.resource_type,
-            "amount": t.amount,
-            "price": t.price,
-            "status": t.status,
-        }
-        for t in trades
-    ]
+    try:
+        before = decode_cursor(cursor, (datetime, int))
+        names = select_fields(
+            fields, TRADE_FIELDS, TRADE_DEFAULT_FIELDS, ("id", "created_at")
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    rows = M2MMarketService(db).list_trades_for_agent(
+        agent_id,
+        limit=limit,
+        before=before,
+        fields=names,
+        since=_naive_utc(since),
+        until=_naive_utc(until),
+    )
+    _set_next_cursor(response, next_cursor(rows, ("created_at", "id"), limit))
+    return rows
+
+
+@app.get("/economy/trades/{agent_id}/summary")
+def trade_summary(
+    agent_id: str,
+    request: Request,
+    counterparties: int = Query(default=10, ge=0, le=100),
+    db: Session = Depends(get_db),
+    _: dict = Depends(require_tier(1)),
+):
+    mark_request(request)
+    summary = agent_trade_summary(db, agent_id, counterparties)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="no trades for agent")
+    return summary
+
+
+@app.post("/economy/trades/stats/rebuild")
+def rebuild_trade_summaries(
+    request: Request, db: Session = Depends(get_db), _: dict = Depends(require_tier(3))
+):
+    mark_request(request)
+    return {"agents": rebuild_trade_stats(db)}
+
+
+@app.get("/economy/market/{resource}/candles")
+def market_candles(
+    resource: str,
+    request: Request,
+    interval: str = "1h",
+    since: datetime | None = None,
+    until: datetime | None = None,
+    limit: int = Query(default=500, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db),
+    _: dict = Depends(require_tier(1)),
+):
+    mark_request(request)
+    try:
+        candles = list_candles(
+            db, resource, interval, _naive_utc(since), _naive_utc(until), limit
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return {"resource": resource, "interval": interval, "candles": candles}
+
+
+@app.post("/economy/market/candles/backfill")
+def trigger_candle_backfill(
+    request: Request,
+    since: datetime | None = None,
+    db: Session = Depends(get_db),
+    _: dict = Depends(require_tier(3)),
+):
+    mark_request(request)
+    return {"trades": backfill_candles(db, _naive_utc(since))}
+
+
+@app.post("/economy/settlement/run")
+def run_settlement(
+    request: Request,
+    max_batches: int = Query(default=10, ge=1, le=1000),
+    backend: EscrowBackend = Depends(get_escrow_backend),
+    _: dict = Depends(require_tier(3)),
+):
+    mark_request(request)
+    worker = SettlementWorker(
+        SessionLocal, backend, batch_size=settings.settlement_batch_size
+    )
+    try:
+        report = worker.run(max_batches)
+    except Exception as exc:
+        raise HTTPException(
+            status_code=502, detail=f"settlement failed: {exc}"
+        ) from exc
+    return {
+        "batches": report.batches,
+        "transactions": report.transactions,
+        "settled": report.settled,
+        "failed": report.failed,
+        "reconciled": report.reconciled,
+        "seconds": report.seconds,
+        "trades_per_second": report.trades_per_second,
+    }
 
 
 @app.get("/economy/budget/{agent_id}")
@@ -1,6 +1,15 @@
 from datetime import datetime
 
-from sqlalchemy import Boolean, DateTime, Float, ForeignKey, Integer, String, Text
+from sqlalchemy import (
+    Boolean,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Text,
+)
 from sqlalchemy.orm import Mapped, mapped_column
 
 from database import Base
@@ -14,6 +23,9 @@ class Member(Base):
     rep: Mapped[float] = mapped_column(Float, default=0)
     tier: Mapped[int] = mapped_column(Integer, default=0)
     role: Mapped[str] = mapped_column(String(64), default="member")
+    rep_updated_at: Mapped[datetime | None] = mapped_column(
+        DateTime, nullable=True, default=datetime.utcnow
+    )
 
 
 class Agent(Base):
@@ -35,6 +47,10 @@ class Agent(Base):
 
 class RepHistory(Base):
     __tablename__ = "rep_history"
+    __table_args__ = (
+        Index("ix_rep_history_member_ts", "memberaddress", "timestamp"),
+        Index("ix_rep_history_timestamp", "timestamp"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     memberaddress: Mapped[str] = mapped_column(String(128), nullable=False)
@@ -47,6 +63,33 @@ class RepHistory(Base):
     timestamp: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
 
+class RepHistoryArchive(Base):
+    __tablename__ = "rep_history_archive"
+    __table_args__ = (
+        Index("ix_rep_history_archive_member_ts", "memberaddress", "timestamp"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    memberaddress: Mapped[str] = mapped_column(String(128), nullable=False)
+    agentid: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    repchange: Mapped[float] = mapped_column(Float, nullable=False)
+    reason: Mapped[str] = mapped_column(String(255), nullable=False)
+    tierbefore: Mapped[int] = mapped_column(Integer, default=0)
+    tierafter: Mapped[int] = mapped_column(Integer, default=0)
+    txhash: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    timestamp: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+
+class RepSnapshot(Base):
+    __tablename__ = "rep_snapshots"
+
+    memberaddress: Mapped[str] = mapped_column(String(128), primary_key=True)
+    taken_at: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    rep: Mapped[float] = mapped_column(Float, nullable=False)
+    tier: Mapped[int] = mapped_column(Integer, default=0)
+    rep_updated_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+
 class Proposal(Base):
     __tablename__ = "proposals"
 
@@ -61,8 +104,23 @@ class Proposal(Base):
     execution_tx: Mapped[str | None] = mapped_column(String(128), nullable=True)
 
 
+class Vote(Base):
+    __tablename__ = "votes"
+
+    proposal_id: Mapped[int] = mapped_column(
+        ForeignKey("proposals.id"), primary_key=True
+    )
+    voter: Mapped[str] = mapped_column(ForeignKey("members.address"), primary_key=True)
+    support: Mapped[bool] = mapped_column(Boolean, nullable=False)
+    voted_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
 class Trade(Base):
     __tablename__ = "trades"
+    __table_args__ = (
+        Index("ix_trades_buyer_created_id", "buyer_agent", "created_at", "id"),
+        Index("ix_trades_seller_created_id", "seller_agent", "created_at", "id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     buyer_agent: Mapped[str] = mapped_column(ForeignKey("agents.agentid"), nullable=False)
@@ -86,3 +144,77 @@ class AgentBudget(Base):
     spent_this_week: Mapped[float] = mapped_column(Float, default=0.0)
     last_reset_daily: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     last_reset_weekly: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    window_hour: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
+
+class AgentSpendBucket(Base):
+    __tablename__ = "agent_spend_buckets"
+
+    agent_id: Mapped[str] = mapped_column(String(128), primary_key=True)
+    slot: Mapped[int] = mapped_column(Integer, primary_key=True)
+    hour: Mapped[int] = mapped_column(Integer, nullable=False)
+    amount: Mapped[float] = mapped_column(Float, default=0.0)
+
+
+class MarketCandle(Base):
+    __tablename__ = "market_candles"
+
+    resource_type: Mapped[str] = mapped_column(String(32), primary_key=True)
+    period: Mapped[str] = mapped_column(String(8), primary_key=True)
+    bucket_start: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    open: Mapped[float] = mapped_column(Float, nullable=False)
+    high: Mapped[float] = mapped_column(Float, nullable=False)
+    low: Mapped[float] = mapped_column(Float, nullable=False)
+    close: Mapped[float] = mapped_column(Float, nullable=False)
+    volume: Mapped[float] = mapped_column(Float, default=0.0)
+    notional: Mapped[float] = mapped_column(Float, default=0.0)
+    trades: Mapped[int] = mapped_column(Integer, default=0)
+    open_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    close_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+
+class AgentTradeStats(Base):
+    __tablename__ = "agent_trade_stats"
+
+    agent_id: Mapped[str] = mapped_column(String(128), primary_key=True)
+    trades_bought: Mapped[int] = mapped_column(Integer, default=0)
+    trades_sold: Mapped[int] = mapped_column(Integer, default=0)
+    volume_bought: Mapped[float] = mapped_column(Float, default=0.0)
+    volume_sold: Mapped[float] = mapped_column(Float, default=0.0)
+    spend: Mapped[float] = mapped_column(Float, default=0.0)
+    revenue: Mapped[float] = mapped_column(Float, default=0.0)
+    first_trade_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    last_trade_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+
+class AgentCounterparty(Base):
+    __tablename__ = "agent_counterparties"
+
+    agent_id: Mapped[str] = mapped_column(String(128), primary_key=True)
+    counterparty: Mapped[str] = mapped_column(String(128), primary_key=True)
+    trades: Mapped[int] = mapped_column(Integer, default=0)
+    volume: Mapped[float] = mapped_column(Float, default=0.0)
+    spend: Mapped[float] = mapped_column(Float, default=0.0)
+    revenue: Mapped[float] = mapped_column(Float, default=0.0)
+    last_trade_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+
+class ResourcePrice(Base):
+    __tablename__ = "resource_prices"
+
+    resource_type: Mapped[str] = mapped_column(String(32), primary_key=True)
+    demand_ewma: Mapped[float] = mapped_column(Float, default=0.0)
+    supply_ewma: Mapped[float] = mapped_column(Float, default=0.0)
+    price: Mapped[float] = mapped_column(Float, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class JobCheckpoint(Base):
+    __tablename__ = "job_checkpoints"
+
+    job_id: Mapped[str] = mapped_column(String(128), primary_key=True)
+    last_key: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    processed: Mapped[int] = mapped_column(Integer, default=0)
+    status: Mapped[str] = mapped_column(String(32), default="running")
+    started_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,192 @@
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import DateTime, event, func, inspect, literal
+from sqlalchemy.orm import Session
+
+from database import days_between
+from models import Agent, Member, Trade
+
+_PENDING_KEY = "forge_gauge_deltas"
+
+
+class StateGauges:
+    """REP/agent/trade gauges maintained from committed ORM writes.
+
+    Values are seeded with one aggregate query and then adjusted from each
+    committed flush, so a scrape does no table scans. Writes that bypass the
+    unit of work (bulk SQL) either call :func:`record_gauge_delta` or
+    :meth:`invalidate`; the gauges are also re-seeded every
+    ``reconcile_seconds`` to pick up writes made by other worker processes.
+
+    With lazy REP decay (``decay_rate`` > 0) ``rep_total`` is kept normalised
+    to the seed epoch: each member contributes ``rep * (1 - rate)^days`` from
+    its ``rep_updated_at`` to the epoch, and a scrape scales the sum forward
+    to now, so the untouched majority of members costs nothing per scrape.
+    """
+
+    def __init__(self, reconcile_seconds: float = 300.0):
+        self.reconcile_seconds = reconcile_seconds
+        self.rep_total = 0.0
+        self.agents_active = 0
+        self.trades_total = 0
+        self.decay_rate = 0.0
+        self._epoch = datetime.utcnow()
+        self._seeded_at: float | None = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._seeded_at = None
+
+    def configure_decay(self, rate: float):
+        with self._lock:
+            self.decay_rate = rate
+            self._seeded_at = None
+
+    def _factor(self, later: datetime, earlier: datetime | None) -> float:
+        if not self.decay_rate or earlier is None:
+            return 1.0
+        return (1 - self.decay_rate) ** ((later - earlier).total_seconds() / 86400)
+
+    def rep_contribution(self, rep: float | None, updated_at: datetime | None) -> float:
+        return (rep or 0.0) * self._factor(self._epoch, updated_at)
+
+    def seed(self, db: Session):
+        epoch = datetime.utcnow()
+        rep = Member.rep
+        if self.decay_rate:
+            at = literal(epoch, DateTime)
+            days = days_between(
+                db.get_bind().dialect.name, at, func.coalesce(Member.rep_updated_at, at)
+            )
+            rep = rep * func.power(1 - self.decay_rate, days)
+        rep_total = db.query(func.coalesce(func.sum(rep), 0.0)).scalar() or 0.0
+        agents_active = db.query(Agent).filter(Agent.status == "active").count()
+        trades_total = db.query(Trade).count()
+        with self._lock:
+            self.rep_total = float(rep_total)
+            self.agents_active = agents_active
+            self.trades_total = trades_total
+            self._epoch = epoch
+            self._seeded_at = time.monotonic()
+
+    def snapshot(self, db: Session) -> dict[str, float]:
+        seeded_at = self._seeded_at
+        if seeded_at is None or time.monotonic() - seeded_at > self.reconcile_seconds:
+            self.seed(db)
+        with self._lock:
+            return {
+                "forge_rep_total": float(
+                    self.rep_total * self._factor(datetime.utcnow(), self._epoch)
+                ),
+                "forge_agents_active": self.agents_active,
+                "forge_trades_total": self.trades_total,
+            }
+
+    def apply(self, rep: float = 0.0, agents_active: int = 0, trades: int = 0):
+        with self._lock:
+            self.rep_total += rep
+            self.agents_active += agents_active
+            self.trades_total += trades
+
+
+state_gauges = StateGauges()
+
+
+def _pending(session: Session) -> dict:
+    return session.info.setdefault(
+        _PENDING_KEY, {"rep": 0.0, "agents_active": 0, "trades": 0}
+    )
+
+
+def record_gauge_delta(
+    session: Session, rep: float = 0.0, agents_active: int = 0, trades: int = 0
+):
+    """Queue a gauge adjustment that is applied only if ``session`` commits."""
+    pending = _pending(session)
+    pending["rep"] += rep
+    pending["agents_active"] += agents_active
+    pending["trades"] += trades
+
+
+def _old_and_new(obj, attr: str):
+    history = inspect(obj).attrs[attr].history
+    if not history.added:
+        return None
+    old = history.deleted[0] if history.deleted else None
+    return old, history.added[0]
+
+
+def _member_rep_delta(obj: Member) -> float | None:
+    """Change in ``obj``'s epoch-normalised REP, or None if the old value is unknown."""
+    attrs = inspect(obj).attrs
+    before = []
+    for attr in ("rep", "rep_updated_at"):
+        history = attrs[attr].history
+        if not history.added:
+            before.append(getattr(obj, attr))
+        elif history.deleted:
+            before.append(history.deleted[0])
+        else:
+            return None
+    return state_gauges.rep_contribution(
+        obj.rep, obj.rep_updated_at
+    ) - state_gauges.rep_contribution(*before)
+
+
+def _after_flush(session: Session, flush_context):
+    pending = _pending(session)
+    for obj in session.new:
+        if isinstance(obj, Member):
+            pending["rep"] += state_gauges.rep_contribution(obj.rep, obj.rep_updated_at)
+        elif isinstance(obj, Agent):
+            pending["agents_active"] += int(obj.status == "active")
+        elif isinstance(obj, Trade):
+            pending["trades"] += 1
+
+    for obj in session.dirty:
+        if isinstance(obj, Member):
+            attrs = inspect(obj).attrs
+            if not (attrs.rep.history.added or attrs.rep_updated_at.history.added):
+                continue
+            delta = _member_rep_delta(obj)
+            if delta is None:
+                state_gauges.invalidate()
+                continue
+            pending["rep"] += delta
+        elif isinstance(obj, Agent):
+            change = _old_and_new(obj, "status")
+            if change is None:
+                continue
+            old, new = change
+            if old is None:
+                state_gauges.invalidate()
+                continue
+            pending["agents_active"] += int(new == "active") - int(old == "active")
+
+    for obj in session.deleted:
+        if isinstance(obj, Member):
+            pending["rep"] -= state_gauges.rep_contribution(obj.rep, obj.rep_updated_at)
+        elif isinstance(obj, Agent):
+            pending["agents_active"] -= int(obj.status == "active")
+        elif isinstance(obj, Trade):
+            pending["trades"] -= 1
+
+
+def _after_commit(session: Session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        state_gauges.apply(pending["rep"], pending["agents_active"], pending["trades"])
+
+
+def _after_rollback(session: Session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def install_gauge_listeners():
+    if not event.contains(Session, "after_flush", _after_flush):
+        event.listen(Session, "after_flush", _after_flush)
+        event.listen(Session, "after_commit", _after_commit)
+        event.listen(Session, "after_rollback", _after_rollback)
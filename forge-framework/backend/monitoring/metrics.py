@@ -0,0 +1,200 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, *labelvalues: str):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for values, total in self._values.items():
+                lines.append(f"{self.name}{_labels(self.labelnames, values)} {total}")
+        return lines
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram keyed by label values."""
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict[tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues: str):
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                # Per-bucket (non-cumulative) counts, +Inf bucket, sum.
+                series = self._series[labelvalues] = [
+                    [0] * (len(self.buckets) + 1),
+                    0.0,
+                ]
+            series[0][idx] += 1
+            series[1] += value
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            for values, (counts, total) in self._series.items():
+                running = 0
+                for bound, count in zip(self.buckets, counts):
+                    running += count
+                    le = _labels(self.labelnames, values, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{le} {running}")
+                running += counts[-1]
+                le = _labels(self.labelnames, values, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{le} {running}")
+                label_str = _labels(self.labelnames, values)
+                lines.append(f"{self.name}_sum{label_str} {total}")
+                lines.append(f"{self.name}_count{label_str} {running}")
+        return lines
+
+
+@dataclass
+class RequestDBStats:
+    queries: int = 0
+    seconds: float = 0.0
+
+
+_current_db_stats: ContextVar[RequestDBStats | None] = ContextVar(
+    "forge_request_db_stats", default=None
+)
+
+http_request_duration = Histogram(
+    "forge_http_request_duration_seconds",
+    "HTTP request latency by route template, method and status.",
+    ("route", "method", "status"),
+)
+db_queries_per_request = Histogram(
+    "forge_db_queries_per_request",
+    "SQL statements executed while serving a request.",
+    ("route",),
+    QUERY_COUNT_BUCKETS,
+)
+db_time_per_request = Histogram(
+    "forge_db_time_per_request_seconds",
+    "Time spent in SQL statements while serving a request.",
+    ("route",),
+)
+db_queries_total = Counter("forge_db_queries_total", "SQL statements executed.")
+db_query_seconds_total = Counter(
+    "forge_db_query_seconds_total", "Total time spent executing SQL statements."
+)
+
+
+def render_instrumentation() -> list[str]:
+    lines: list[str] = []
+    for metric in (
+        http_request_duration,
+        db_queries_per_request,
+        db_time_per_request,
+        db_queries_total,
+        db_query_seconds_total,
+    ):
+        lines.extend(metric.render())
+    return lines
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the execution context, so a failed statement leaves nothing
+    # behind on the pooled connection.
+    if context is not None:
+        context._forge_query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_forge_query_start", None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    db_queries_total.inc()
+    db_query_seconds_total.inc(elapsed)
+    stats = _current_db_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.seconds += elapsed
+
+
+def instrument_engine(engine: Engine):
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class InstrumentationMiddleware:
+    """ASGI middleware recording latency and DB usage per matched route.
+
+    Unmatched paths are collapsed into a single ``unmatched`` label so that
+    scanners cannot blow up series cardinality.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestDBStats()
+        token = _current_db_stats.set(stats)
+        status = 500
+        started = time.perf_counter()
+
+        async def _send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current_db_stats.reset(token)
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            http_request_duration.observe(
+                elapsed, route_path, scope["method"], str(status)
+            )
+            db_queries_per_request.observe(stats.queries, route_path)
+            db_time_per_request.observe(stats.seconds, route_path)
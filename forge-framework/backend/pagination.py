@@ -0,0 +1,81 @@
+import base64
+import json
+from collections.abc import Sequence
+from datetime import datetime
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+def _jsonable(value: object) -> object:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def encode_cursor(key: object) -> str:
+    if isinstance(key, (tuple, list)):
+        key = [_jsonable(part) for part in key]
+    raw = json.dumps([_jsonable(key)], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def _typed(value: object, key_type: type) -> object:
+    if key_type is datetime and isinstance(value, str):
+        return datetime.fromisoformat(value)
+    if not isinstance(value, key_type) or isinstance(value, bool):
+        raise ValueError("invalid cursor")
+    return value
+
+
+def decode_cursor(
+    cursor: str | None, key_type: type | tuple[type, ...]
+) -> object | None:
+    """Decode a cursor from :func:`encode_cursor`; its key must be a ``key_type``.
+
+    A tuple of types describes a composite key, decoded to a tuple. A cursor
+    minted by another endpoint (or tampered with) decodes to the wrong type,
+    which would otherwise reach the database as a mistyped comparison, so it
+    is rejected as invalid.
+    """
+    if not cursor:
+        return None
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        (key,) = json.loads(base64.urlsafe_b64decode(cursor + padding))
+        if not isinstance(key_type, tuple):
+            return _typed(key, key_type)
+        if not isinstance(key, list) or len(key) != len(key_type):
+            raise ValueError("invalid cursor")
+        return tuple(_typed(part, t) for part, t in zip(key, key_type))
+    except (ValueError, TypeError) as exc:
+        raise ValueError("invalid cursor") from exc
+
+
+def select_fields(
+    requested: str | None,
+    allowed: Sequence[str],
+    default: Sequence[str],
+    key: str | Sequence[str],
+) -> list[str]:
+    """Resolve a ``fields=a,b`` query into column names; the keyset key is always kept."""
+    keys = [key] if isinstance(key, str) else list(key)
+    if not requested:
+        names = list(default)
+    else:
+        names = [f.strip() for f in requested.split(",") if f.strip()]
+        unknown = sorted(set(names) - set(allowed))
+        if unknown:
+            raise ValueError(f"unknown fields: {', '.join(unknown)}")
+    for k in reversed(keys):
+        if k not in names:
+            names.insert(0, k)
+    return names
+
+
+def next_cursor(
+    rows: Sequence[dict], key: str | Sequence[str], limit: int
+) -> str | None:
+    if len(rows) < limit:
+        return None
+    if isinstance(key, str):
+        return encode_cursor(rows[-1][key])
+    return encode_cursor([rows[-1][k] for k in key])
@@ -0,0 +1,95 @@
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Mapping
+
+from fastapi import HTTPException
+
+
+class _Window:
+    __slots__ = ("start", "current", "previous", "last_seen")
+
+    def __init__(self, start: float, now: float):
+        self.start = start
+        self.current = 0
+        self.previous = 0
+        self.last_seen = now
+
+
+class SlidingWindowRateLimiter:
+    """Fixed-bucket sliding-window limiter with O(1) work per hit.
+
+    Each key keeps two counters (current and previous window); the effective
+    count is the previous bucket weighted by its remaining overlap plus the
+    current bucket. Keys are held in LRU order and evicted once idle for two
+    windows or when ``max_keys`` is exceeded, so memory stays bounded by the
+    number of recently active clients.
+    """
+
+    def __init__(
+        self,
+        max_per_minute: int,
+        tier_quotas: Mapping[int, int] | None = None,
+        window_seconds: float = 60.0,
+        max_keys: int = 100_000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_per_minute = max_per_minute
+        self.tier_quotas = dict(tier_quotas or {})
+        self.window = window_seconds
+        self.max_keys = max_keys
+        self.clock = clock
+        self._windows: OrderedDict[str, _Window] = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._windows)
+
+    def reset(self):
+        with self._lock:
+            self._windows.clear()
+
+    def quota_for(self, tier: int) -> int:
+        return self.tier_quotas.get(tier, self.max_per_minute)
+
+    def _evict(self, now: float):
+        idle_cutoff = now - 2 * self.window
+        windows = self._windows
+        while windows:
+            oldest = next(iter(windows.values()))
+            if len(windows) <= self.max_keys and oldest.last_seen > idle_cutoff:
+                break
+            windows.popitem(last=False)
+            self.evictions += 1
+
+    def hit(self, key: str, tier: int = 0) -> bool:
+        now = self.clock()
+        limit = self.quota_for(tier)
+        with self._lock:
+            w = self._windows.get(key)
+            bucket_start = now - (now % self.window)
+            if w is None:
+                w = _Window(bucket_start, now)
+                self._windows[key] = w
+            else:
+                self._windows.move_to_end(key)
+                elapsed_buckets = int((bucket_start - w.start) // self.window)
+                if elapsed_buckets == 1:
+                    w.previous, w.current = w.current, 0
+                    w.start = bucket_start
+                elif elapsed_buckets > 1:
+                    w.previous = w.current = 0
+                    w.start = bucket_start
+                w.last_seen = now
+
+            overlap = 1.0 - (now - w.start) / self.window
+            allowed = w.previous * overlap + w.current < limit
+            if allowed:
+                w.current += 1
+            self._evict(now)
+        return allowed
+
+    def enforce(self, key: str, tier: int = 0):
+        if not self.hit(key, tier):
+            raise HTTPException(status_code=429, detail="Rate limit exceeded")
@@ -1,54 +1,191 @@
 import uuid
+from collections.abc import Sequence
 from datetime import datetime
 
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
 
 from models import Agent, Member, RepHistory
+from monitoring.gauges import record_gauge_delta, state_gauges
+from reputation.leaderboard import record_rank_update
+from reputation.redqueen import LAZY_DECAY_REASON, effective_rep
+from reputation.tier_engine import tier_for_rep
 
+MAX_STAKE_ATTEMPTS = 8
 
-def deploy_agent_with_staking(
-    db: Session, owner_address: str, agent_type: str, stake_percentage: float = 0.15
-) -> Agent:
-    owner = db.query(Member).filter(Member.address == owner_address).first()
-    if not owner:
-        raise ValueError("owner not found")
-
-    stake = owner.rep * stake_percentage
-    tier_before = owner.tier
-    owner.rep = max(0.0, owner.rep - stake)
-
-    if owner.rep >= 500:
-        owner.tier = 3
-    elif owner.rep >= 100:
-        owner.tier = 2
-    elif owner.rep >= 10:
-        owner.tier = 1
-    else:
-        owner.tier = 0
-
-    agent = Agent(
-        agentid=f"agent-{uuid.uuid4()}",
-        agenttype=agent_type,
-        owneraddress=owner_address,
-        ownerrep=stake,
-        tier=owner.tier,
-        status="active",
-        createdat=datetime.utcnow(),
-        lastheartbeat=datetime.utcnow(),
+
+class StakeConflictError(ValueError):
+    """The owner's REP kept changing underneath every compare-and-swap attempt."""
+
+
+def _load_owner(db: Session, owner_address: str, lock: bool) -> Member | None:
+    stmt = (
+        select(Member)
+        .where(Member.address == owner_address)
+        .execution_options(populate_existing=True)
     )
-    db.add(agent)
-
-    db.add(
-        RepHistory(
-            memberaddress=owner_address,
-            agentid=agent.agentid,
-            repchange=-stake,
-            reason="agent_staking",
-            tierbefore=tier_before,
-            tierafter=owner.tier,
+    if lock:
+        stmt = stmt.with_for_update()
+    return db.execute(stmt).scalar()
+
+
+def _stake_owner(
+    db: Session,
+    owner_address: str,
+    agent_types: Sequence[str],
+    stake_percentages: Sequence[float],
+) -> list[Agent]:
+    """Take each stake in turn from one owner's REP and create its agent.
+
+    The owner row is written with a compare-and-swap ``UPDATE`` conditioned on
+    the ``rep``/``rep_updated_at`` that were read, and re-read on a lost race;
+    on Postgres the read also takes a row lock, so only deploys for the same
+    owner wait on each other. Nothing is committed here.
+    """
+    if any(not 0 < pct <= 1 for pct in stake_percentages):
+        raise ValueError("stake_percentage must be in (0, 1]")
+    lock = db.get_bind().dialect.name == "postgresql"
+
+    for _ in range(MAX_STAKE_ATTEMPTS):
+        now = datetime.utcnow()
+        owner = _load_owner(db, owner_address, lock)
+        if owner is None:
+            raise ValueError("owner not found")
+        old_rep, old_updated, old_tier = owner.rep, owner.rep_updated_at, owner.tier
+
+        rep = effective_rep(owner, now)
+        decay = rep - old_rep
+        steps = []
+        for pct in stake_percentages:
+            stake = rep * pct
+            rep = max(0.0, rep - stake)
+            steps.append((stake, tier_for_rep(rep)))
+        tier = steps[-1][1]
+
+        unchanged = (
+            Member.rep_updated_at.is_(None)
+            if old_updated is None
+            else Member.rep_updated_at == old_updated
         )
+        swapped = db.execute(
+            update(Member)
+            .where(Member.address == owner_address, Member.rep == old_rep, unchanged)
+            .values(rep=rep, tier=tier, rep_updated_at=now)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if swapped:
+            break
+    else:
+        raise StakeConflictError("owner REP changed concurrently, retry the deploy")
+
+    for attr, value in (("rep", rep), ("tier", tier), ("rep_updated_at", now)):
+        set_committed_value(owner, attr, value)
+    record_gauge_delta(
+        db,
+        rep=state_gauges.rep_contribution(rep, now)
+        - state_gauges.rep_contribution(old_rep, old_updated),
     )
+    record_rank_update(db, owner_address, rep, now)
+
+    tier_before = old_tier
+    if decay:
+        tier_before = tier_for_rep(old_rep + decay)
+        db.add(
+            RepHistory(
+                memberaddress=owner_address,
+                repchange=decay,
+                reason=LAZY_DECAY_REASON,
+                tierbefore=old_tier,
+                tierafter=tier_before,
+                timestamp=now,
+            )
+        )
 
+    agents = []
+    for agent_type, (stake, tier_after) in zip(agent_types, steps):
+        agent = Agent(
+            agentid=f"agent-{uuid.uuid4()}",
+            agenttype=agent_type,
+            owneraddress=owner_address,
+            ownerrep=stake,
+            tier=tier_after,
+            status="active",
+            createdat=now,
+            lastheartbeat=now,
+        )
+        db.add(agent)
+        db.add(
+            RepHistory(
+                memberaddress=owner_address,
+                agentid=agent.agentid,
+                repchange=-stake,
+                reason="agent_staking",
+                tierbefore=tier_before,
+                tierafter=tier_after,
+                timestamp=now,
+            )
+        )
+        tier_before = tier_after
+        agents.append(agent)
+    return agents
+
+
+def deploy_agent_with_staking(
+    db: Session, owner_address: str, agent_type: str, stake_percentage: float = 0.15
+) -> Agent:
+    try:
+        (agent,) = _stake_owner(db, owner_address, [agent_type], [stake_percentage])
+    except ValueError:
+        db.rollback()
+        raise
     db.commit()
-    db.refresh(agent)
     return agent
+
+
+def deploy_agents_for_owner(
+    db: Session, owner_address: str, specs: Sequence[tuple[str, float]]
+) -> list[Agent]:
+    """Deploy ``(agent_type, stake_percentage)`` agents for one owner in one transaction.
+
+    Stakes are taken in order, each from the REP left by the previous one.
+    """
+    try:
+        agents = _stake_owner(
+            db, owner_address, [t for t, _ in specs], [p for _, p in specs]
+        )
+    except ValueError:
+        db.rollback()
+        raise
+    db.commit()
+    return agents
+
+
+def deploy_agents_with_staking(
+    db: Session, specs: Sequence[tuple[str, str, float]]
+) -> list[Agent | ValueError]:
+    """Stake and create one agent per ``(owner, agent_type, stake_percentage)`` in one commit.
+
+    Specs are grouped by owner so each owner row is swapped once; an owner
+    that is missing or cannot be staked yields a ``ValueError`` in each of
+    its slots instead of aborting the batch.
+    """
+    by_owner: dict[str, list[int]] = {}
+    for i, (owner_address, _, _) in enumerate(specs):
+        by_owner.setdefault(owner_address, []).append(i)
+
+    results: list[Agent | ValueError] = [None] * len(specs)  # type: ignore[list-item]
+    for owner_address, slots in by_owner.items():
+        try:
+            agents = _stake_owner(
+                db,
+                owner_address,
+                [specs[i][1] for i in slots],
+                [specs[i][2] for i in slots],
+            )
+        except ValueError as exc:
+            agents = [exc] * len(slots)
+        for i, agent in zip(slots, agents):
+            results[i] = agent
+    db.commit()
+    return results
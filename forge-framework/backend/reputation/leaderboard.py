@@ -0,0 +1,304 @@
+import math
+import threading
+import time
+from bisect import bisect_left
+from collections.abc import Iterable, Sequence
+from datetime import datetime
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from models import Member
+
+_PENDING_KEY = "forge_rank_updates"
+_REMOVED = object()
+
+
+class RankIndex:
+    """Sorted REP index serving top-K, ranks, percentiles and Gini without table scans.
+
+    Members are kept ascending by ``(key, address)`` in buckets of roughly
+    ``load`` entries with per-bucket sums, so a lookup or update walks the
+    bucket list (O(n / load)) plus one bucket (O(load)). ``weighted`` tracks
+    ``sum(i * x_i)`` over the ascending order, which gives the Gini
+    coefficient in O(1).
+
+    Keys are REP normalised to the index epoch. Real REP is ``key * scale``:
+    a batch decay that multiplies everyone by the same factor only touches
+    ``scale``, and under lazy decay ``scale`` follows ``(1 - rate)^days``
+    since the epoch, so neither reorders or rewrites any entry.
+    """
+
+    def __init__(self, load: int = 1000, reconcile_seconds: float = 300.0):
+        self.load = load
+        self.reconcile_seconds = reconcile_seconds
+        self.decay_rate = 0.0
+        self._lock = threading.RLock()
+        self._reset()
+        self._seeded_at: float | None = None
+
+    def _reset(self):
+        self._buckets: list[list[tuple[float, str]]] = []
+        self._maxes: list[tuple[float, str]] = []
+        self._sums: list[float] = []
+        self._keys: dict[str, float] = {}
+        self._total = 0.0
+        self._weighted = 0.0
+        self._scale = 1.0
+        self._epoch = datetime.utcnow()
+
+    # -- lifecycle -------------------------------------------------------
+
+    def invalidate(self):
+        with self._lock:
+            self._seeded_at = None
+
+    def configure_decay(self, rate: float):
+        with self._lock:
+            self.decay_rate = rate
+            self._seeded_at = None
+
+    def ensure_seeded(self, db: Session):
+        seeded_at = self._seeded_at
+        if seeded_at is None or time.monotonic() - seeded_at > self.reconcile_seconds:
+            self.seed(db)
+
+    def seed(self, db: Session):
+        rows = db.execute(
+            select(Member.address, Member.rep, Member.rep_updated_at)
+        ).all()
+        with self._lock:
+            self._reset()
+            self.load_items(
+                (addr, self.normalize(rep, updated)) for addr, rep, updated in rows
+            )
+            self._seeded_at = time.monotonic()
+
+    def load_items(self, items: Iterable[tuple[str, float]]):
+        with self._lock:
+            self._keys = {addr: float(key) for addr, key in items}
+            ordered = sorted((key, addr) for addr, key in self._keys.items())
+            self._buckets = [
+                ordered[i : i + self.load] for i in range(0, len(ordered), self.load)
+            ]
+            self._maxes = [b[-1] for b in self._buckets]
+            self._sums = [sum(k for k, _ in b) for b in self._buckets]
+            self._total = sum(self._sums)
+            self._weighted = sum(i * k for i, (k, _) in enumerate(ordered, start=1))
+
+    # -- scaling ---------------------------------------------------------
+
+    def _factor(self, later: datetime, earlier: datetime | None) -> float:
+        if not self.decay_rate or earlier is None:
+            return 1.0
+        return (1 - self.decay_rate) ** ((later - earlier).total_seconds() / 86400)
+
+    def normalize(self, rep: float | None, updated_at: datetime | None) -> float:
+        return (rep or 0.0) * self._factor(self._epoch, updated_at) / self._scale
+
+    @property
+    def scale(self) -> float:
+        return self._scale * self._factor(datetime.utcnow(), self._epoch)
+
+    def scale_by(self, factor: float):
+        with self._lock:
+            if factor > 0:
+                self._scale *= factor
+            else:
+                self._seeded_at = None
+
+    # -- updates ---------------------------------------------------------
+
+    def _locate(self, item: tuple[float, str]) -> tuple[int, int, int, float]:
+        """Bucket, offset, 1-based ascending position and sum of later keys for ``item``."""
+        b = bisect_left(self._maxes, item)
+        if b == len(self._buckets):
+            b -= 1
+        bucket = self._buckets[b]
+        i = bisect_left(bucket, item)
+        before = sum(len(x) for x in self._buckets[:b])
+        later = sum(self._sums[b + 1 :]) + sum(k for k, _ in bucket[i:])
+        return b, i, before + i + 1, later
+
+    def upsert(self, address: str, key: float):
+        with self._lock:
+            if address in self._keys:
+                self.remove(address)
+            item = (key, address)
+            self._keys[address] = key
+            if not self._buckets:
+                self._buckets, self._maxes, self._sums = [[item]], [item], [key]
+                self._total = self._weighted = key
+                return
+            b, i, pos, later = self._locate(item)
+            self._weighted += pos * key + later
+            self._total += key
+            bucket = self._buckets[b]
+            bucket.insert(i, item)
+            self._sums[b] += key
+            self._maxes[b] = bucket[-1]
+            if len(bucket) > 2 * self.load:
+                half = len(bucket) // 2
+                head, tail = bucket[:half], bucket[half:]
+                self._buckets[b : b + 1] = [head, tail]
+                self._maxes[b : b + 1] = [head[-1], tail[-1]]
+                self._sums[b : b + 1] = [
+                    sum(k for k, _ in head),
+                    sum(k for k, _ in tail),
+                ]
+
+    def remove(self, address: str):
+        with self._lock:
+            key = self._keys.pop(address, None)
+            if key is None:
+                return
+            item = (key, address)
+            b, i, pos, later = self._locate(item)
+            bucket = self._buckets[b]
+            # ``later`` includes the item itself; the entries after it move down one place.
+            self._weighted -= pos * key + (later - key)
+            self._total -= key
+            del bucket[i]
+            self._sums[b] -= key
+            if bucket:
+                self._maxes[b] = bucket[-1]
+            else:
+                del self._buckets[b], self._maxes[b], self._sums[b]
+
+    # -- queries ---------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @property
+    def total(self) -> float:
+        return self._total * self.scale
+
+    def _at(self, index: int) -> tuple[float, str]:
+        """Entry at 0-based ascending ``index``."""
+        for bucket in self._buckets:
+            if index < len(bucket):
+                return bucket[index]
+            index -= len(bucket)
+        raise IndexError(index)
+
+    def _prefix_sum(self, count: int) -> float:
+        """Sum of the ``count`` smallest keys."""
+        acc = 0.0
+        for bucket, bucket_sum in zip(self._buckets, self._sums):
+            if count >= len(bucket):
+                acc += bucket_sum
+                count -= len(bucket)
+                continue
+            return acc + sum(k for k, _ in bucket[:count])
+        return acc
+
+    def top(self, k: int) -> list[tuple[str, float]]:
+        with self._lock:
+            scale = self.scale
+            out: list[tuple[str, float]] = []
+            for bucket in reversed(self._buckets):
+                for key, address in reversed(bucket):
+                    if len(out) >= k:
+                        return out
+                    out.append((address, key * scale))
+            return out
+
+    def rank(self, address: str) -> int | None:
+        """1-based rank, highest REP first."""
+        with self._lock:
+            key = self._keys.get(address)
+            if key is None:
+                return None
+            _, _, pos, _ = self._locate((key, address))
+            return len(self._keys) - pos + 1
+
+    def rep_of(self, address: str) -> float | None:
+        key = self._keys.get(address)
+        return None if key is None else key * self.scale
+
+    def count_at_least(self, rep: float) -> int:
+        with self._lock:
+            scale = self.scale
+            key = rep / scale if scale else rep
+            below = 0
+            for bucket, top in zip(self._buckets, self._maxes):
+                if top[0] < key:
+                    below += len(bucket)
+                    continue
+                below += bisect_left(bucket, (key, ""))
+                break
+            return len(self._keys) - below
+
+    def percentile(self, p: float) -> float | None:
+        """Nearest-rank REP value at percentile ``p`` (0-100)."""
+        with self._lock:
+            n = len(self._keys)
+            if not n:
+                return None
+            index = min(n - 1, max(0, math.ceil(p / 100 * n) - 1))
+            return self._at(index)[0] * self.scale
+
+    def lorenz(self, shares: Sequence[float]) -> list[tuple[float, float]]:
+        """``(population_share, rep_share)`` points of the Lorenz curve."""
+        with self._lock:
+            n = len(self._keys)
+            points = []
+            for share in shares:
+                held = self._prefix_sum(int(share * n))
+                points.append((share, held / self._total if self._total else 0.0))
+            return points
+
+    def gini(self) -> float:
+        with self._lock:
+            n = len(self._keys)
+            if not n or self._total <= 0:
+                return 0.0
+            return max(0.0, 2 * self._weighted / (n * self._total) - (n + 1) / n)
+
+
+rep_index = RankIndex()
+
+
+def record_rank_update(
+    session: Session, address: str, rep: float, updated_at: datetime | None
+):
+    """Queue an index update for a member row written outside the unit of work."""
+    session.info.setdefault(_PENDING_KEY, {})[address] = (rep, updated_at)
+
+
+def _after_flush(session: Session, flush_context):
+    pending = session.info.setdefault(_PENDING_KEY, {})
+    for obj in session.new:
+        if isinstance(obj, Member):
+            pending[obj.address] = (obj.rep, obj.rep_updated_at)
+    for obj in session.dirty:
+        if isinstance(obj, Member):
+            attrs = inspect(obj).attrs
+            if attrs.rep.history.added or attrs.rep_updated_at.history.added:
+                pending[obj.address] = (obj.rep, obj.rep_updated_at)
+    for obj in session.deleted:
+        if isinstance(obj, Member):
+            pending[obj.address] = _REMOVED
+
+
+def _after_commit(session: Session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending or rep_index._seeded_at is None:
+        return
+    for address, value in pending.items():
+        if value is _REMOVED:
+            rep_index.remove(address)
+        else:
+            rep_index.upsert(address, rep_index.normalize(*value))
+
+
+def _after_rollback(session: Session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def install_rank_listeners():
+    if not event.contains(Session, "after_flush", _after_flush):
+        event.listen(Session, "after_flush", _after_flush)
+        event.listen(Session, "after_commit", _after_commit)
+        event.listen(Session, "after_rollback", _after_rollback)
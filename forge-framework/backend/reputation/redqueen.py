@@ -1,40 +1,193 @@
+import time
+from dataclasses import dataclass
 from datetime import datetime
 
+from sqlalchemy import DateTime, case, func, insert, literal, select, true, update
 from sqlalchemy.orm import Session
 
-from models import Member, RepHistory
-
-
-def _tier_from_rep(rep: float) -> int:
-    if rep >= 500:
-        return 3
-    if rep >= 100:
-        return 2
-    if rep >= 10:
-        return 1
-    return 0
-
-
-def apply_daily_rep_decay(db: Session, daily_decay_rate: float = 0.0017) -> int:
-    updated = 0
-    members = db.query(Member).all()
-    for m in members:
-        old_rep = m.rep
-        old_tier = m.tier
-        m.rep = max(0.0, m.rep * (1 - daily_decay_rate))
-        m.tier = _tier_from_rep(m.rep)
-        updated += 1
-
-        db.add(
-            RepHistory(
-                memberaddress=m.address,
-                repchange=m.rep - old_rep,
-                reason="daily_redqueen_decay",
-                tierbefore=old_tier,
-                tierafter=m.tier,
-                timestamp=datetime.utcnow(),
+from database import days_between
+from models import JobCheckpoint, Member, RepHistory
+from monitoring.gauges import state_gauges
+from reputation.leaderboard import rep_index
+from reputation.tier_engine import tier_for_rep, tier_table
+
+REP_DECAY_MODES = ("batch", "lazy")
+LAZY_DECAY_REASON = "lazy_decay_materialized"
+
+
+@dataclass(frozen=True)
+class DecayPolicy:
+    """``batch`` rewrites every member once a day; ``lazy`` decays at read time."""
+
+    mode: str = "batch"
+    rate: float = 0.0017
+
+    @property
+    def lazy(self) -> bool:
+        return self.mode == "lazy"
+
+
+_policy = DecayPolicy()
+
+
+def configure_decay(mode: str, rate: float) -> DecayPolicy:
+    global _policy
+    if mode not in REP_DECAY_MODES:
+        raise ValueError(f"unknown REP decay mode: {mode}")
+    _policy = DecayPolicy(mode, rate)
+    state_gauges.configure_decay(rate if _policy.lazy else 0.0)
+    rep_index.configure_decay(rate if _policy.lazy else 0.0)
+    return _policy
+
+
+def decay_policy() -> DecayPolicy:
+    return _policy
+
+
+def decayed_rep(rep: float, since: datetime | None, now: datetime) -> float:
+    """Stored ``rep`` last written at ``since``, decayed to ``now`` under lazy mode."""
+    policy = _policy
+    if not policy.lazy or since is None:
+        return rep
+    days = max(0.0, (now - since).total_seconds() / 86400)
+    return max(0.0, rep * (1 - policy.rate) ** days)
+
+
+def effective_rep(member: Member, now: datetime | None = None) -> float:
+    """REP as of ``now``: ``rep * (1 - rate)^days`` since the last materialisation."""
+    return decayed_rep(member.rep, member.rep_updated_at, now or datetime.utcnow())
+
+
+def effective_tier(member: Member, now: datetime | None = None) -> int:
+    if not _policy.lazy:
+        return member.tier
+    return tier_for_rep(effective_rep(member, now))
+
+
+@dataclass
+class DecayReport:
+    run_id: str
+    processed: int
+    chunks: int
+    seconds: float
+    resumed: bool
+
+    @property
+    def members_per_second(self) -> float:
+        return self.processed / self.seconds if self.seconds > 0 else 0.0
+
+
+def run_bulk_decay(
+    db: Session,
+    daily_decay_rate: float | None = None,
+    chunk_size: int = 10_000,
+    run_id: str | None = None,
+) -> DecayReport:
+    """Decay every member with set-based SQL, one committed key range at a time.
+
+    For each chunk of ``chunk_size`` addresses the history rows are written with
+    a single ``INSERT ... SELECT`` (computed from the pre-decay values) and the
+    members with a single ``UPDATE``, then the chunk's upper key is stored in
+    ``job_checkpoints`` in the same transaction. Re-running the same ``run_id``
+    resumes after the last committed chunk and is a no-op once it completed.
+
+    In lazy mode this is only a compaction: each member's accrued decay since
+    ``rep_updated_at`` is materialised, which leaves effective REP unchanged.
+    """
+    policy = _policy
+    rate = policy.rate if daily_decay_rate is None else daily_decay_rate
+    job = "compact" if policy.lazy else "decay"
+    run_id = run_id or f"redqueen-{job}-{datetime.utcnow().date().isoformat()}"
+    started = time.perf_counter()
+    checkpoint = db.get(JobCheckpoint, run_id)
+    resumed = checkpoint is not None
+    if checkpoint is None:
+        checkpoint = JobCheckpoint(job_id=run_id, processed=0, status="running")
+        db.add(checkpoint)
+        db.commit()
+    if checkpoint.status == "completed":
+        return DecayReport(run_id, 0, 0, 0.0, resumed)
+
+    reason = LAZY_DECAY_REASON if policy.lazy else "daily_redqueen_decay"
+    tiers = tier_table()
+    processed = 0
+    chunks = 0
+    last_key = checkpoint.last_key
+    while True:
+        now = datetime.utcnow()
+        at = literal(now, DateTime)
+        if policy.lazy:
+            days = days_between(
+                db.get_bind().dialect.name, at, func.coalesce(Member.rep_updated_at, at)
+            )
+            factor = func.power(1 - rate, case((days > 0, days), else_=0.0))
+        else:
+            factor = 1 - rate
+        new_rep = case((Member.rep * factor < 0, 0.0), else_=Member.rep * factor)
+        after = Member.address > last_key if last_key is not None else true()
+        upper = db.execute(
+            select(Member.address)
+            .where(after)
+            .order_by(Member.address)
+            .offset(chunk_size - 1)
+            .limit(1)
+        ).scalar()
+        in_chunk = after if upper is None else after & (Member.address <= upper)
+
+        db.execute(
+            insert(RepHistory).from_select(
+                [
+                    "memberaddress",
+                    "repchange",
+                    "reason",
+                    "tierbefore",
+                    "tierafter",
+                    "timestamp",
+                ],
+                select(
+                    Member.address,
+                    new_rep - Member.rep,
+                    literal(reason),
+                    Member.tier,
+                    tiers.case(new_rep),
+                    at,
+                ).where(in_chunk),
             )
         )
+        count = db.execute(
+            update(Member)
+            .where(in_chunk)
+            .values(rep=new_rep, tier=tiers.case(new_rep), rep_updated_at=at)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        processed += count
+        chunks += 1
+
+        if upper is not None:
+            last_key = upper
+        checkpoint.last_key = last_key
+        checkpoint.processed += count
+        checkpoint.updated_at = now
+        if upper is None:
+            checkpoint.status = "completed"
+        db.commit()
+        if upper is None:
+            break
+
+    db.expire_all()
+    state_gauges.invalidate()
+    # Lazy compaction leaves effective REP, and so the rank keys, unchanged. A
+    # uniform batch decay only rescales the index unless earlier chunks were
+    # committed by another run.
+    if not policy.lazy:
+        if resumed:
+            rep_index.invalidate()
+        else:
+            rep_index.scale_by(1 - rate)
+    return DecayReport(
+        run_id, processed, chunks, time.perf_counter() - started, resumed
+    )
+
 
-    db.commit()
-    return updated
+def apply_daily_rep_decay(db: Session, daily_decay_rate: float | None = None) -> int:
+    return run_bulk_decay(db, daily_decay_rate).processed
@@ -0,0 +1,176 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy import (
+    DateTime,
+    and_,
+    case,
+    delete,
+    exists,
+    func,
+    insert,
+    literal,
+    select,
+    union_all,
+)
+from sqlalchemy.orm import Session
+
+from models import Member, RepHistory, RepHistoryArchive, RepSnapshot
+from reputation.redqueen import decayed_rep
+from reputation.tier_engine import tier_for_rep, tier_table
+
+
+@dataclass
+class RepAt:
+    address: str
+    at: datetime
+    rep: float
+    tier: int
+    snapshot_at: datetime | None
+
+
+def _ledger():
+    """``rep_history`` plus the rows compaction moved to ``rep_history_archive``."""
+    return union_all(
+        *(
+            select(t.memberaddress, t.repchange, t.timestamp)
+            for t in (RepHistory, RepHistoryArchive)
+        )
+    ).subquery()
+
+
+def take_rep_snapshots(db: Session, at: datetime | None = None) -> int:
+    """Write one ``rep_snapshots`` row per member describing its ledger state at ``at``.
+
+    The stored REP at ``at`` is the current value minus every change recorded
+    after it, so ``at`` may lie in the past as long as the history since then
+    is intact. Members that already have a snapshot at ``at`` are skipped.
+    """
+    at = at or datetime.utcnow()
+    when = literal(at, DateTime)
+    ledger = _ledger()
+    later = (
+        select(ledger.c.memberaddress, func.sum(ledger.c.repchange).label("change"))
+        .where(ledger.c.timestamp > at)
+        .group_by(ledger.c.memberaddress)
+        .subquery()
+    )
+    last_write = (
+        select(ledger.c.memberaddress, func.max(ledger.c.timestamp).label("ts"))
+        .where(ledger.c.timestamp <= at, ledger.c.repchange != 0)
+        .group_by(ledger.c.memberaddress)
+        .subquery()
+    )
+    rep = Member.rep - func.coalesce(later.c.change, 0.0)
+    stmt = (
+        select(
+            Member.address,
+            when,
+            rep,
+            tier_table().case(rep),
+            case(
+                (Member.rep_updated_at <= at, Member.rep_updated_at),
+                else_=last_write.c.ts,
+            ),
+        )
+        .outerjoin(later, later.c.memberaddress == Member.address)
+        .outerjoin(last_write, last_write.c.memberaddress == Member.address)
+        .where(
+            ~exists().where(
+                and_(
+                    RepSnapshot.memberaddress == Member.address,
+                    RepSnapshot.taken_at == at,
+                )
+            )
+        )
+    )
+    count = db.execute(
+        insert(RepSnapshot).from_select(
+            ["memberaddress", "taken_at", "rep", "tier", "rep_updated_at"], stmt
+        )
+    ).rowcount
+    db.commit()
+    return count
+
+
+def rep_at(db: Session, address: str, at: datetime) -> RepAt | None:
+    """Point-in-time REP: the nearest snapshot at or before ``at`` plus later deltas.
+
+    Without such a snapshot the value is rebuilt backwards from the member row.
+    Both paths read ``rep_history`` and its archive through their
+    ``(memberaddress, timestamp)`` indexes, so times before a compaction
+    cutoff stay exact.
+    """
+    snapshot = db.execute(
+        select(RepSnapshot)
+        .where(RepSnapshot.memberaddress == address, RepSnapshot.taken_at <= at)
+        .order_by(RepSnapshot.taken_at.desc())
+        .limit(1)
+    ).scalar()
+    ledger = _ledger()
+    last_write = func.max(case((ledger.c.repchange != 0, ledger.c.timestamp)))
+    in_member = ledger.c.memberaddress == address
+
+    if snapshot is not None:
+        change, last = db.execute(
+            select(func.sum(ledger.c.repchange), last_write).where(
+                in_member,
+                ledger.c.timestamp > snapshot.taken_at,
+                ledger.c.timestamp <= at,
+            )
+        ).one()
+        stored = snapshot.rep + (change or 0.0)
+        updated = last or snapshot.rep_updated_at
+        snapshot_at = snapshot.taken_at
+    else:
+        member = db.get(Member, address)
+        if member is None:
+            return None
+        change = db.execute(
+            select(func.sum(ledger.c.repchange)).where(
+                in_member, ledger.c.timestamp > at
+            )
+        ).scalar()
+        stored = member.rep - (change or 0.0)
+        if member.rep_updated_at is not None and member.rep_updated_at <= at:
+            updated = member.rep_updated_at
+        else:
+            updated = db.execute(
+                select(last_write).where(in_member, ledger.c.timestamp <= at)
+            ).scalar()
+        snapshot_at = None
+
+    rep = decayed_rep(stored, updated, at)
+    return RepAt(address, at, rep, tier_for_rep(rep), snapshot_at)
+
+
+def compact_rep_history(db: Session, retain_days: int = 90) -> dict[str, int]:
+    """Move ``rep_history`` rows older than ``retain_days`` to ``rep_history_archive``.
+
+    A snapshot is taken at the cutoff first, so reads inside the retention
+    window never need the archive. Staking and decay audit rows are kept
+    there verbatim, and point-in-time reads before the cutoff stay exact.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=retain_days)
+    snapshots = take_rep_snapshots(db, cutoff)
+    columns = RepHistory.__table__.columns
+    archived = db.execute(
+        insert(RepHistoryArchive).from_select(
+            [c.name for c in columns],
+            select(*columns).where(columns.timestamp <= cutoff),
+        )
+    ).rowcount
+    db.execute(
+        delete(RepHistory)
+        .where(
+            RepHistory.timestamp <= cutoff,
+            RepHistory.id.in_(
+                select(RepHistoryArchive.id).where(
+                    RepHistoryArchive.timestamp <= cutoff
+                )
+            ),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return {"snapshots": snapshots, "archived_history": archived}
@@ -0,0 +1,145 @@
+import json
+import os
+from bisect import bisect_right
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+
+from sqlalchemy import DateTime, case, func, insert, literal, select, update
+from sqlalchemy.orm import Session
+
+from database import days_between
+from models import Member, RepHistory
+
+CONFIG_ROOT = Path(__file__).resolve().parents[2] / "config"
+DEFAULT_PROFILE = "enterprise"
+DEFAULT_TIERS = (
+    (0.0, 0, "Viewer"),
+    (10.0, 1, "Builder"),
+    (100.0, 2, "Manager"),
+    (500.0, 3, "Admin"),
+)
+
+
+@dataclass(frozen=True)
+class TierTable:
+    """Tier thresholds of one ``tier-config.<profile>.json``, sorted by ``minREP``."""
+
+    profile: str
+    thresholds: tuple[float, ...]
+    tiers: tuple[int, ...]
+    labels: tuple[str, ...]
+
+    def tier_for(self, rep: float) -> int:
+        i = bisect_right(self.thresholds, rep) - 1
+        return self.tiers[max(i, 0)]
+
+    def case(self, rep_expr):
+        """SQL ``CASE`` equivalent of :meth:`tier_for` for set-based updates."""
+        whens = [
+            (rep_expr >= threshold, tier)
+            for threshold, tier in zip(
+                reversed(self.thresholds[1:]), reversed(self.tiers[1:])
+            )
+        ]
+        if not whens:
+            return literal(self.tiers[0])
+        return case(*whens, else_=self.tiers[0])
+
+
+def config_root() -> Path:
+    return Path(os.getenv("FORGE_CONFIG_DIR") or CONFIG_ROOT)
+
+
+def active_profile() -> str:
+    return os.getenv("TIER_PROFILE", DEFAULT_PROFILE)
+
+
+@lru_cache(maxsize=None)
+def load_tier_table(profile: str) -> TierTable:
+    path = config_root() / f"tier-config.{profile}.json"
+    if path.exists():
+        with path.open("r", encoding="utf-8") as f:
+            rows = [
+                (float(t["minREP"]), int(t["id"]), t.get("label", str(t["id"])))
+                for t in json.load(f)["tiers"]
+            ]
+    elif profile == DEFAULT_PROFILE:
+        rows = list(DEFAULT_TIERS)
+    else:
+        raise ValueError(f"unknown tier profile: {profile}")
+    if not rows:
+        raise ValueError(f"tier profile {profile} defines no tiers")
+
+    rows.sort()
+    thresholds = tuple(r[0] for r in rows)
+    if len(set(thresholds)) != len(thresholds):
+        raise ValueError(f"tier profile {profile} has duplicate minREP thresholds")
+    return TierTable(
+        profile, thresholds, tuple(r[1] for r in rows), tuple(r[2] for r in rows)
+    )
+
+
+def reload_tier_profiles():
+    load_tier_table.cache_clear()
+
+
+def tier_table(profile: str | None = None) -> TierTable:
+    return load_tier_table(profile or active_profile())
+
+
+def tier_for_rep(rep: float, profile: str | None = None) -> int:
+    return tier_table(profile).tier_for(rep)
+
+
+def retier_members(
+    db: Session, profile: str | None = None, decay_rate: float = 0.0
+) -> int:
+    """Recompute every member's tier from its REP in one set-based pass.
+
+    Only members whose tier actually changes are touched; each gets a
+    ``tier_profile_changed`` history row written by a single ``INSERT ... SELECT``.
+    Under lazy decay pass its ``decay_rate``: tiers then follow REP decayed
+    to now, ``rep * (1 - rate)^days`` since ``rep_updated_at``, while the
+    stored REP itself is left alone.
+    """
+    table = tier_table(profile)
+    at = literal(datetime.utcnow(), DateTime)
+    rep = Member.rep
+    if decay_rate:
+        days = days_between(
+            db.get_bind().dialect.name, at, func.coalesce(Member.rep_updated_at, at)
+        )
+        rep = rep * func.power(1 - decay_rate, case((days > 0, days), else_=0.0))
+    new_tier = table.case(rep)
+    changed = Member.tier != new_tier
+    db.execute(
+        insert(RepHistory).from_select(
+            [
+                "memberaddress",
+                "repchange",
+                "reason",
+                "tierbefore",
+                "tierafter",
+                "timestamp",
+            ],
+            select(
+                Member.address,
+                literal(0.0),
+                literal("tier_profile_changed"),
+                Member.tier,
+                new_tier,
+                at,
+            ).where(changed),
+        )
+    )
+    count = db.execute(
+        update(Member)
+        .where(changed)
+        .values(tier=new_tier)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    db.expire_all()
+    return count
@@ -1,6 +1,286 @@
+import base64
+import hashlib
+import mmap
 import os
+import re
+import secrets
+import tempfile
+import threading
+from collections import OrderedDict
+from collections.abc import AsyncIterable, AsyncIterator, Iterator
+from pathlib import Path
+from typing import BinaryIO
 
 import httpx
+from starlette.concurrency import run_in_threadpool
+
+STREAM_CHUNK_SIZE = 64 * 1024
+_CID_RE = re.compile(r"^[A-Za-z0-9]{8,128}$")
+# CIDv1, raw codec, sha2-256 multihash: the CID itself is the content digest.
+_RAW_SHA256_PREFIX = b"\x01\x55\x12\x20"
+
+
+class ContentIntegrityError(ValueError):
+    """Bytes fetched for a CID do not hash to that CID."""
+
+
+def is_valid_cid(cid: str) -> bool:
+    return bool(_CID_RE.match(cid))
+
+
+def _raw_leaf_digest(cid: str) -> bytes | None:
+    if not cid.startswith("b"):
+        return None
+    body = cid[1:].upper()
+    try:
+        raw = base64.b32decode(body + "=" * (-len(body) % 8))
+    except ValueError:
+        return None
+    if (
+        not raw.startswith(_RAW_SHA256_PREFIX)
+        or len(raw) != len(_RAW_SHA256_PREFIX) + 32
+    ):
+        return None
+    return raw[len(_RAW_SHA256_PREFIX) :]
+
+
+def parse_byte_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """Return an inclusive ``(start, end)`` for a single ``bytes=`` range.
+
+    ``None`` means serve the whole body (no header, or a multi-range request we
+    do not split). Raises ``ValueError`` when the range cannot be satisfied.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes=") :].strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            start, end = max(0, size - int(last)), size - 1
+    except ValueError:
+        return None
+    end = min(end, size - 1)
+    if start > end or start >= size:
+        raise ValueError("range not satisfiable")
+    return start, end
+
+
+def iter_file_range(
+    fh: BinaryIO, start: int, end: int, chunk_size: int = STREAM_CHUNK_SIZE
+) -> Iterator[memoryview]:
+    """Yield slices of an mmap so cached bytes are never copied into Python objects.
+
+    Takes an already open file, which is closed once the range is served.
+    """
+    with fh:
+        if end < start:
+            return
+        mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mm)
+        try:
+            for offset in range(start, end + 1, chunk_size):
+                yield view[offset : min(offset + chunk_size, end + 1)]
+        finally:
+            view.release()
+            try:
+                mm.close()
+            except BufferError:
+                # A consumer still holds a slice; the mapping is freed with it.
+                pass
+
+
+class CacheWriter:
+    def __init__(self, cache: "ContentCache", cid: str):
+        self.cache = cache
+        self.cid = cid
+        self.size = 0
+        self._digest = hashlib.sha256()
+        fd, tmp = tempfile.mkstemp(dir=cache.tmp_dir, prefix=f"{cid}.")
+        self._tmp = Path(tmp)
+        self._fh = os.fdopen(fd, "wb")
+        self.closed = False
+
+    def write(self, chunk: bytes):
+        if self.closed:
+            return
+        self.size += len(chunk)
+        if self.size > self.cache.max_entry_bytes:
+            self.abort()
+            return
+        self._digest.update(chunk)
+        self._fh.write(chunk)
+
+    def abort(self):
+        if self.closed:
+            return
+        self.closed = True
+        self._fh.close()
+        self._tmp.unlink(missing_ok=True)
+
+    def commit(self) -> Path | None:
+        if self.closed:
+            return None
+        self.closed = True
+        self._fh.close()
+        digest = self._digest.digest()
+        if digest != _raw_leaf_digest(self.cid):
+            self._tmp.unlink(missing_ok=True)
+            raise ContentIntegrityError(
+                f"content for {self.cid} failed integrity check"
+            )
+        return self.cache._admit(self.cid, self._tmp, self.size, digest)
+
+
+class ContentCache:
+    """Size-bounded, content-addressed LRU of IPFS objects on local disk.
+
+    Objects are written to a temp file while streaming, hashed, and atomically
+    renamed into place. Only raw-leaf CIDv1 content is cached, because only
+    there the CID is the sha2-256 of the bytes and can be checked; every entry
+    also keeps a sha256 sidecar that is re-checked the first time an entry
+    found on disk at startup is served.
+
+    Methods do blocking file I/O; async callers run them in a worker thread,
+    and the index is guarded by a lock so those threads can overlap.
+    """
+
+    def __init__(
+        self, root: str | Path, max_bytes: int, max_entry_bytes: int | None = None
+    ):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes or max(1, max_bytes // 4)
+        self.tmp_dir = self.root / "tmp"
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self._unverified: set[str] = set()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+        self._load()
+
+    def _path(self, cid: str) -> Path:
+        return self.root / cid[-2:] / cid
+
+    def _load(self):
+        for tmp in self.tmp_dir.iterdir():
+            tmp.unlink(missing_ok=True)
+        found = []
+        for path in self.root.glob("*/*"):
+            if path.suffix == ".sha256" or path.parent == self.tmp_dir:
+                continue
+            stat = path.stat()
+            found.append((stat.st_atime, path.name, stat.st_size))
+        for _, cid, size in sorted(found):
+            self._entries[cid] = size
+            self._unverified.add(cid)
+            self.total_bytes += size
+        self._evict()
+
+    def _verify(self, cid: str) -> bool:
+        path = self._path(cid)
+        sidecar = path.with_suffix(".sha256")
+        digest = hashlib.sha256()
+        try:
+            with open(path, "rb") as fh:
+                for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+                    digest.update(chunk)
+            expected = sidecar.read_text().strip()
+        except OSError:
+            return False
+        return digest.hexdigest() == expected
+
+    def lookup(self, cid: str) -> tuple[Path, int] | None:
+        with self._lock:
+            size = self._entries.get(cid)
+            unverified = cid in self._unverified
+        if size is not None and unverified and not self._verify(cid):
+            with self._lock:
+                self._remove(cid)
+            size = None
+        with self._lock:
+            if size is None or cid not in self._entries:
+                self.misses += 1
+                return None
+            self._unverified.discard(cid)
+            self._entries.move_to_end(cid)
+            self.hits += 1
+            return self._path(cid), size
+
+    def open_entry(self, cid: str) -> tuple[BinaryIO, int] | None:
+        """Like :meth:`lookup`, but returns the entry opened for reading.
+
+        The file is opened while eviction is locked out, and the open handle
+        keeps the bytes readable even if the entry is evicted right after. An
+        entry evicted between the lookup and the open counts as a miss.
+        """
+        found = self.lookup(cid)
+        if found is None:
+            return None
+        path, size = found
+        with self._lock:
+            if cid in self._entries:
+                try:
+                    return open(path, "rb"), size
+                except FileNotFoundError:
+                    self._remove(cid)
+            self.hits -= 1
+            self.misses += 1
+        return None
+
+    def begin(self, cid: str) -> CacheWriter | None:
+        """Start caching ``cid``; ``None`` when its content cannot be verified.
+
+        CIDv0 (``Qm...``) and dag-pb CIDs hash the UnixFS DAG rather than the
+        file bytes, so nothing here could tell good content from bad. Those
+        are streamed from IPFS every time instead of being cached.
+        """
+        if _raw_leaf_digest(cid) is None:
+            return None
+        return CacheWriter(self, cid)
+
+    def _admit(self, cid: str, tmp: Path, size: int, digest: bytes) -> Path:
+        path = self._path(cid)
+        path.parent.mkdir(exist_ok=True)
+        path.with_suffix(".sha256").write_text(digest.hex())
+        os.replace(tmp, path)
+        with self._lock:
+            previous = self._entries.pop(cid, None)
+            if previous is not None:
+                self.total_bytes -= previous
+            self._entries[cid] = size
+            self._unverified.discard(cid)
+            self.total_bytes += size
+            self._evict()
+        return path
+
+    def _remove(self, cid: str):
+        size = self._entries.pop(cid, 0)
+        self._unverified.discard(cid)
+        self.total_bytes -= size
+        path = self._path(cid)
+        path.unlink(missing_ok=True)
+        path.with_suffix(".sha256").unlink(missing_ok=True)
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def cache_from_env() -> ContentCache | None:
+    max_bytes = int(os.getenv("IPFS_CACHE_MAX_BYTES", str(1024**3)))
+    if max_bytes <= 0:
+        return None
+    root = os.getenv("IPFS_CACHE_DIR") or os.path.join(
+        tempfile.gettempdir(), "forge-ipfs-cache"
+    )
+    return ContentCache(root, max_bytes)
 
 
 class IPFSStorage:
@@ -22,3 +302,126 @@ class IPFSStorage:
             resp = client.post(f"{self.base_url}/api/v0/cat", params=params)
             resp.raise_for_status()
             return resp.content
+
+
+class AsyncIPFSStorage:
+    def __init__(
+        self, client: httpx.AsyncClient | None = None, cache: ContentCache | None = None
+    ):
+        self.base_url = os.getenv("IPFS_API_URL", "http://ipfs:5001")
+        self.timeout = float(os.getenv("IPFS_TIMEOUT_SEC", "10"))
+        self.cache = cache
+        self._client = client or httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=httpx.Limits(
+                max_connections=int(os.getenv("IPFS_MAX_CONNECTIONS", "100")),
+                max_keepalive_connections=int(os.getenv("IPFS_MAX_KEEPALIVE", "20")),
+            ),
+        )
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    async def upload(self, content: bytes) -> str:
+        files = {"file": ("upload.bin", content)}
+        resp = await self._client.post(f"{self.base_url}/api/v0/add", files=files)
+        resp.raise_for_status()
+        data = resp.json()
+        return data["Hash"]
+
+    async def download(self, cid: str) -> bytes:
+        params = {"arg": cid}
+        resp = await self._client.post(f"{self.base_url}/api/v0/cat", params=params)
+        resp.raise_for_status()
+        return resp.content
+
+    async def upload_stream(
+        self, chunks: AsyncIterable[bytes], filename: str = "upload.bin"
+    ) -> str:
+        """Stream ``chunks`` into ``/api/v0/add`` as a chunked multipart body."""
+        boundary = secrets.token_hex(16)
+        head = (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            "Content-Type: application/octet-stream\r\n\r\n"
+        ).encode("utf-8")
+        tail = f"\r\n--{boundary}--\r\n".encode("utf-8")
+
+        async def _body() -> AsyncIterator[bytes]:
+            yield head
+            async for chunk in chunks:
+                if chunk:
+                    yield chunk
+            yield tail
+
+        resp = await self._client.post(
+            f"{self.base_url}/api/v0/add",
+            content=_body(),
+            headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+        )
+        resp.raise_for_status()
+        return resp.json()["Hash"]
+
+    async def open_download(self, cid: str) -> httpx.Response:
+        """Open a streaming ``/api/v0/cat`` response; the caller must ``aclose()`` it."""
+        request = self._client.build_request(
+            "POST", f"{self.base_url}/api/v0/cat", params={"arg": cid}
+        )
+        resp = await self._client.send(request, stream=True)
+        if resp.is_error:
+            await resp.aclose()
+            resp.raise_for_status()
+        return resp
+
+    async def fill_cache(self, cid: str) -> tuple[BinaryIO, int] | None:
+        """Download ``cid`` straight into the local cache without buffering it.
+
+        Returns the opened entry, or ``None`` if ``cid`` cannot be cached.
+        Raises :class:`ContentIntegrityError` when IPFS serves the wrong bytes.
+        """
+        if self.cache is None:
+            return None
+        writer = await run_in_threadpool(self.cache.begin, cid)
+        if writer is None:
+            return None
+        upstream = await self.open_download(cid)
+        try:
+            try:
+                async for chunk in upstream.aiter_bytes(STREAM_CHUNK_SIZE):
+                    await run_in_threadpool(writer.write, chunk)
+                await run_in_threadpool(writer.commit)
+            finally:
+                await run_in_threadpool(writer.abort)
+        finally:
+            await upstream.aclose()
+        return await run_in_threadpool(self.cache.open_entry, cid)
+
+    async def stream_and_cache(
+        self, upstream: httpx.Response, cid: str
+    ) -> AsyncIterator[bytes]:
+        """Relay ``upstream`` to the caller while teeing it into the cache.
+
+        Cache file writes run in a worker thread so a slow disk never stalls
+        the event loop. The last chunk is held back until the content has
+        been verified, so a failed integrity check leaves the caller with a
+        truncated body rather than a complete wrong one.
+        """
+        writer = None
+        held = None
+        try:
+            if self.cache is not None:
+                writer = await run_in_threadpool(self.cache.begin, cid)
+            async for chunk in upstream.aiter_bytes(STREAM_CHUNK_SIZE):
+                if writer is not None:
+                    await run_in_threadpool(writer.write, chunk)
+                if held is not None:
+                    yield held
+                held = chunk
+            if writer is not None:
+                await run_in_threadpool(writer.commit)
+            if held is not None:
+                yield held
+        finally:
+            if writer is not None:
+                await run_in_threadpool(writer.abort)
+            await upstream.aclose()
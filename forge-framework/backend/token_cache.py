@@ -0,0 +1,63 @@
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+
+
+class VerifiedTokenCache:
+    """Bounded LRU of already-verified JWT claims keyed by token signature.
+
+    An entry is only returned when the signed ``header.payload`` part matches
+    the one that was verified, and it is dropped once the token's ``exp`` has
+    passed. Tokens without ``exp`` are kept for at most ``default_ttl`` seconds.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10_000,
+        default_ttl: float = 300.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.clock = clock
+        self._entries: OrderedDict[str, tuple[str, dict, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, signature: str, signed: str) -> dict | None:
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(signature)
+            if entry is None or entry[0] != signed:
+                self.misses += 1
+                return None
+            if entry[2] <= now:
+                del self._entries[signature]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(signature)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, signature: str, signed: str, claims: dict):
+        if "exp" in claims:
+            # Mirror _decode_jwt: a token is valid through the second of its exp.
+            expires_at = float(int(claims["exp"]) + 1)
+        else:
+            expires_at = self.clock() + self.default_ttl
+        with self._lock:
+            self._entries[signature] = (signed, claims, expires_at)
+            self._entries.move_to_end(signature)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
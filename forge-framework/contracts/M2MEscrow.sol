@@ -1,10 +1,29 @@
 // SPDX-License-Identifier: MIT
 pragma solidity ^0.8.24;
 
+import "@openzeppelin/contracts/access/Ownable.sol";
 import "@openzeppelin/contracts/utils/ReentrancyGuard.sol";
 
-contract M2MEscrow is ReentrancyGuard {
+contract M2MEscrow is Ownable, ReentrancyGuard {
+    struct Settlement {
+        uint256 tradeId;
+        address buyer;
+        address seller;
+        string resource;
+        uint256 amount;
+        uint256 price;
+    }
+
     event TradeExecuted(bytes32 indexed txHash, address indexed buyer, address indexed seller, string resource, uint256 amount, uint256 price);
+    event TradeSettled(uint256 indexed tradeId, address indexed buyer, address indexed seller, string resource, uint256 amount, uint256 price);
+    event BatchSettled(bytes32 indexed batchHash, uint256 count, uint256 total);
+
+    /// @notice Gas forwarded to each seller, so one seller cannot burn the whole batch's gas.
+    uint256 public constant PAYMENT_GAS = 50_000;
+
+    mapping(uint256 => bool) public settled;
+
+    constructor() Ownable(msg.sender) {}
 
     function executeTrade(address buyer, address seller, string calldata resource, uint256 amount, uint256 price)
         external
@@ -22,4 +41,32 @@ contract M2MEscrow is ReentrancyGuard {
         txHash = keccak256(abi.encodePacked(block.chainid, buyer, seller, resource, amount, price, block.timestamp));
         emit TradeExecuted(txHash, buyer, seller, resource, amount, price);
     }
+
+    /// @notice Settle many off-chain trades in one transaction; the settlement operator funds the total.
+    /// @dev Any invalid or failed payment reverts the whole batch so it can be split and retried.
+    ///      A trade id settles at most once, so a re-broadcast batch can never pay twice.
+    function settleBatch(Settlement[] calldata settlements)
+        external
+        payable
+        onlyOwner
+        nonReentrant
+        returns (bytes32 batchHash)
+    {
+        require(settlements.length > 0, "empty batch");
+        uint256 total;
+        for (uint256 i = 0; i < settlements.length; i++) {
+            Settlement calldata s = settlements[i];
+            require(s.seller != address(0), "invalid seller");
+            require(!settled[s.tradeId], "trade already settled");
+            settled[s.tradeId] = true;
+            total += s.price;
+            (bool ok, ) = payable(s.seller).call{value: s.price, gas: PAYMENT_GAS}("");
+            require(ok, "payment failed");
+            emit TradeSettled(s.tradeId, s.buyer, s.seller, s.resource, s.amount, s.price);
+        }
+        require(msg.value == total, "wrong payment amount");
+
+        batchHash = keccak256(abi.encode(block.chainid, settlements, block.timestamp));
+        emit BatchSettled(batchHash, settlements.length, total);
+    }
 }
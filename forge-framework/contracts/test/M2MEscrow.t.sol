@@ -0,0 +1,85 @@
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.24;
+
+import "forge-std/Test.sol";
+import "../M2MEscrow.sol";
+
+contract RejectingSeller {
+    receive() external payable {
+        revert("no thanks");
+    }
+}
+
+contract GasBurningSeller {
+    receive() external payable {
+        while (true) {}
+    }
+}
+
+contract M2MEscrowTest is Test {
+    M2MEscrow internal escrow;
+    address internal buyer = address(0xB0B);
+    address internal alice = address(0xA11CE);
+    address internal carol = address(0xCA201);
+
+    function setUp() public {
+        escrow = new M2MEscrow();
+        vm.deal(address(this), 100 ether);
+    }
+
+    function _batch(address secondSeller) internal view returns (M2MEscrow.Settlement[] memory batch) {
+        batch = new M2MEscrow.Settlement[](2);
+        batch[0] = M2MEscrow.Settlement(1, buyer, alice, "compute", 10, 1 ether);
+        batch[1] = M2MEscrow.Settlement(2, buyer, secondSeller, "energy", 5, 2 ether);
+    }
+
+    function testSettleBatchPaysEverySeller() public {
+        escrow.settleBatch{value: 3 ether}(_batch(carol));
+
+        assertEq(alice.balance, 1 ether);
+        assertEq(carol.balance, 2 ether);
+        assertEq(address(escrow).balance, 0);
+    }
+
+    function testSettleBatchRequiresExactTotal() public {
+        vm.expectRevert("wrong payment amount");
+        escrow.settleBatch{value: 4 ether}(_batch(carol));
+    }
+
+    function testSettleBatchIsOwnerOnly() public {
+        M2MEscrow.Settlement[] memory batch = _batch(carol);
+        vm.deal(buyer, 3 ether);
+        vm.prank(buyer);
+        vm.expectRevert(abi.encodeWithSelector(Ownable.OwnableUnauthorizedAccount.selector, buyer));
+        escrow.settleBatch{value: 3 ether}(batch);
+    }
+
+    function testFailedPaymentRevertsWholeBatch() public {
+        address rejecting = address(new RejectingSeller());
+
+        vm.expectRevert("payment failed");
+        escrow.settleBatch{value: 3 ether}(_batch(rejecting));
+        assertEq(alice.balance, 0);
+    }
+
+    function testTradeSettlesOnlyOnce() public {
+        escrow.settleBatch{value: 3 ether}(_batch(carol));
+        assertTrue(escrow.settled(1) && escrow.settled(2));
+
+        vm.expectRevert("trade already settled");
+        escrow.settleBatch{value: 3 ether}(_batch(carol));
+        assertEq(alice.balance, 1 ether);
+    }
+
+    function testGasBurningSellerFailsOnlyItsPayment() public {
+        address burner = address(new GasBurningSeller());
+
+        vm.expectRevert("payment failed");
+        escrow.settleBatch{value: 3 ether, gas: 1_000_000}(_batch(burner));
+    }
+
+    function testRejectsEmptyBatch() public {
+        vm.expectRevert("empty batch");
+        escrow.settleBatch(new M2MEscrow.Settlement[](0));
+    }
+}
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""Single-core order throughput of the in-memory M2M matching engine.
+
+Submits a mix of limit and market orders clustered around a mid price so
+that most orders cross and partially fill, with a share of cancels; fills
+stay buffered (no database) so only matching itself is measured.
+"""
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+# The engine module imports the market service; no database is touched here.
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from economy.order_book import BUY, SELL, MatchingEngine  # noqa: E402
+
+
+def bench(orders: int, seed: int = 7) -> tuple[float, int]:
+    rng = random.Random(seed)
+    engine = MatchingEngine(resources=("compute",))
+    specs = []
+    for i in range(orders):
+        side = BUY if rng.random() < 0.5 else SELL
+        price = None if rng.random() < 0.1 else round(1.0 + rng.randint(-20, 20) / 1000, 3)
+        specs.append((f"agent-{i % 1000}", side, rng.randint(1, 10), price))
+
+    live: list[int] = []
+    started = time.perf_counter()
+    for i, (agent, side, qty, price) in enumerate(specs):
+        order, _ = engine.submit(agent, "compute", side, qty, price)
+        if order.remaining and price is not None:
+            live.append(order.order_id)
+        if i % 10 == 9 and live:
+            engine.cancel(live.pop(rng.randrange(len(live))))
+    elapsed = time.perf_counter() - started
+    return orders / elapsed, engine.fills_total
+
+
+def main():
+    for orders in (10_000, 100_000, 500_000):
+        rate, fills = bench(orders)
+        print(f"orders={orders:>7}  {rate:10.0f} orders/s  fills={fills}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""Per-call latency of the API rate limiter as the number of distinct clients grows."""
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+from rate_limit import SlidingWindowRateLimiter  # noqa: E402
+
+
+def bench(clients: int, calls: int = 200_000) -> float:
+    limiter = SlidingWindowRateLimiter(60, max_keys=clients)
+    keys = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(clients)]
+    for key in keys:
+        limiter.hit(key)
+
+    started = time.perf_counter()
+    for i in range(calls):
+        limiter.hit(keys[i % clients])
+    return (time.perf_counter() - started) / calls * 1e9
+
+
+def main():
+    for clients in (100, 1_000, 10_000, 100_000):
+        print(f"clients={clients:>7}  {bench(clients):8.0f} ns/call")
+
+
+if __name__ == "__main__":
+    main()
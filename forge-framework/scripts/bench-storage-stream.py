@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""Peak RSS of /storage upload and download as the payload grows.
+
+Each measurement runs in a fresh interpreter that drives the ASGI app
+directly against an in-process IPFS stand-in which neither buffers request
+bodies nor materialises response bodies, so the reported ``ru_maxrss``
+reflects what the API process itself holds in memory.
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+CHUNK = 64 * 1024
+SIZES_MB = (8, 64, 256, 1024)
+
+
+class _GeneratedStream(httpx.AsyncByteStream):
+    def __init__(self, size: int):
+        self.size = size
+
+    async def __aiter__(self):
+        block = b"\0" * CHUNK
+        remaining = self.size
+        while remaining > 0:
+            n = min(CHUNK, remaining)
+            remaining -= n
+            yield block[:n]
+
+    async def aclose(self):
+        pass
+
+
+def _token() -> str:
+    def _enc(obj):
+        raw = json.dumps(obj, separators=(",", ":")).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("utf-8")
+
+    h = _enc({"alg": "HS256", "typ": "JWT"})
+    p = _enc({"sub": "bench", "tier": 3})
+    sig = hmac.new(b"dev-secret-change-me", f"{h}.{p}".encode("utf-8"), hashlib.sha256).digest()
+    return f"{h}.{p}.{base64.urlsafe_b64encode(sig).rstrip(b'=').decode('utf-8')}"
+
+
+async def _run(direction: str, size: int) -> int:
+    from main import app
+    from storage.ipfs_client import AsyncIPFSStorage
+
+    uploaded = 0
+
+    class _Transport(httpx.AsyncBaseTransport):
+        async def handle_async_request(self, request):
+            nonlocal uploaded
+            if request.url.path == "/api/v0/add":
+                async for chunk in request.stream:
+                    uploaded += len(chunk)
+                return httpx.Response(200, json={"Hash": "QmBench"})
+            return httpx.Response(200, stream=_GeneratedStream(size))
+
+    app.state.ipfs = AsyncIPFSStorage(httpx.AsyncClient(transport=_Transport()))
+    method, path = ("POST", "/storage/upload") if direction == "upload" else ("GET", "/storage/QmBench")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"authorization", f"Bearer {_token()}".encode()),
+            (b"content-type", b"application/octet-stream"),
+        ],
+        "client": ("127.0.0.1", 1234),
+        "server": ("bench", 80),
+        "app": app,
+    }
+    sent = 0
+    received = 0
+    block = b"\0" * CHUNK
+    finished = asyncio.Event()
+    request_done = direction != "upload"
+
+    async def receive():
+        nonlocal sent, request_done
+        if request_done:
+            await finished.wait()
+            return {"type": "http.disconnect"}
+        if sent >= size:
+            request_done = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        n = min(CHUNK, size - sent)
+        sent += n
+        request_done = sent >= size
+        return {"type": "http.request", "body": block[:n], "more_body": not request_done}
+
+    async def send(message):
+        nonlocal received
+        if message["type"] == "http.response.body":
+            received += len(message.get("body", b""))
+            if not message.get("more_body", False):
+                finished.set()
+
+    await app(scope, receive, send)
+    return uploaded if direction == "upload" else received
+
+
+def _child(direction: str, size_mb: int):
+    backend = Path(__file__).resolve().parents[1] / "backend"
+    sys.path.insert(0, str(backend))
+    os.chdir(backend)
+    started = time.perf_counter()
+    received = asyncio.run(_run(direction, size_mb * 1024 * 1024))
+    elapsed = time.perf_counter() - started
+    assert received >= size_mb * 1024 * 1024, received
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{direction:>8} {size_mb:>6} MiB  peak RSS {peak_kb / 1024:7.1f} MiB  {elapsed:6.2f}s")
+
+
+def main():
+    if len(sys.argv) == 3:
+        _child(sys.argv[1], int(sys.argv[2]))
+        return
+    db = Path(tempfile.gettempdir()) / "forge_bench_storage.db"
+    env = {**os.environ, "DATABASE_URL": f"sqlite+pysqlite:///{db}", "JWT_REQUIRED": "true"}
+    for direction in ("upload", "download"):
+        for size_mb in SIZES_MB:
+            subprocess.run([sys.executable, __file__, direction, str(size_mb)], env=env, check=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""Vote throughput on a single hot proposal under concurrent writers.
+
+Every worker thread casts ballots through ``MetaDAOService.vote`` with its
+own session; a share of voters vote again or change their ballot. After
+each run the proposal's tallies are checked against the ``votes`` ledger,
+so lost or double-counted increments show up as a mismatch. Uses a
+throwaway SQLite file unless ``DATABASE_URL`` points elsewhere.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite+pysqlite:///{Path(tempfile.mkdtemp()) / 'bench-votes.db'}"
+)
+
+from sqlalchemy import delete, func, select  # noqa: E402
+
+from database import Base, SessionLocal, engine  # noqa: E402
+from governance.meta_dao import MetaDAOService  # noqa: E402
+from models import Member, Proposal, Vote  # noqa: E402
+
+VOTERS = 2000
+
+
+def setup() -> int:
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        db.execute(delete(Vote))
+        db.execute(delete(Proposal))
+        db.execute(delete(Member).where(Member.address.like("0xbench%")))
+        db.add(Member(address="0xbench-p", name="Proposer", rep=500, tier=2, role="member"))
+        db.add_all(
+            Member(address=f"0xbench{i}", name=f"Voter {i}", rep=50, tier=1, role="member")
+            for i in range(VOTERS)
+        )
+        db.commit()
+        return MetaDAOService(db).submit_proposal("0xbench-p", "Hot", "Benchmark")["id"]
+
+
+def bench(threads: int, ballots: int, seed: int = 7) -> tuple[float, bool]:
+    proposal_id = setup()
+    rng = random.Random(seed)
+    specs = [(f"0xbench{rng.randrange(VOTERS)}", rng.random() < 0.6) for _ in range(ballots)]
+    chunks = [specs[i::threads] for i in range(threads)]
+
+    def worker(chunk):
+        with SessionLocal() as db:
+            svc = MetaDAOService(db)
+            for voter, support in chunk:
+                svc.vote(proposal_id, voter, support)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(worker, chunks))
+    elapsed = time.perf_counter() - started
+
+    with SessionLocal() as db:
+        proposal = db.get(Proposal, proposal_id)
+        ledger = dict(
+            db.execute(
+                select(Vote.support, func.count())
+                .where(Vote.proposal_id == proposal_id)
+                .group_by(Vote.support)
+            ).all()
+        )
+        consistent = (proposal.votes_for, proposal.votes_against) == (
+            ledger.get(True, 0),
+            ledger.get(False, 0),
+        )
+    return ballots / elapsed, consistent
+
+
+def main():
+    print(f"database: {engine.url.render_as_string(hide_password=True)}")
+    for threads in (1, 4, 16):
+        rate, consistent = bench(threads, 5000)
+        status = "tallies match ledger" if consistent else "TALLY MISMATCH"
+        print(f"threads={threads:>3}  {rate:10.0f} votes/s  {status}")
+
+
+if __name__ == "__main__":
+    main()
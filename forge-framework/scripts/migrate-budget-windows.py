@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+"""Convert agent budgets from fixed daily/weekly resets to rolling hourly windows.
+
+Run once after applying sql/02-governance-economy.sql; rows that are not
+converted here are converted on their first budget check instead.
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+from database import SessionLocal  # noqa: E402
+from economy.m2m_market import migrate_budget_windows  # noqa: E402
+
+
+def main():
+    with SessionLocal() as db:
+        print(f"converted {migrate_budget_windows(db)} budgets")
+
+
+if __name__ == "__main__":
+    main()
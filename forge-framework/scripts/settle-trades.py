@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""Escrow settlement worker: settles pending M2M trades in batches via M2MEscrow.settleBatch.
+
+Reads ALCHEMY_RPC (e.g. a local Anvil at http://localhost:8545), ESCROW_ADDRESS,
+SETTLEMENT_PRIVATE_KEY (the escrow owner) and SETTLEMENT_BATCH_SIZE, and
+reports settled trades per second for every pass. Each pass first reconciles
+batches left ``submitted`` by an earlier run against their receipts.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+from config import get_settings  # noqa: E402
+from database import SessionLocal  # noqa: E402
+from economy.settlement import SettlementWorker, Web3EscrowBackend  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--once", action="store_true", help="drain pending trades and exit")
+    parser.add_argument("--interval", type=float, default=5.0, help="idle poll interval (s)")
+    args = parser.parse_args()
+
+    worker = SettlementWorker(
+        SessionLocal,
+        Web3EscrowBackend.from_env(),
+        batch_size=get_settings().settlement_batch_size,
+    )
+    while True:
+        report = worker.run()
+        if report.batches or report.reconciled:
+            print(
+                f"settled={report.settled} failed={report.failed} "
+                f"txs={report.transactions} reconciled={report.reconciled} "
+                f"{report.trades_per_second:.1f} trades/s"
+            )
+        if args.once:
+            return
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
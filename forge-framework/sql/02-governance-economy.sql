@@ -10,6 +10,14 @@ CREATE TABLE IF NOT EXISTS proposals (
   execution_tx VARCHAR(128)
 );
 
+CREATE TABLE IF NOT EXISTS votes (
+  proposal_id INTEGER REFERENCES proposals(id) NOT NULL,
+  voter VARCHAR(128) REFERENCES members(address) NOT NULL,
+  support BOOLEAN NOT NULL,
+  voted_at TIMESTAMP DEFAULT NOW(),
+  PRIMARY KEY (proposal_id, voter)
+);
+
 CREATE TABLE IF NOT EXISTS trades (
   id SERIAL PRIMARY KEY,
   buyer_agent VARCHAR(128) REFERENCES agents(agentid) NOT NULL,
@@ -23,6 +31,11 @@ CREATE TABLE IF NOT EXISTS trades (
   completed_at TIMESTAMP
 );
 
+DROP INDEX IF EXISTS ix_trades_buyer_created;
+DROP INDEX IF EXISTS ix_trades_seller_created;
+CREATE INDEX IF NOT EXISTS ix_trades_buyer_created_id ON trades (buyer_agent, created_at, id);
+CREATE INDEX IF NOT EXISTS ix_trades_seller_created_id ON trades (seller_agent, created_at, id);
+
 CREATE TABLE IF NOT EXISTS agent_budgets (
   agent_id VARCHAR(128) PRIMARY KEY REFERENCES agents(agentid),
   daily_limit DOUBLE PRECISION DEFAULT 100,
@@ -30,5 +43,63 @@ CREATE TABLE IF NOT EXISTS agent_budgets (
   spent_today DOUBLE PRECISION DEFAULT 0,
   spent_this_week DOUBLE PRECISION DEFAULT 0,
   last_reset_daily TIMESTAMP DEFAULT NOW(),
-  last_reset_weekly TIMESTAMP DEFAULT NOW()
+  last_reset_weekly TIMESTAMP DEFAULT NOW(),
+  window_hour INTEGER
+);
+
+ALTER TABLE agent_budgets ADD COLUMN IF NOT EXISTS window_hour INTEGER;
+
+CREATE TABLE IF NOT EXISTS agent_spend_buckets (
+  agent_id VARCHAR(128) NOT NULL,
+  slot INTEGER NOT NULL,
+  hour INTEGER NOT NULL,
+  amount DOUBLE PRECISION DEFAULT 0,
+  PRIMARY KEY (agent_id, slot)
+);
+
+CREATE TABLE IF NOT EXISTS market_candles (
+  resource_type VARCHAR(32) NOT NULL,
+  period VARCHAR(8) NOT NULL,
+  bucket_start TIMESTAMP NOT NULL,
+  open DOUBLE PRECISION NOT NULL,
+  high DOUBLE PRECISION NOT NULL,
+  low DOUBLE PRECISION NOT NULL,
+  close DOUBLE PRECISION NOT NULL,
+  volume DOUBLE PRECISION DEFAULT 0,
+  notional DOUBLE PRECISION DEFAULT 0,
+  trades INTEGER DEFAULT 0,
+  open_at TIMESTAMP NOT NULL,
+  close_at TIMESTAMP NOT NULL,
+  PRIMARY KEY (resource_type, period, bucket_start)
+);
+
+CREATE TABLE IF NOT EXISTS agent_trade_stats (
+  agent_id VARCHAR(128) PRIMARY KEY,
+  trades_bought INTEGER DEFAULT 0,
+  trades_sold INTEGER DEFAULT 0,
+  volume_bought DOUBLE PRECISION DEFAULT 0,
+  volume_sold DOUBLE PRECISION DEFAULT 0,
+  spend DOUBLE PRECISION DEFAULT 0,
+  revenue DOUBLE PRECISION DEFAULT 0,
+  first_trade_at TIMESTAMP,
+  last_trade_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS agent_counterparties (
+  agent_id VARCHAR(128) NOT NULL,
+  counterparty VARCHAR(128) NOT NULL,
+  trades INTEGER DEFAULT 0,
+  volume DOUBLE PRECISION DEFAULT 0,
+  spend DOUBLE PRECISION DEFAULT 0,
+  revenue DOUBLE PRECISION DEFAULT 0,
+  last_trade_at TIMESTAMP,
+  PRIMARY KEY (agent_id, counterparty)
+);
+
+CREATE TABLE IF NOT EXISTS resource_prices (
+  resource_type VARCHAR(32) PRIMARY KEY,
+  demand_ewma DOUBLE PRECISION DEFAULT 0,
+  supply_ewma DOUBLE PRECISION DEFAULT 0,
+  price DOUBLE PRECISION NOT NULL,
+  updated_at TIMESTAMP DEFAULT NOW()
 );
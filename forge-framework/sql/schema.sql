@@ -3,9 +3,12 @@ CREATE TABLE IF NOT EXISTS members (
   name VARCHAR(120) NOT NULL,
   rep DOUBLE PRECISION DEFAULT 0,
   tier INTEGER DEFAULT 0,
-  role VARCHAR(64) DEFAULT 'member'
+  role VARCHAR(64) DEFAULT 'member',
+  rep_updated_at TIMESTAMP DEFAULT NOW()
 );
 
+ALTER TABLE members ADD COLUMN IF NOT EXISTS rep_updated_at TIMESTAMP DEFAULT NOW();
+
 CREATE TABLE IF NOT EXISTS agents (
   agentid VARCHAR(128) PRIMARY KEY,
   agenttype VARCHAR(64) NOT NULL,
@@ -30,3 +33,38 @@ CREATE TABLE IF NOT EXISTS rep_history (
   txhash VARCHAR(128),
   timestamp TIMESTAMP DEFAULT NOW()
 );
+
+CREATE INDEX IF NOT EXISTS ix_rep_history_member_ts ON rep_history (memberaddress, timestamp);
+CREATE INDEX IF NOT EXISTS ix_rep_history_timestamp ON rep_history (timestamp);
+
+CREATE TABLE IF NOT EXISTS rep_history_archive (
+  id INTEGER PRIMARY KEY,
+  memberaddress VARCHAR(128) NOT NULL,
+  agentid VARCHAR(128),
+  repchange DOUBLE PRECISION NOT NULL,
+  reason VARCHAR(255) NOT NULL,
+  tierbefore INTEGER DEFAULT 0,
+  tierafter INTEGER DEFAULT 0,
+  txhash VARCHAR(128),
+  timestamp TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_rep_history_archive_member_ts ON rep_history_archive (memberaddress, timestamp);
+
+CREATE TABLE IF NOT EXISTS rep_snapshots (
+  memberaddress VARCHAR(128) NOT NULL,
+  taken_at TIMESTAMP NOT NULL,
+  rep DOUBLE PRECISION NOT NULL,
+  tier INTEGER DEFAULT 0,
+  rep_updated_at TIMESTAMP,
+  PRIMARY KEY (memberaddress, taken_at)
+);
+
+CREATE TABLE IF NOT EXISTS job_checkpoints (
+  job_id VARCHAR(128) PRIMARY KEY,
+  last_key VARCHAR(128),
+  processed INTEGER DEFAULT 0,
+  status VARCHAR(32) DEFAULT 'running',
+  started_at TIMESTAMP DEFAULT NOW(),
+  updated_at TIMESTAMP DEFAULT NOW()
+);
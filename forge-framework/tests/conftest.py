@@ -1,5 +1,10 @@
+import base64
+import hashlib
+import hmac
+import json
 import os
 import sys
+import time
 from pathlib import Path
 
 import pytest
@@ -16,14 +21,34 @@ os.environ.setdefault("DATABASE_URL", f"sqlite+pysqlite:///{TEST_DB}")
 os.environ.setdefault("JWT_REQUIRED", "false")
 os.environ.setdefault("ENVIRONMENT", "development")
 
+from agents.openclaw_client import gateway_breaker  # noqa: E402
 from database import Base, SessionLocal, engine, get_db  # noqa: E402
-from main import app  # noqa: E402
+from economy.pricing import price_engine  # noqa: E402
+from main import app, limiter  # noqa: E402
+from monitoring.gauges import state_gauges  # noqa: E402
+from reputation.leaderboard import rep_index  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def _reset_gateway_breaker():
+    gateway_breaker.reset()
+    yield
+    gateway_breaker.reset()
+
+
+@pytest.fixture(autouse=True)
+def _reset_rate_limiter():
+    # Every TestClient request shares one client IP; keep quotas per test.
+    limiter.reset()
 
 
 @pytest.fixture()
 def db_session():
     Base.metadata.drop_all(bind=engine)
     Base.metadata.create_all(bind=engine)
+    state_gauges.invalidate()
+    rep_index.invalidate()
+    price_engine.reset()
     db = SessionLocal()
     try:
         yield db
@@ -44,3 +69,28 @@ def client(db_session):
     with TestClient(app) as c:
         yield c
     app.dependency_overrides = {}
+
+
+@pytest.fixture()
+def make_token():
+    def _token(tier: int, sub: str = "tester") -> str:
+        def _enc(obj):
+            raw = json.dumps(obj, separators=(",", ":")).encode("utf-8")
+            return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("utf-8")
+
+        h = _enc({"alg": "HS256", "typ": "JWT"})
+        p = _enc({"sub": sub, "tier": tier, "exp": int(time.time()) + 3600})
+        secret = os.environ.get("JWT_SECRET", "dev-secret-change-me").encode("utf-8")
+        sig = hmac.new(secret, f"{h}.{p}".encode("utf-8"), hashlib.sha256).digest()
+        s = base64.urlsafe_b64encode(sig).rstrip(b"=").decode("utf-8")
+        return f"{h}.{p}.{s}"
+
+    return _token
+
+
+@pytest.fixture()
+def auth_headers(make_token):
+    def _headers(tier: int, sub: str = "tester") -> dict:
+        return {"Authorization": f"Bearer {make_token(tier, sub)}"}
+
+    return _headers
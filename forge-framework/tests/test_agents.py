@@ -0,0 +1,293 @@
+import asyncio
+import time
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from agents.log_stream import LogTailHub
+from agents.openclaw_client import AsyncOpenClawClient, OpenClawClient
+from circuit_breaker import CLOSED, OPEN, CircuitBreaker
+from main import app, get_gateway
+from models import Agent, Member
+
+
+def _seed_agent(db_session):
+    db_session.add(
+        Member(address="0xowner", name="Owner", rep=1000, tier=3, role="member")
+    )
+    db_session.add(Agent(agentid="agent-a", agenttype="echo", owneraddress="0xowner"))
+    db_session.commit()
+
+
+def test_async_client_keeps_many_calls_in_flight():
+    async def _slow_gateway(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(0.2)
+        return httpx.Response(200, json={"status": "paused"})
+
+    async def _run():
+        client = AsyncOpenClawClient(
+            httpx.AsyncClient(transport=httpx.MockTransport(_slow_gateway))
+        )
+        try:
+            started = time.perf_counter()
+            results = await asyncio.gather(
+                *(client.pause_agent(f"a-{i}") for i in range(300))
+            )
+            return results, time.perf_counter() - started
+        finally:
+            await client.aclose()
+
+    results, elapsed = asyncio.run(_run())
+    assert all(r == {"status": "paused"} for r in results)
+    assert elapsed < 2.0
+
+
+def test_pause_and_kill_use_async_session(client, db_session, auth_headers):
+    _seed_agent(db_session)
+
+    paused = client.post("/agents/agent-a/pause", headers=auth_headers(2))
+    assert paused.status_code == 200
+    assert paused.json()["status"] == "paused"
+    assert paused.json()["runtime"]["status"] == "gateway_unavailable"
+
+    killed = client.post("/agents/agent-a/kill", headers=auth_headers(3))
+    assert killed.status_code == 200
+    db_session.expire_all()
+    assert db_session.get(Agent, "agent-a").status == "killed"
+
+    assert (
+        client.post("/agents/missing/kill", headers=auth_headers(3)).status_code == 404
+    )
+
+
+def test_breaker_fails_fast_and_recovers_through_half_open_probe():
+    now = [0.0]
+    breaker = CircuitBreaker(
+        failure_threshold=2, reset_timeout=10, clock=lambda: now[0]
+    )
+    gateway_up = [False]
+    calls = []
+
+    def _gateway(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        if not gateway_up[0]:
+            raise httpx.ConnectError("down")
+        return httpx.Response(200, json={"status": "ok"})
+
+    client = OpenClawClient(httpx.Client(transport=httpx.MockTransport(_gateway)))
+    with patch("agents.openclaw_client.gateway_breaker", breaker):
+        assert client.pause_agent("a")["status"] == "gateway_unavailable"
+        assert client.pause_agent("a")["status"] == "gateway_unavailable"
+        assert breaker.state == OPEN
+
+        assert client.pause_agent("a") == {
+            "status": "gateway_unavailable",
+            "detail": "circuit open",
+        }
+        assert len(calls) == 2
+
+        now[0] = 11
+        gateway_up[0] = True
+        assert breaker.allow()
+        assert not breaker.allow()
+        breaker.record_success()
+        assert client.pause_agent("a") == {"status": "ok"}
+        assert breaker.state == CLOSED
+
+
+def test_cancelled_gateway_call_is_not_a_failure():
+    now = [0.0]
+    breaker = CircuitBreaker(
+        failure_threshold=1, reset_timeout=10, clock=lambda: now[0]
+    )
+
+    async def _hang(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(10)
+        return httpx.Response(200, json={})
+
+    async def _cancelled_pause():
+        client = AsyncOpenClawClient(
+            httpx.AsyncClient(transport=httpx.MockTransport(_hang))
+        )
+        task = asyncio.create_task(client.pause_agent("a"))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    with patch("agents.openclaw_client.gateway_breaker", breaker):
+        asyncio.run(_cancelled_pause())
+        assert (breaker.state, breaker.failures) == (CLOSED, 0)
+
+        # An abandoned half-open probe frees the slot for the next caller.
+        breaker.record_failure()
+        now[0] = 11
+        asyncio.run(_cancelled_pause())
+        assert breaker.state != OPEN and breaker.allow()
+
+
+def test_gateway_pool_and_breaker_on_metrics(client):
+    metrics = client.get("/metrics").text
+    assert "forge_gateway_breaker_state 0" in metrics
+    assert "forge_gateway_pool_connections" in metrics
+
+
+def test_bulk_spawn_and_kill_fan_out_with_bounded_concurrency(
+    client, db_session, auth_headers
+):
+    db_session.add(
+        Member(address="0xowner", name="Owner", rep=1000, tier=3, role="member")
+    )
+    db_session.commit()
+    in_flight = [0, 0]
+
+    async def _gateway(request: httpx.Request) -> httpx.Response:
+        in_flight[0] += 1
+        in_flight[1] = max(in_flight[1], in_flight[0])
+        await asyncio.sleep(0.01)
+        in_flight[0] -= 1
+        return httpx.Response(200, json={"status": "ok"})
+
+    gateway = AsyncOpenClawClient(
+        httpx.AsyncClient(transport=httpx.MockTransport(_gateway))
+    )
+    app.dependency_overrides[get_gateway] = lambda: gateway
+
+    agents = [{"owner_address": "0xowner", "agent_type": "echo"} for _ in range(20)]
+    agents.append({"owner_address": "0xmissing", "agent_type": "echo"})
+    resp = client.post(
+        "/agents/bulk/spawn",
+        json={"agents": agents, "concurrency": 4},
+        headers=auth_headers(2),
+    )
+    assert resp.status_code == 200
+    results = resp.json()["results"]
+    assert [r.get("runtime") for r in results[:20]] == [{"status": "ok"}] * 20
+    assert results[20] == {"owner_address": "0xmissing", "error": "owner not found"}
+    assert in_flight[1] == 4
+
+    ids = [r["agentid"] for r in results[:20]]
+    killed = client.post(
+        "/agents/bulk/kill",
+        json={"agent_ids": ids + ["agent-nope"]},
+        headers=auth_headers(3),
+    )
+    assert killed.json()["results"][-1] == {
+        "agentid": "agent-nope",
+        "error": "agent not found",
+    }
+    db_session.expire_all()
+    assert db_session.query(Agent).filter(Agent.status == "killed").count() == 20
+    assert db_session.get(Member, "0xowner").rep == pytest.approx(1000 * 0.85**20)
+
+
+class _FakeLogGateway:
+    def __init__(self):
+        self.logs = ["boot", "ready"]
+        self.offsets = []
+
+    async def get_agent_logs_since(self, agent_id: str, offset: int):
+        self.offsets.append(offset)
+        return self.logs[offset:], len(self.logs)
+
+
+def test_log_hub_shares_one_incremental_upstream_between_viewers():
+    gateway = _FakeLogGateway()
+    hub = LogTailHub(gateway, poll_interval=0.01, heartbeat=0.05)
+
+    async def _collect(n: int, **kwargs):
+        out = []
+        async for item in hub.subscribe("agent-a", **kwargs):
+            if item is not None:
+                out.append(item)
+            if len(out) == n:
+                return out
+
+    async def _run():
+        first = asyncio.create_task(_collect(3))
+        second = asyncio.create_task(_collect(2, cursor=1))
+        await asyncio.sleep(0.03)
+        assert hub.upstreams == 1 and hub.viewers == 2
+        gateway.logs.append("working")
+        return await first, await second
+
+    first, second = asyncio.run(_run())
+    assert first == [(0, "boot"), (1, "ready"), (2, "working")]
+    assert second == [(1, "ready"), (2, "working")]
+    assert hub.upstreams == 0
+    assert set(gateway.offsets) <= {0, 2, 3}
+
+
+class _BrokenLogGateway:
+    def __init__(self):
+        self.calls = 0
+
+    async def get_agent_logs_since(self, agent_id: str, offset: int):
+        self.calls += 1
+        if self.calls == 1:
+            raise RuntimeError("malformed payload")
+        return ["up"], 1
+
+
+def test_log_hub_survives_failing_polls():
+    hub = LogTailHub(_BrokenLogGateway(), poll_interval=0.01, heartbeat=0.05)
+
+    async def _first_line():
+        async for item in hub.subscribe("agent-a", cursor=0):
+            if item is not None:
+                return item
+
+    assert asyncio.run(asyncio.wait_for(_first_line(), 1)) == (0, "up")
+
+
+def test_log_hub_restarts_viewers_after_upstream_truncation():
+    gateway = _FakeLogGateway()
+    hub = LogTailHub(gateway, poll_interval=0.01, heartbeat=0.05)
+
+    async def _run():
+        seen = []
+        async for item in hub.subscribe("agent-a", cursor=0):
+            if item is not None:
+                seen.append(item)
+            if len(seen) == 2:
+                gateway.logs = ["rotated"]
+                await asyncio.sleep(0.03)
+                gateway.logs.append("after")
+            if len(seen) == 3:
+                break
+        # The ring only holds what came after the reset.
+        replay = [i async for i in hub.subscribe("agent-a", cursor=0, follow=False)]
+        return seen, replay
+
+    seen, replay = asyncio.run(asyncio.wait_for(_run(), 1))
+    assert seen == [(0, "boot"), (1, "ready"), (1, "after")]
+    assert replay == [(1, "after")]
+
+
+def test_log_stream_endpoint_emits_sse_from_cursor(client, auth_headers):
+    app.state.log_hub = LogTailHub(_FakeLogGateway(), poll_interval=0.01)
+    resp = client.get(
+        "/agents/agent-a/logs/stream",
+        params={"follow": "false"},
+        headers={**auth_headers(1), "Last-Event-ID": "0"},
+    )
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    assert resp.text == "id: 1\ndata: ready\n\n"
+
+
+def test_malformed_log_payload_keeps_offset():
+    payloads = iter([["not", "a", "dict"], {"logs": ["x"], "next_offset": "nan?"}])
+
+    def _gateway(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json=next(payloads))
+
+    client = AsyncOpenClawClient(
+        httpx.AsyncClient(transport=httpx.MockTransport(_gateway))
+    )
+
+    async def _run():
+        return [await client.get_agent_logs_since("agent-a", 4) for _ in range(2)]
+
+    assert asyncio.run(_run()) == [([], 4), ([], 4)]
@@ -1,7 +1,29 @@
+import threading
+from datetime import datetime, timedelta
+
 import pytest
 
-from economy.m2m_market import M2MMarketService
-from models import Agent, Member
+from sqlalchemy import event
+
+from database import SessionLocal, engine
+from economy.m2m_market import M2MMarketService, hour_index, migrate_budget_windows
+from economy.order_book import Fill, MatchingEngine
+from economy.pricing import BASE_PRICES, PricingEngine, price_engine
+from economy.settlement import SettlementRejected, SettlementWorker
+from economy import market_rollups
+from economy.market_rollups import backfill_candles
+from economy.trade_ledger import rebuild_trade_stats, record_trade_stats
+from pagination import encode_cursor
+from models import (
+    Agent,
+    AgentBudget,
+    AgentSpendBucket,
+    AgentTradeStats,
+    MarketCandle,
+    Member,
+    ResourcePrice,
+    Trade,
+)
 
 
 def _seed_agents(db_session):
@@ -47,3 +69,790 @@ def test_trade_rejects_daily_budget_exceeded(db_session):
 
     with pytest.raises(ValueError):
         svc.request_trade("agent-a", "agent-b", "compute", 10)
+
+
+def test_trade_batch_applies_running_budget_per_trade(client, db_session, auth_headers):
+    _seed_agents(db_session)
+    svc = M2MMarketService(db_session)
+    svc.get_budget("agent-a").daily_limit = 1.0
+    db_session.commit()
+
+    trades = [
+        {
+            "buyer_agent": "agent-a",
+            "seller_agent": "agent-b",
+            "resource": "compute",
+            "amount": 10,
+        },
+        {
+            "buyer_agent": "agent-a",
+            "seller_agent": "agent-x",
+            "resource": "compute",
+            "amount": 10,
+        },
+        {
+            "buyer_agent": "agent-a",
+            "seller_agent": "agent-b",
+            "resource": "compute",
+            "amount": 10,
+        },
+        {
+            "buyer_agent": "agent-a",
+            "seller_agent": "agent-b",
+            "resource": "compute",
+            "amount": 10,
+        },
+        {
+            "buyer_agent": "agent-b",
+            "seller_agent": "agent-a",
+            "resource": "energy",
+            "amount": 10,
+        },
+    ]
+    resp = client.post(
+        "/economy/trades/batch", json={"trades": trades}, headers=auth_headers(1)
+    )
+
+    assert resp.status_code == 200
+    body = resp.json()
+    assert (body["accepted"], body["rejected"]) == (3, 2)
+    assert [r["status"] for r in body["results"]] == [
+        "accepted",
+        "rejected",
+        "accepted",
+        "rejected",
+        "accepted",
+    ]
+    assert body["results"][1]["error"] == "buyer or seller agent not found"
+    assert body["results"][3]["error"] == "daily budget exceeded"
+    assert body["results"][4]["trade"]["price"] == 0.1
+    assert svc.get_budget("agent-a").spent_today == pytest.approx(0.8)
+    assert svc.get_budget("agent-b").spent_today == pytest.approx(0.1)
+    assert len(svc.list_trades_for_agent("agent-a")) == 3
+
+
+def test_parallel_trades_never_overspend_budget(db_session):
+    _seed_agents(db_session)
+    db_session.add(AgentBudget(agent_id="agent-a", daily_limit=1.0))
+    db_session.commit()
+    outcomes = []
+    lock = threading.Lock()
+
+    def _trade(batch: bool):
+        db = SessionLocal()
+        svc = M2MMarketService(db)
+        try:
+            for _ in range(6):
+                if batch:
+                    results = svc.request_trades_batch(
+                        [("agent-a", "agent-b", "compute", 3.125)] * 2
+                    )
+                    ok = [("error" not in r) for r in results]
+                else:
+                    try:
+                        svc.request_trade(
+                            "agent-a", "agent-b", "compute", 3.125
+                        )  # 0.125 each
+                        ok = [True]
+                    except ValueError:
+                        ok = [False]
+                with lock:
+                    outcomes.extend(ok)
+        except Exception as exc:  # surfaced below
+            with lock:
+                outcomes.append(exc)
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=_trade, args=(i % 2 == 0,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not [o for o in outcomes if isinstance(o, Exception)]
+    assert sum(outcomes) == 8
+    db_session.expire_all()
+    assert db_session.get(AgentBudget, "agent-a").spent_today == pytest.approx(1.0)
+    assert db_session.query(Trade).count() == 8
+
+
+def test_order_book_price_time_priority_and_partial_fills():
+    engine = MatchingEngine()
+    first, _ = engine.submit("s1", "compute", "sell", 5, 1.0)
+    engine.submit("s2", "compute", "sell", 5, 1.0)
+    engine.submit("s3", "compute", "sell", 5, 0.9)
+
+    order, fills = engine.submit("b1", "compute", "buy", 12, 1.0)
+    assert [(f.seller, f.quantity, f.price) for f in fills] == [
+        ("s3", 5, 0.9),
+        ("s1", 5, 1.0),
+        ("s2", 2, 1.0),
+    ]
+    assert order.remaining == 0
+    assert engine.depth("compute")["asks"] == [(1.0, 3)]
+
+    resting, fills = engine.submit("b2", "compute", "buy", 4, 0.95)
+    assert fills == [] and resting.remaining == 4
+    _, fills = engine.submit("s4", "compute", "sell", 10, None)
+    assert [(f.buyer, f.quantity, f.price) for f in fills] == [("b2", 4, 0.95)]
+    assert engine.depth("compute") == {
+        "resource": "compute",
+        "bids": [],
+        "asks": [(1.0, 3)],
+    }
+
+    assert engine.cancel(first.order_id) is None  # already filled
+    late, _ = engine.submit("s5", "compute", "sell", 1, 1.0, owner="alice")
+    with pytest.raises(PermissionError):
+        engine.cancel(late.order_id, "mallory")
+    assert engine.cancel(late.order_id, "alice") is late
+    assert late.cancelled == 1
+    assert engine.depth("compute")["asks"] == [(1.0, 3)]
+
+    # s2 never trades with itself: its own ask is passed over, not filled.
+    engine.submit("s6", "compute", "sell", 2, 1.1)
+    assert engine.sweep_cost("compute", 4, "s2") == pytest.approx(2.2)
+    _, fills = engine.submit("s2", "compute", "buy", 4, None, max_cost=1.1)
+    assert [(f.seller, f.quantity, f.price) for f in fills] == [("s6", 1, 1.1)]
+    assert engine.depth("compute")["asks"] == [(1.0, 3), (1.1, 1)]
+    with pytest.raises(ValueError):
+        engine.submit("b3", "gold", "buy", 1, 1.0)
+
+
+def test_order_fills_are_persisted_as_matched_trades(client, db_session, auth_headers):
+    _seed_agents(db_session)
+    headers = auth_headers(1)
+    sell = {
+        "agent_id": "agent-b",
+        "resource": "energy",
+        "side": "sell",
+        "quantity": 10,
+        "price": 0.5,
+    }
+    resp = client.post("/economy/orders", json=sell, headers=headers)
+    assert resp.json()["status"] == "resting"
+
+    buy = {
+        "agent_id": "agent-a",
+        "resource": "energy",
+        "side": "buy",
+        "quantity": 4,
+        "order_type": "market",
+    }
+    body = client.post("/economy/orders", json=buy, headers=headers).json()
+    assert (body["status"], body["filled"], body["remaining"]) == ("filled", 4, 0)
+    assert client.get("/economy/orderbook/energy", headers=headers).json()["asks"] == [
+        [0.5, 6]
+    ]
+
+    ghost = dict(buy, agent_id="agent-x")
+    assert (
+        client.post("/economy/orders", json=ghost, headers=headers).status_code == 400
+    )
+    assert (
+        client.post(
+            "/economy/orders", json=dict(buy, price=1.0), headers=headers
+        ).status_code
+        == 400
+    )
+    assert client.delete("/economy/orders/999", headers=headers).status_code == 404
+
+    # Buyers reserve their limit up front; a cancel hands the rest back.
+    greedy = dict(buy, order_type="limit", price=0.5, quantity=500)
+    resp = client.post("/economy/orders", json=greedy, headers=headers)
+    assert (resp.status_code, resp.json()["detail"]) == (400, "daily budget exceeded")
+    bid = dict(buy, order_type="limit", price=0.25, quantity=20)
+    bid_id = client.post("/economy/orders", json=bid, headers=headers).json()[
+        "order_id"
+    ]
+    budget = db_session.get(AgentBudget, "agent-a")
+    db_session.refresh(budget)
+    assert budget.spent_today == pytest.approx(2.0 + 5.0)
+    other = auth_headers(1, sub="someone-else")
+    assert client.delete(f"/economy/orders/{bid_id}", headers=other).status_code == 403
+    assert (
+        client.delete(f"/economy/orders/{bid_id}", headers=headers).status_code == 200
+    )
+    db_session.refresh(budget)
+    assert budget.spent_today == pytest.approx(2.0)
+
+    engine = client.app.state.order_engine
+    assert engine.flush(SessionLocal) == 1
+    trade = db_session.query(Trade).one()
+    assert (trade.buyer_agent, trade.seller_agent, trade.status) == (
+        "agent-a",
+        "agent-b",
+        "matched",
+    )
+    assert (trade.amount, trade.price) == (4, 2.0)
+
+    # A fill the database refuses is dead-lettered; the rest of its batch lands.
+    engine.pending.append(
+        Fill(None, "buy", "agent-a", "agent-b", 1, 0.5, 0, 0, datetime.utcnow())
+    )
+    client.post("/economy/orders", json=dict(sell, quantity=1), headers=headers)
+    client.post("/economy/orders", json=dict(buy, quantity=1), headers=headers)
+    assert engine.flush(SessionLocal) == 1
+    assert [f.resource for f in engine.dead_letters] == [None]
+    assert not engine.pending
+
+
+def test_pricing_engine_follows_flow_and_decays():
+    engine = PricingEngine(
+        "dynamic", half_life=60, reference_volume=100, refresh_seconds=0
+    )
+    assert engine.unit_price("compute") == BASE_PRICES["compute"]
+
+    engine.observe([("compute", 0.5, "buy")])  # below the cold threshold
+    assert engine.unit_price("compute") == BASE_PRICES["compute"]
+
+    engine.observe([("compute", 100, "buy")])
+    hot = engine.unit_price("compute")
+    assert hot == pytest.approx(0.04 * 1.5, rel=1e-3)
+    engine.observe([("energy", 100, "sell")])
+    assert engine.unit_price("energy") == pytest.approx(0.01 * 0.5, rel=1e-3)
+
+    state = engine._states["compute"]
+    state.updated -= 60
+    assert engine.unit_price("compute") < hot
+    state.updated -= 6000
+    assert engine.unit_price("compute") == BASE_PRICES["compute"]
+
+    assert (
+        PricingEngine().unit_price("compute") == BASE_PRICES["compute"]
+    )  # static mode
+
+
+def test_dynamic_quotes_track_committed_trades_and_checkpoint(db_session):
+    _seed_agents(db_session)
+    svc = M2MMarketService(db_session)
+    price_engine.configure("dynamic", half_life=3600, reference_volume=100)
+    try:
+        ghost = Trade(
+            buyer_agent="agent-a",
+            seller_agent="agent-b",
+            resource_type="compute",
+            amount=500,
+            price=1,
+        )
+        svc._insert_trades([ghost])
+        db_session.rollback()  # rolled-back trades are never observed
+        assert svc.quote("compute", 10) == 0.4
+        svc.request_trade("agent-a", "agent-b", "compute", 100)
+        assert svc.quote("compute", 10) > 0.4
+        assert svc.quote("energy", 10) == 0.1
+
+        assert price_engine.checkpoint(db_session) == 1
+        row = db_session.get(ResourcePrice, "compute")
+        assert (row.demand_ewma, row.supply_ewma) == (pytest.approx(100, rel=1e-3), 0)
+
+        price_engine.reset()
+        assert svc.quote("compute", 10) == 0.4
+        assert price_engine.restore(db_session) == 1
+        assert svc.quote("compute", 10) == pytest.approx(10 * row.price, rel=1e-3)
+    finally:
+        price_engine.configure("static", half_life=3600, reference_volume=1000)
+
+
+def test_agent_trade_history_filters_and_summaries(client, db_session, auth_headers):
+    _seed_agents(db_session)
+    db_session.add(
+        Agent(
+            agentid="agent-c",
+            agenttype="echo",
+            owneraddress="0xowner",
+            ownerrep=10,
+            tier=1,
+        )
+    )
+    db_session.commit()
+    svc = M2MMarketService(db_session)
+    svc.request_trade("agent-a", "agent-b", "compute", 10)
+    svc.request_trade("agent-b", "agent-a", "energy", 20)
+    svc.request_trade("agent-a", "agent-a", "data", 5)
+    svc.request_trade("agent-c", "agent-b", "compute", 1)
+    old = db_session.query(Trade).order_by(Trade.id).first()
+    old.created_at = datetime.utcnow() - timedelta(days=3)
+    db_session.commit()
+    headers = auth_headers(1)
+
+    ids = [
+        t["id"] for t in client.get("/economy/trades/agent-a", headers=headers).json()
+    ]
+    assert ids == [3, 2, 1]
+    since = (datetime.utcnow() - timedelta(days=1)).isoformat()
+    resp = client.get(
+        "/economy/trades/agent-a", params={"since": since}, headers=headers
+    )
+    assert [t["id"] for t in resp.json()] == [3, 2]
+    resp = client.get(
+        "/economy/trades/agent-a", params={"until": since, "limit": 1}, headers=headers
+    )
+    assert [t["id"] for t in resp.json()] == [1]
+
+    pages, cursor = [], None
+    while True:
+        params = {
+            "limit": 2,
+            "fields": "price",
+            **({"cursor": cursor} if cursor else {}),
+        }
+        page = client.get("/economy/trades/agent-a", params=params, headers=headers)
+        assert page.status_code == 200
+        pages.append([t["id"] for t in page.json()])
+        cursor = page.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert pages == [[3, 2], [1]]
+    assert set(page.json()[0]) == {"id", "created_at", "price"}
+    bad = client.get(
+        "/economy/trades/agent-a", params={"cursor": encode_cursor(7)}, headers=headers
+    )
+    assert bad.status_code == 400
+
+    summary = client.get("/economy/trades/agent-a/summary", headers=headers).json()
+    assert (summary["trades_bought"], summary["trades_sold"]) == (2, 2)
+    assert summary["volume"] == pytest.approx(10 + 20 + 5 + 5)
+    assert summary["spend"] == pytest.approx(0.4 + 0.1)
+    assert summary["revenue"] == pytest.approx(0.2 + 0.1)
+    assert summary["counterparty_count"] == 2
+    assert [c["agent_id"] for c in summary["counterparties"]] == ["agent-b", "agent-a"]
+    assert summary["counterparties"][0]["trades"] == 2
+    assert (
+        client.get("/economy/trades/agent-x/summary", headers=headers).status_code
+        == 404
+    )
+
+    def _stats():
+        rows = db_session.query(AgentTradeStats)
+        return {r.agent_id: (r.trades_bought, r.spend, r.last_trade_at) for r in rows}
+
+    before = _stats()
+    assert rebuild_trade_stats(db_session) == 3
+    db_session.expire_all()
+    after = _stats()
+    assert after.keys() == before.keys()
+    for agent, (bought, spend, last) in before.items():
+        assert after[agent] == (bought, pytest.approx(spend), last)
+
+
+def test_trade_inserts_roll_up_into_candles(
+    client, db_session, auth_headers, monkeypatch
+):
+    _seed_agents(db_session)
+    svc = M2MMarketService(db_session)
+    t0 = datetime(2026, 5, 1, 10, 0, 5)
+
+    def _trade(
+        offset: timedelta, amount: float, unit: float, resource: str = "compute"
+    ):
+        return Trade(
+            buyer_agent="agent-a",
+            seller_agent="agent-b",
+            resource_type=resource,
+            amount=amount,
+            price=amount * unit,
+            created_at=t0 + offset,
+        )
+
+    svc._insert_trades(
+        [_trade(timedelta(seconds=30), 10, 2.0), _trade(timedelta(0), 5, 1.0)]
+    )
+    db_session.commit()
+    svc._insert_trades(
+        [
+            _trade(timedelta(seconds=50), 5, 3.0),
+            _trade(timedelta(minutes=1), 10, 0.5),
+            _trade(timedelta(0), 1, 9.0, "energy"),
+        ]
+    )
+    db_session.commit()
+    headers = auth_headers(1)
+
+    minute = client.get(
+        "/economy/market/compute/candles", params={"interval": "1m"}, headers=headers
+    ).json()["candles"]
+    assert [c["bucket_start"] for c in minute] == [
+        "2026-05-01T10:00:00",
+        "2026-05-01T10:01:00",
+    ]
+    first = minute[0]
+    assert (first["open"], first["high"], first["low"], first["close"]) == (
+        1.0,
+        3.0,
+        1.0,
+        3.0,
+    )
+    assert (first["volume"], first["trades"]) == (20, 3)
+    assert first["vwap"] == pytest.approx((5 + 20 + 15) / 20)
+
+    (hour,) = client.get("/economy/market/compute/candles", headers=headers).json()[
+        "candles"
+    ]
+    assert (hour["open"], hour["close"], hour["low"], hour["trades"]) == (
+        1.0,
+        0.5,
+        0.5,
+        4,
+    )
+    resp = client.get(
+        "/economy/market/compute/candles",
+        params={"interval": "1d", "since": "2026-05-02T00:00:00"},
+        headers=headers,
+    )
+    assert resp.json()["candles"] == []
+    resp = client.get(
+        "/economy/market/compute/candles", params={"interval": "5m"}, headers=headers
+    )
+    assert resp.status_code == 400
+
+    def _candles():
+        rows = db_session.query(MarketCandle).order_by(
+            MarketCandle.resource_type, MarketCandle.period, MarketCandle.bucket_start
+        )
+        return [(r.open, r.high, r.low, r.close, r.volume, r.trades) for r in rows]
+
+    incremental = _candles()
+    assert backfill_candles(db_session) == 5
+    db_session.expire_all()
+    assert _candles() == incremental
+
+    # A backfill that fails part-way leaves the previous candles in place.
+    applied = []
+
+    def _failing_apply(db, candles):
+        if applied:
+            raise RuntimeError("disk full")
+        applied.append(candles)
+        original_apply(db, candles)
+
+    original_apply = market_rollups._apply
+    monkeypatch.setattr(market_rollups, "BACKFILL_CHUNK", 2)
+    monkeypatch.setattr(market_rollups, "_apply", _failing_apply)
+    with pytest.raises(RuntimeError):
+        backfill_candles(db_session)
+    db_session.expire_all()
+    assert _candles() == incremental
+
+
+def test_budget_windows_roll_hourly_instead_of_resetting(db_session):
+    _seed_agents(db_session)
+    db_session.add(AgentBudget(agent_id="agent-a", daily_limit=1.0, weekly_limit=3.0))
+    db_session.commit()
+    svc = M2MMarketService(db_session)
+    t0 = datetime.utcnow()
+
+    def _spend(hours: float, price: float) -> bool:
+        ok = svc._consume_budget("agent-a", price, t0 + timedelta(hours=hours))
+        db_session.commit()
+        return ok
+
+    assert _spend(0, 0.6) and _spend(10, 0.3)
+    assert not _spend(23, 0.2)
+    assert _spend(24, 0.2)  # the hour-0 spend left the 24h window
+    assert _spend(30, 0.5) and not _spend(33, 0.1)
+    # A fixed reset at hour 48 would clear the day; the hour-30 spend is still in the window.
+    assert not _spend(48, 0.9)
+    assert _spend(54, 0.9)
+    assert not _spend(
+        79, 0.6
+    )  # daily is clear again, but 2.5 of 3.0 is spent this week
+    assert _spend(169, 0.6)  # the hour-0 spend left the 7d window
+
+    budget = db_session.get(AgentBudget, "agent-a")
+    db_session.refresh(budget)
+    assert budget.spent_today == pytest.approx(0.6)
+    assert budget.spent_this_week == pytest.approx(2.5)
+    assert (
+        db_session.query(AgentSpendBucket).count() == 6
+    )  # one ring slot per spending hour
+
+
+def test_legacy_budgets_migrate_to_hourly_ring(db_session):
+    _seed_agents(db_session)
+    now = datetime.utcnow()
+    db_session.add_all(
+        [
+            AgentBudget(
+                agent_id="agent-a",
+                spent_today=0.5,
+                spent_this_week=1.5,
+                last_reset_daily=now - timedelta(hours=2),
+                last_reset_weekly=now - timedelta(days=3),
+            ),
+            AgentBudget(
+                agent_id="agent-b",
+                spent_today=4.0,
+                spent_this_week=9.0,
+                last_reset_daily=now - timedelta(days=2),
+                last_reset_weekly=now - timedelta(days=8),
+            ),
+        ]
+    )
+    db_session.commit()
+
+    assert migrate_budget_windows(db_session) == 2
+    assert migrate_budget_windows(db_session) == 0
+    db_session.expire_all()
+    a, b = db_session.get(AgentBudget, "agent-a"), db_session.get(
+        AgentBudget, "agent-b"
+    )
+    assert (a.spent_today, a.spent_this_week, a.window_hour) == (
+        0.5,
+        1.5,
+        hour_index(now),
+    )
+    assert (b.spent_today, b.spent_this_week) == (0.0, 0.0)
+
+    svc = M2MMarketService(db_session)
+    svc._advance_window("agent-a", hour_index(now) + 24)
+    db_session.commit()
+    db_session.refresh(a)
+    assert (a.spent_today, a.spent_this_week) == (0.0, pytest.approx(1.5))
+    svc._advance_window("agent-a", hour_index(now) + 144)
+    db_session.commit()
+    db_session.refresh(a)
+    assert a.spent_this_week == pytest.approx(0.5)
+
+
+def test_batch_advances_stale_budgets_in_one_statement(db_session):
+    _seed_agents(db_session)
+    hour = hour_index(datetime.utcnow())
+    for agent, window in (("agent-a", hour - 2), ("agent-b", hour - 200)):
+        db_session.add(
+            AgentBudget(
+                agent_id=agent,
+                daily_limit=1.0,
+                weekly_limit=10.0,
+                spent_today=0.9,
+                spent_this_week=0.9,
+                window_hour=window,
+            )
+        )
+    # agent-a's spend from 25h ago leaves its 24h window once it is advanced.
+    db_session.add_all(
+        [
+            AgentSpendBucket(
+                agent_id="agent-a", slot=(hour - 25) % 168, hour=hour - 25, amount=0.5
+            ),
+            AgentSpendBucket(
+                agent_id="agent-a", slot=(hour - 3) % 168, hour=hour - 3, amount=0.4
+            ),
+        ]
+    )
+    db_session.commit()
+    advances = []
+
+    def _capture(conn, cursor, statement, parameters, context, executemany):
+        if (
+            statement.startswith("UPDATE agent_budgets SET")
+            and "window_hour <" in statement
+        ):
+            advances.append(statement)
+
+    event.listen(engine, "before_cursor_execute", _capture)
+    try:
+        results = M2MMarketService(db_session).request_trades_batch(
+            [
+                ("agent-a", "agent-b", "compute", 10),
+                ("agent-b", "agent-a", "compute", 10),
+            ]
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", _capture)
+
+    assert [r.get("error") for r in results] == [None, None]
+    assert len(advances) == 1
+    db_session.expire_all()
+    a, b = db_session.get(AgentBudget, "agent-a"), db_session.get(
+        AgentBudget, "agent-b"
+    )
+    assert (a.spent_today, a.spent_this_week) == (
+        pytest.approx(0.8),
+        pytest.approx(1.3),
+    )
+    assert (b.spent_today, b.spent_this_week) == (
+        pytest.approx(0.4),
+        pytest.approx(0.4),
+    )
+    assert a.window_hour == b.window_hour == hour
+
+
+class _FakeEscrow:
+    """In-process stand-in for ``M2MEscrow.settleBatch``.
+
+    ``rejected`` trades fail simulation; ``reverted`` ones are mined and revert.
+    With ``lose_receipts`` the transaction is mined but waiting for it times out.
+    """
+
+    def __init__(self, rejected=(), reverted=(), broken=False, lose_receipts=False):
+        self.rejected = set(rejected)
+        self.reverted = set(reverted)
+        self.broken = broken
+        self.lose_receipts = lose_receipts
+        self.sent = []
+        self.mined = {}
+
+    @property
+    def batches(self):
+        return [items for items, ok in self.sent if ok]
+
+    def settle_batch(self, items, on_signed):
+        if self.broken:
+            raise ConnectionError("rpc down")
+        ids = {i.trade_id for i in items}
+        if self.rejected & ids:
+            raise SettlementRejected("payment failed")
+        tx = f"0x{len(self.sent) + 1:064x}"
+        on_signed(tx)
+        ok = not self.reverted & ids
+        self.sent.append((list(items), ok))
+        self.mined[tx] = ok
+        if self.lose_receipts:
+            raise TimeoutError("receipt not found in time")
+        if not ok:
+            raise SettlementRejected("reverted")
+        return tx
+
+    def receipt_status(self, tx):
+        return self.mined.get(tx)
+
+
+def _pending_trades(db_session, count: int):
+    _seed_agents(db_session)
+    svc = M2MMarketService(db_session)
+    for _ in range(count - 1):
+        svc.request_trade("agent-a", "agent-b", "compute", 10)
+    svc._insert_trades(
+        [
+            Trade(
+                buyer_agent="agent-b",
+                seller_agent="agent-a",
+                resource_type="data",
+                amount=2,
+                price=0.05,
+                status="matched",
+            )
+        ]
+    )
+    db_session.commit()
+
+
+def test_settlement_worker_batches_and_isolates_rejected_trades(db_session):
+    _pending_trades(db_session, 6)
+    escrow = _FakeEscrow(rejected={3})
+
+    report = SettlementWorker(SessionLocal, escrow, batch_size=4).run()
+
+    assert (report.batches, report.settled, report.failed, report.transactions) == (
+        2,
+        5,
+        1,
+        3,
+    )
+    assert [[i.trade_id for i in b] for b in escrow.batches] == [[1, 2], [4], [5, 6]]
+    first = escrow.batches[0][0]
+    assert (first.seller, first.price, first.amount) == (
+        "0xowner",
+        4 * 10**17,
+        10 * 10**6,
+    )
+    db_session.expire_all()
+    trades = {t.id: t for t in db_session.query(Trade)}
+    assert trades[3].status == "settlement_failed" and trades[3].escrow_tx is None
+    assert {trades[i].status for i in (1, 2, 4, 5, 6)} == {"settled"}
+    assert trades[1].escrow_tx == trades[2].escrow_tx != trades[4].escrow_tx
+    assert all(trades[i].completed_at is not None for i in trades)
+    assert SettlementWorker(SessionLocal, escrow).run().batches == 0
+
+
+def test_settlement_worker_releases_batch_on_transient_error(
+    client, db_session, auth_headers
+):
+    _pending_trades(db_session, 3)
+    worker = SettlementWorker(SessionLocal, _FakeEscrow(broken=True))
+    with pytest.raises(ConnectionError):
+        worker.run()
+    db_session.expire_all()
+    assert [t.status for t in db_session.query(Trade).order_by(Trade.id)] == [
+        "requested",
+        "requested",
+        "matched",
+    ]
+
+    from main import app, get_escrow_backend
+
+    app.dependency_overrides[get_escrow_backend] = lambda: _FakeEscrow()
+    resp = client.post("/economy/settlement/run", headers=auth_headers(3))
+    assert resp.status_code == 200
+    assert (resp.json()["settled"], resp.json()["batches"]) == (3, 1)
+    assert (
+        client.post("/economy/settlement/run", headers=auth_headers(1)).status_code
+        == 403
+    )
+
+
+def test_settlement_never_rebroadcasts_a_sent_batch(db_session):
+    _pending_trades(db_session, 4)
+    escrow = _FakeEscrow(reverted={2}, lose_receipts=True)
+    worker = SettlementWorker(SessionLocal, escrow, batch_size=2)
+
+    with pytest.raises(TimeoutError):
+        worker.run()
+    db_session.expire_all()
+    trades = db_session.query(Trade).order_by(Trade.id).all()
+    assert [t.status for t in trades] == [
+        "submitted",
+        "submitted",
+        "requested",
+        "matched",
+    ]
+    assert trades[0].escrow_tx == trades[1].escrow_tx == "0x" + "0" * 63 + "1"
+
+    escrow.lose_receipts = False
+    escrow.reverted = {4}
+    report = worker.run()
+    # The lost batch is resolved from its receipt (it reverted), never sent again;
+    # the next one reverts on chain and is bisected, counting every sent transaction.
+    assert (report.reconciled, report.transactions, report.settled, report.failed) == (
+        1,
+        3,
+        1,
+        3,
+    )
+    assert [[i.trade_id for i in items] for items, _ in escrow.sent] == [
+        [1, 2],
+        [3, 4],
+        [3],
+        [4],
+    ]
+    db_session.expire_all()
+    assert [t.status for t in db_session.query(Trade).order_by(Trade.id)] == [
+        "settlement_failed",
+        "settlement_failed",
+        "settled",
+        "settlement_failed",
+    ]
+
+
+def test_aggregate_upserts_lock_rows_in_key_order(db_session):
+    statements = []
+
+    def _capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO agent_trade_stats"):
+            statements.append(parameters)
+
+    event.listen(engine, "before_cursor_execute", _capture)
+    try:
+        trade = Trade(
+            buyer_agent="agent-z", seller_agent="agent-a", amount=1.0, price=0.1
+        )
+        trade.created_at = datetime.utcnow()
+        record_trade_stats(db_session, [trade])
+    finally:
+        event.remove(engine, "before_cursor_execute", _capture)
+    db_session.rollback()
+
+    (params,) = statements
+    assert [p for p in params if p in ("agent-a", "agent-z")] == ["agent-a", "agent-z"]
@@ -1,7 +1,10 @@
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
 
+from database import SessionLocal
 from governance.meta_dao import MetaDAOService
-from models import Member
+from models import Member, Vote
 
 
 def test_submit_proposal_shape(db_session):
@@ -23,3 +26,55 @@ def test_submit_proposal_requires_tier(db_session):
     svc = MetaDAOService(db_session)
     with pytest.raises(ValueError):
         svc.submit_proposal("0x2", "", "")
+
+
+def _proposal_with_voters(db_session, voters: int) -> int:
+    db_session.add(
+        Member(address="0xp", name="Proposer", rep=200, tier=2, role="member")
+    )
+    db_session.add_all(
+        Member(address=f"0xv{i}", name=f"Voter {i}", rep=50, tier=1, role="member")
+        for i in range(voters)
+    )
+    db_session.commit()
+    return MetaDAOService(db_session).submit_proposal("0xp", "Upgrade", "Body")["id"]
+
+
+def test_vote_is_recorded_once_per_member_and_can_change(db_session):
+    proposal_id = _proposal_with_voters(db_session, 2)
+    svc = MetaDAOService(db_session)
+
+    svc.vote(proposal_id, "0xv0", True)
+    tally = svc.vote(proposal_id, "0xv0", True)
+    assert (tally["votes_for"], tally["votes_against"]) == (1, 0)
+
+    tally = svc.vote(proposal_id, "0xv0", False)
+    assert (tally["votes_for"], tally["votes_against"]) == (0, 1)
+
+    tally = svc.vote(proposal_id, "0xv1", True)
+    assert (tally["votes_for"], tally["votes_against"]) == (1, 1)
+    ballots = {v.voter: v.support for v in db_session.query(Vote)}
+    assert ballots == {"0xv0": False, "0xv1": True}
+
+    with pytest.raises(ValueError):
+        svc.vote(proposal_id + 1, "0xv1", True)
+
+
+def test_concurrent_votes_keep_tallies_exact(db_session):
+    proposal_id = _proposal_with_voters(db_session, 20)
+
+    def cast(i: int):
+        with SessionLocal() as db:
+            svc = MetaDAOService(db)
+            svc.vote(proposal_id, f"0xv{i % 20}", True)
+            if i % 20 < 5:
+                svc.vote(proposal_id, f"0xv{i % 20}", False)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(cast, range(40)))
+
+    tally = MetaDAOService(db_session).list_proposals(
+        fields=["votes_for", "votes_against"]
+    )[0]
+    assert tally == {"votes_for": 15, "votes_against": 5}
+    assert db_session.query(Vote).count() == 20
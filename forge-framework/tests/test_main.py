@@ -1,25 +1,5 @@
-import base64
-import hashlib
-import hmac
-import json
-import time
-
 from models import Agent, Member
-
-
-def _token(tier: int) -> str:
-    header = {"alg": "HS256", "typ": "JWT"}
-    payload = {"sub": "tester", "tier": tier, "exp": int(time.time()) + 3600}
-
-    def _enc(obj):
-        raw = json.dumps(obj, separators=(",", ":")).encode("utf-8")
-        return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("utf-8")
-
-    h = _enc(header)
-    p = _enc(payload)
-    sig = hmac.new(b"dev-secret-change-me", f"{h}.{p}".encode("utf-8"), hashlib.sha256).digest()
-    s = base64.urlsafe_b64encode(sig).rstrip(b"=").decode("utf-8")
-    return f"{h}.{p}.{s}"
+from pagination import encode_cursor
 
 
 def test_health_and_metrics(client):
@@ -31,12 +11,12 @@ def test_health_and_metrics(client):
     assert "forge_rep_total" in metrics.text
 
 
-def test_governance_endpoints(client, db_session):
+def test_governance_endpoints(client, db_session, auth_headers):
     db_session.add(Member(address="0xproposer", name="P", rep=300, tier=3, role="member"))
     db_session.add(Member(address="0xvoter", name="V", rep=20, tier=1, role="member"))
     db_session.commit()
 
-    headers_t2 = {"Authorization": f"Bearer {_token(2)}"}
+    headers_t2 = auth_headers(2)
     proposal = client.post(
         "/governance/proposals",
         json={"proposer": "0xproposer", "title": "T", "body": "B"},
@@ -45,7 +25,7 @@ def test_governance_endpoints(client, db_session):
     assert proposal.status_code == 200
     pid = proposal.json()["id"]
 
-    headers_t1 = {"Authorization": f"Bearer {_token(1)}"}
+    headers_t1 = auth_headers(1)
     vote = client.post(
         "/governance/vote",
         json={"proposal_id": pid, "voter": "0xvoter", "support": True},
@@ -55,7 +35,7 @@ def test_governance_endpoints(client, db_session):
     assert vote.json()["votes_for"] == 1
 
 
-def test_economy_endpoints(client, db_session):
+def test_economy_endpoints(client, db_session, auth_headers):
     db_session.add(Member(address="0xowner", name="Owner", rep=1000, tier=3, role="member"))
     db_session.add_all(
         [
@@ -65,7 +45,7 @@ def test_economy_endpoints(client, db_session):
     )
     db_session.commit()
 
-    headers_t1 = {"Authorization": f"Bearer {_token(1)}"}
+    headers_t1 = auth_headers(1)
     resp = client.post(
         "/economy/trade/request",
         json={
@@ -85,3 +65,141 @@ def test_economy_endpoints(client, db_session):
     budget = client.get("/economy/budget/agent-a", headers=headers_t1)
     assert budget.status_code == 200
     assert budget.json()["spent_today"] > 0
+
+
+def test_verified_token_cache_counts_hits(client, auth_headers):
+    from main import token_cache
+
+    token_cache.clear()
+    headers = auth_headers(1)
+    for _ in range(3):
+        assert client.get("/agents", headers=headers).status_code == 200
+
+    metrics = client.get("/metrics").text
+    assert "forge_jwt_cache_hits_total 2" in metrics
+    assert "forge_jwt_cache_misses_total 1" in metrics
+
+
+def test_cached_signature_rejects_tampered_payload(client, make_token):
+    token = make_token(1)
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/agents", headers=headers).status_code == 200
+
+    h, _, s = token.split(".")
+    forged = make_token(3).split(".")[1]
+    resp = client.get("/agents", headers={"Authorization": f"Bearer {h}.{forged}.{s}"})
+    assert resp.status_code == 401
+
+
+def test_token_cache_drops_entries_at_exp():
+    from token_cache import VerifiedTokenCache
+
+    now = [1000.0]
+    cache = VerifiedTokenCache(max_entries=2, clock=lambda: now[0])
+    cache.put("sig", "h.p", {"sub": "a", "exp": 1005})
+    assert cache.get("sig", "h.p") == {"sub": "a", "exp": 1005}
+
+    now[0] = 1006.0
+    assert cache.get("sig", "h.p") is None
+    assert len(cache) == 0
+
+
+def test_metrics_expose_route_histograms_and_db_timing(client, auth_headers):
+    headers = auth_headers(1)
+    client.get("/agents", headers=headers)
+
+    metrics = client.get("/metrics").text
+    assert (
+        'forge_http_request_duration_seconds_count{route="/agents",method="GET",status="200"} '
+        in metrics
+    )
+    assert 'forge_db_queries_per_request_count{route="/agents"}' in metrics
+    assert "forge_db_queries_total " in metrics
+
+
+def test_state_gauges_follow_committed_writes(client, db_session):
+    from monitoring.gauges import state_gauges
+
+    client.get("/metrics")
+    db_session.add(Member(address="0xg", name="G", rep=40, tier=1, role="member"))
+    db_session.add(Agent(agentid="agent-g", agenttype="echo", owneraddress="0xg"))
+    db_session.commit()
+
+    member = db_session.get(Member, "0xg")
+    member.rep = 25
+    db_session.commit()
+
+    assert state_gauges.snapshot(db_session)["forge_rep_total"] == 25.0
+    assert state_gauges.snapshot(db_session)["forge_agents_active"] == 1
+    metrics = client.get("/metrics").text
+    assert "forge_rep_total 25.0" in metrics
+
+
+def test_list_endpoints_paginate_with_keyset_cursor(client, db_session, auth_headers):
+    db_session.add(
+        Member(address="0xowner", name="Owner", rep=1000, tier=3, role="member")
+    )
+    db_session.add_all(
+        Agent(agentid=f"agent-{i}", agenttype="echo", owneraddress="0xowner")
+        for i in range(5)
+    )
+    db_session.commit()
+    headers = auth_headers(1)
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2, "fields": "status"}
+        if cursor:
+            params["cursor"] = cursor
+        page = client.get("/agents", params=params, headers=headers)
+        assert page.status_code == 200
+        seen.extend(page.json())
+        cursor = page.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+
+    assert [a["agentid"] for a in seen] == [f"agent-{i}" for i in range(5)]
+    assert set(seen[0]) == {"agentid", "status"}
+    assert (
+        client.get("/agents", params={"cursor": "!!"}, headers=headers).status_code
+        == 400
+    )
+    assert (
+        client.get("/agents", params={"fields": "secret"}, headers=headers).status_code
+        == 400
+    )
+
+
+def test_proposal_list_can_omit_body(client, db_session, auth_headers):
+    db_session.add(
+        Member(address="0xproposer", name="P", rep=300, tier=3, role="member")
+    )
+    db_session.commit()
+    headers = auth_headers(2)
+    for title in ("A", "B", "C"):
+        client.post(
+            "/governance/proposals",
+            json={"proposer": "0xproposer", "title": title, "body": "x" * 1000},
+            headers=headers,
+        )
+
+    first = client.get(
+        "/governance/proposals", params={"limit": 2, "fields": "title"}, headers=headers
+    )
+    assert [p["title"] for p in first.json()] == ["C", "B"]
+    assert "body" not in first.json()[0]
+
+    rest = client.get(
+        "/governance/proposals",
+        params={"cursor": first.headers["X-Next-Cursor"]},
+        headers=headers,
+    )
+    assert [p["title"] for p in rest.json()] == ["A"]
+    assert rest.json()[0]["body"] == "x" * 1000
+
+    agents_cursor = encode_cursor("agent-1")
+    mismatched = client.get(
+        "/governance/proposals", params={"cursor": agents_cursor}, headers=headers
+    )
+    assert mismatched.status_code == 400
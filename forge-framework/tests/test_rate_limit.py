@@ -0,0 +1,56 @@
+import pytest
+from fastapi import HTTPException
+
+from rate_limit import SlidingWindowRateLimiter
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_limits_within_window():
+    clock = FakeClock()
+    limiter = SlidingWindowRateLimiter(3, clock=clock)
+
+    assert [limiter.hit("1.2.3.4") for _ in range(4)] == [True, True, True, False]
+    with pytest.raises(HTTPException) as exc:
+        limiter.enforce("1.2.3.4")
+    assert exc.value.status_code == 429
+
+
+def test_previous_window_is_weighted_by_overlap():
+    clock = FakeClock(1020.0)
+    limiter = SlidingWindowRateLimiter(4, clock=clock)
+    for _ in range(4):
+        assert limiter.hit("ip")
+
+    # Half-way into the next window, half of the previous bucket still counts.
+    clock.now = 1110.0
+    assert limiter.hit("ip")
+    assert limiter.hit("ip")
+    assert not limiter.hit("ip")
+
+
+def test_tier_quotas_override_default():
+    limiter = SlidingWindowRateLimiter(1, tier_quotas={3: 5}, clock=FakeClock())
+
+    assert limiter.hit("a", tier=0)
+    assert not limiter.hit("a", tier=0)
+    assert all(limiter.hit("b", tier=3) for _ in range(5))
+    assert not limiter.hit("b", tier=3)
+
+
+def test_idle_and_excess_keys_are_evicted():
+    clock = FakeClock()
+    limiter = SlidingWindowRateLimiter(10, max_keys=3, clock=clock)
+    for key in ("a", "b", "c", "d"):
+        limiter.hit(key)
+    assert len(limiter) == 3
+
+    clock.now += 121
+    limiter.hit("e")
+    assert len(limiter) == 1
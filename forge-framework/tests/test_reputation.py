@@ -0,0 +1,387 @@
+import json
+import random
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from database import SessionLocal
+from models import Agent, JobCheckpoint, Member, RepHistory
+from monitoring.gauges import state_gauges
+from reputation.agent_staking import deploy_agent_with_staking, deploy_agents_for_owner
+from reputation.leaderboard import RankIndex
+from reputation.redqueen import (
+    LAZY_DECAY_REASON,
+    configure_decay,
+    effective_rep,
+    effective_tier,
+    run_bulk_decay,
+)
+from reputation.rep_ledger import compact_rep_history, rep_at, take_rep_snapshots
+from reputation.tier_engine import load_tier_table, reload_tier_profiles, retier_members
+
+
+@pytest.fixture()
+def lazy_decay():
+    configure_decay("lazy", 0.01)
+    yield
+    configure_decay("batch", 0.0017)
+
+
+def _seed_members(db_session, reps):
+    for i, rep in enumerate(reps):
+        db_session.add(
+            Member(address=f"0x{i:04d}", name=f"m{i}", rep=rep, tier=0, role="member")
+        )
+    db_session.commit()
+
+
+def test_bulk_decay_updates_and_records_history_per_chunk(db_session):
+    _seed_members(db_session, [1000.0, 100.2, 10.01, 5.0, 0.0])
+
+    report = run_bulk_decay(
+        db_session, daily_decay_rate=0.01, chunk_size=2, run_id="decay-test"
+    )
+
+    assert report.processed == 5
+    assert report.chunks == 3
+    assert report.members_per_second > 0
+    members = {m.address: m for m in db_session.query(Member).all()}
+    assert members["0x0000"].rep == pytest.approx(990.0)
+    assert [members[f"0x{i:04d}"].tier for i in range(5)] == [3, 1, 0, 0, 0]
+    history = (
+        db_session.query(RepHistory).filter(RepHistory.memberaddress == "0x0000").one()
+    )
+    assert history.repchange == pytest.approx(-10.0)
+    assert (history.tierbefore, history.tierafter) == (0, 3)
+    assert db_session.query(RepHistory).count() == 5
+    assert db_session.get(JobCheckpoint, "decay-test").status == "completed"
+
+
+def test_bulk_decay_resumes_from_checkpoint_and_is_idempotent(db_session):
+    _seed_members(db_session, [100.0] * 4)
+    db_session.add(JobCheckpoint(job_id="decay-resume", last_key="0x0001", processed=2))
+    db_session.commit()
+
+    report = run_bulk_decay(
+        db_session, daily_decay_rate=0.5, chunk_size=10, run_id="decay-resume"
+    )
+    assert report.resumed and report.processed == 2
+    reps = [m.rep for m in db_session.query(Member).order_by(Member.address)]
+    assert reps == [100.0, 100.0, 50.0, 50.0]
+
+    again = run_bulk_decay(db_session, daily_decay_rate=0.5, run_id="decay-resume")
+    assert again.processed == 0
+    assert db_session.get(JobCheckpoint, "decay-resume").processed == 4
+
+
+def test_lazy_decay_is_applied_on_read_and_materialized_on_stake(
+    db_session, lazy_decay
+):
+    ten_days_ago = datetime.utcnow() - timedelta(days=10)
+    db_session.add(
+        Member(
+            address="0xlazy",
+            name="Lazy",
+            rep=105.0,
+            tier=2,
+            rep_updated_at=ten_days_ago,
+        )
+    )
+    db_session.add(
+        Member(
+            address="0xidle", name="Idle", rep=50.0, tier=1, rep_updated_at=ten_days_ago
+        )
+    )
+    db_session.commit()
+    decayed = 105.0 * 0.99**10
+
+    member = db_session.get(Member, "0xlazy")
+    assert effective_rep(member) == pytest.approx(decayed, rel=1e-4)
+    assert effective_tier(member) == 1
+    assert state_gauges.snapshot(db_session)["forge_rep_total"] == pytest.approx(
+        decayed + 50.0 * 0.99**10, rel=1e-4
+    )
+
+    deploy_agent_with_staking(db_session, "0xlazy", "echo", 0.5)
+    member = db_session.get(Member, "0xlazy")
+    assert member.rep == pytest.approx(decayed / 2, rel=1e-4)
+    assert member.tier == 1
+    reasons = [h.reason for h in db_session.query(RepHistory).order_by(RepHistory.id)]
+    assert reasons == [LAZY_DECAY_REASON, "agent_staking"]
+    assert state_gauges.snapshot(db_session)["forge_rep_total"] == pytest.approx(
+        decayed / 2 + 50.0 * 0.99**10, rel=1e-4
+    )
+
+
+def test_lazy_compaction_keeps_effective_rep(db_session, lazy_decay):
+    db_session.add(
+        Member(
+            address="0xold",
+            name="Old",
+            rep=200.0,
+            tier=2,
+            rep_updated_at=datetime.utcnow() - timedelta(days=30),
+        )
+    )
+    db_session.commit()
+    before = effective_rep(db_session.get(Member, "0xold"))
+
+    report = run_bulk_decay(db_session, run_id="compact-test")
+
+    member = db_session.get(Member, "0xold")
+    assert report.processed == 1
+    assert member.rep == pytest.approx(before, rel=1e-4)
+    assert effective_rep(member) == pytest.approx(before, rel=1e-4)
+    assert member.tier == 2
+
+
+def test_tier_table_bisects_shipped_profile():
+    table = load_tier_table("citydao")
+    assert table.thresholds == (0.0, 10.0, 100.0, 500.0)
+    assert [table.tier_for(rep) for rep in (0, 9.99, 10, 99, 100, 499.9, 500, 1e9)] == [
+        0,
+        0,
+        1,
+        1,
+        2,
+        2,
+        3,
+        3,
+    ]
+    assert load_tier_table("citydao") is table
+    with pytest.raises(ValueError):
+        load_tier_table("no-such-profile")
+
+
+def test_retier_members_applies_changed_profile(db_session, tmp_path, monkeypatch):
+    (tmp_path / "tier-config.strict.json").write_text(
+        json.dumps(
+            {
+                "tiers": [
+                    {"id": 0, "minREP": 0},
+                    {"id": 1, "minREP": 50},
+                    {"id": 2, "minREP": 1000},
+                ]
+            }
+        )
+    )
+    monkeypatch.setenv("FORGE_CONFIG_DIR", str(tmp_path))
+    reload_tier_profiles()
+    _seed_members(db_session, [20.0, 60.0, 600.0])
+    db_session.query(Member).update({Member.tier: 1})
+    db_session.commit()
+
+    try:
+        assert retier_members(db_session, "strict") == 1
+    finally:
+        monkeypatch.delenv("FORGE_CONFIG_DIR")
+        reload_tier_profiles()
+
+    assert [m.tier for m in db_session.query(Member).order_by(Member.address)] == [
+        0,
+        1,
+        1,
+    ]
+    history = (
+        db_session.query(RepHistory)
+        .filter(RepHistory.reason == "tier_profile_changed")
+        .all()
+    )
+    assert sorted((h.memberaddress, h.tierafter) for h in history) == [("0x0000", 0)]
+
+
+def test_retier_members_uses_lazily_decayed_rep(db_session):
+    stale = datetime.utcnow() - timedelta(days=200)
+    db_session.add(
+        Member(address="0xstale", name="s", rep=150.0, tier=2, rep_updated_at=stale)
+    )
+    db_session.commit()
+
+    # 150 * 0.99^200 is about 20: a Builder, not the stored Manager.
+    assert retier_members(db_session, decay_rate=0.01) == 1
+    assert db_session.get(Member, "0xstale").tier == 1
+    assert db_session.get(Member, "0xstale").rep == 150.0
+
+
+def test_point_in_time_rep_from_snapshot_and_deltas(client, db_session, auth_headers):
+    start = datetime.utcnow() - timedelta(days=10)
+    db_session.add(
+        Member(address="0xpit", name="Pit", rep=130.0, tier=2, rep_updated_at=start)
+    )
+    for day, change in ((1, 50.0), (4, -20.0), (8, 100.0)):
+        db_session.add(
+            RepHistory(
+                memberaddress="0xpit",
+                repchange=change,
+                reason="test",
+                timestamp=start + timedelta(days=day),
+            )
+        )
+    db_session.commit()
+
+    # No snapshot yet: rebuilt backwards from the member row.
+    assert rep_at(db_session, "0xpit", start + timedelta(days=5)).rep == pytest.approx(
+        30.0
+    )
+    assert take_rep_snapshots(db_session, start + timedelta(days=2)) == 1
+    assert take_rep_snapshots(db_session, start + timedelta(days=2)) == 0
+    result = rep_at(db_session, "0xpit", start + timedelta(days=9))
+    assert result.rep == pytest.approx(130.0)
+    assert result.snapshot_at == start + timedelta(days=2)
+
+    assert compact_rep_history(db_session, retain_days=7) == {
+        "snapshots": 1,
+        "archived_history": 1,
+    }
+    assert db_session.query(RepHistory).count() == 2
+    # Before the cutoff the archived delta still counts.
+    assert rep_at(
+        db_session, "0xpit", start + timedelta(hours=12)
+    ).rep == pytest.approx(0.0)
+    resp = client.get(
+        "/reputation/0xpit/at",
+        params={"timestamp": (start + timedelta(days=6)).isoformat()},
+        headers=auth_headers(1),
+    )
+    assert resp.status_code == 200
+    assert resp.json()["rep"] == pytest.approx(30.0)
+    assert resp.json()["tier"] == 1
+    assert (
+        client.get(
+            "/reputation/0xnobody/at",
+            params={"timestamp": start.isoformat()},
+            headers=auth_headers(1),
+        ).status_code
+        == 404
+    )
+
+
+def _brute_gini(values):
+    xs = sorted(values)
+    n, total = len(xs), sum(xs)
+    return 2 * sum(i * x for i, x in enumerate(xs, start=1)) / (n * total) - (n + 1) / n
+
+
+def test_rank_index_matches_brute_force_under_updates():
+    rng = random.Random(7)
+    index = RankIndex(load=4)
+    index.load_items((f"m{i}", rng.uniform(0, 1000)) for i in range(50))
+    reps = {addr: index.rep_of(addr) for addr in (f"m{i}" for i in range(50))}
+    for step in range(300):
+        addr = f"m{rng.randrange(80)}"
+        if rng.random() < 0.2 and addr in reps:
+            index.remove(addr)
+            del reps[addr]
+        else:
+            reps[addr] = rng.uniform(0, 1000)
+            index.upsert(addr, reps[addr])
+
+    ordered = sorted(reps.items(), key=lambda kv: (kv[1], kv[0]), reverse=True)
+    assert index.top(5) == [(a, pytest.approx(r)) for a, r in ordered[:5]]
+    assert index.rank(ordered[17][0]) == 18
+    assert index.gini() == pytest.approx(_brute_gini(reps.values()))
+    assert index.count_at_least(500) == sum(r >= 500 for r in reps.values())
+    index.scale_by(0.5)
+    assert index.total == pytest.approx(sum(reps.values()) / 2)
+    assert index.gini() == pytest.approx(_brute_gini(reps.values()))
+
+
+def test_leaderboard_and_stats_follow_staking_and_decay(
+    client, db_session, auth_headers
+):
+    _seed_members(db_session, [1000.0, 300.0, 50.0, 5.0])
+
+    board = client.get(
+        "/reputation/leaderboard",
+        params={"limit": 2, "address": "0x0002"},
+        headers=auth_headers(0),
+    )
+    assert board.status_code == 200
+    assert [m["address"] for m in board.json()["top"]] == ["0x0000", "0x0001"]
+    assert board.json()["member"]["rank"] == 3
+
+    deploy_agent_with_staking(db_session, "0x0000", "echo", 0.8)  # 1000 -> 200
+    run_bulk_decay(db_session, daily_decay_rate=0.5, run_id="leaderboard-decay")
+    board = client.get(
+        "/reputation/leaderboard", params={"limit": 2}, headers=auth_headers(0)
+    ).json()
+    assert board["top"] == [
+        {"rank": 1, "address": "0x0001", "rep": pytest.approx(150.0)},
+        {"rank": 2, "address": "0x0000", "rep": pytest.approx(100.0)},
+    ]
+
+    stats = client.get("/reputation/stats", headers=auth_headers(0)).json()
+    assert stats["members"] == 4
+    assert stats["total_rep"] == pytest.approx(277.5)
+    assert stats["gini"] == pytest.approx(_brute_gini([150.0, 100.0, 25.0, 2.5]))
+    assert stats["tiers"] == {"0": 1, "1": 1, "2": 2, "3": 0}
+    assert stats["percentiles"]["p50"] == pytest.approx(25.0)
+
+
+def test_concurrent_stakes_for_one_owner_lose_no_updates(db_session):
+    db_session.add(Member(address="0xhot", name="Hot", rep=1000.0, tier=3))
+    db_session.commit()
+    errors = []
+
+    def _deploy():
+        db = SessionLocal()
+        try:
+            for _ in range(5):
+                deploy_agent_with_staking(db, "0xhot", "echo", 0.1)
+        except Exception as exc:  # surfaced below
+            errors.append(exc)
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=_deploy) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    db_session.expire_all()
+    owner = db_session.get(Member, "0xhot")
+    staked = [
+        a.ownerrep
+        for a in db_session.query(Agent).filter(Agent.owneraddress == "0xhot")
+    ]
+    assert len(staked) == 40
+    assert owner.rep == pytest.approx(1000.0 * 0.9**40)
+    assert owner.rep + sum(staked) == pytest.approx(1000.0)
+
+
+def test_batch_deploy_stakes_sequentially_in_one_transaction(
+    client, db_session, auth_headers
+):
+    db_session.add(Member(address="0xbatch", name="Batch", rep=1000.0, tier=3))
+    db_session.commit()
+
+    resp = client.post(
+        "/agents/deploy/batch",
+        json={
+            "owner_address": "0xbatch",
+            "agents": [{"agent_type": "echo", "stake_percentage": 0.5}] * 3,
+        },
+        headers=auth_headers(2),
+    )
+    assert resp.status_code == 200
+    assert [a["staked_rep"] for a in resp.json()["agents"]] == [500.0, 250.0, 125.0]
+    owner = db_session.get(Member, "0xbatch")
+    assert (owner.rep, owner.tier) == (125.0, 2)
+    history = (
+        db_session.query(RepHistory).filter(RepHistory.reason == "agent_staking").all()
+    )
+    assert [(h.tierbefore, h.tierafter) for h in history] == [(3, 3), (3, 2), (2, 2)]
+
+    with pytest.raises(ValueError):
+        deploy_agents_for_owner(db_session, "0xbatch", [("echo", 1.5)])
+    assert (
+        client.post(
+            "/agents/deploy",
+            json={"owner_address": "0xnobody", "agent_type": "echo"},
+            headers=auth_headers(2),
+        ).status_code
+        == 400
+    )
@@ -0,0 +1,135 @@
+import base64
+import hashlib
+
+import httpx
+import pytest
+
+from main import app, get_ipfs
+from storage.ipfs_client import AsyncIPFSStorage, ContentCache, ContentIntegrityError
+
+PAYLOAD = bytes(range(256)) * 1024
+
+
+def _fake_ipfs(request: httpx.Request) -> httpx.Response:
+    if request.url.path == "/api/v0/add":
+        assert request.headers["content-type"].startswith(
+            "multipart/form-data; boundary="
+        )
+        assert PAYLOAD in request.content
+        return httpx.Response(200, json={"Hash": "QmTestCid1"})
+    if request.url.path == "/api/v0/cat" and request.url.params["arg"] == "QmTestCid1":
+        return httpx.Response(200, content=PAYLOAD)
+    return httpx.Response(500, text="not found")
+
+
+def test_storage_streams_upload_and_download(client, auth_headers):
+    ipfs = AsyncIPFSStorage(
+        httpx.AsyncClient(transport=httpx.MockTransport(_fake_ipfs))
+    )
+    app.dependency_overrides[get_ipfs] = lambda: ipfs
+
+    def _chunks():
+        for i in range(0, len(PAYLOAD), 4096):
+            yield PAYLOAD[i : i + 4096]
+
+    uploaded = client.post(
+        "/storage/upload",
+        content=_chunks(),
+        headers={**auth_headers(1), "Content-Type": "application/octet-stream"},
+    )
+    assert uploaded.status_code == 200
+    assert uploaded.json() == {"cid": "QmTestCid1"}
+
+    downloaded = client.get("/storage/QmTestCid1")
+    assert downloaded.status_code == 200
+    assert downloaded.content == PAYLOAD
+
+
+def _raw_cid(data: bytes) -> str:
+    digest = hashlib.sha256(data).digest()
+    return "b" + base64.b32encode(b"\x01\x55\x12\x20" + digest).decode().lower().rstrip(
+        "="
+    )
+
+
+def test_cache_serves_repeat_reads_and_ranges_locally(client, tmp_path):
+    cid = _raw_cid(PAYLOAD)
+    calls = []
+
+    def _ipfs(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.params["arg"])
+        return httpx.Response(200, content=PAYLOAD)
+
+    ipfs = AsyncIPFSStorage(
+        httpx.AsyncClient(transport=httpx.MockTransport(_ipfs)),
+        cache=ContentCache(tmp_path, max_bytes=4 * len(PAYLOAD)),
+    )
+    app.dependency_overrides[get_ipfs] = lambda: ipfs
+
+    assert client.get(f"/storage/{cid}").content == PAYLOAD
+    second = client.get(f"/storage/{cid}")
+    assert second.content == PAYLOAD
+    assert second.headers["accept-ranges"] == "bytes"
+
+    partial = client.get(f"/storage/{cid}", headers={"Range": "bytes=10-19"})
+    assert partial.status_code == 206
+    assert partial.content == PAYLOAD[10:20]
+    assert partial.headers["content-range"] == f"bytes 10-19/{len(PAYLOAD)}"
+
+    suffix = client.get(f"/storage/{cid}", headers={"Range": "bytes=-5"})
+    assert suffix.content == PAYLOAD[-5:]
+    unsatisfiable = client.get(
+        f"/storage/{cid}", headers={"Range": f"bytes={len(PAYLOAD)}-"}
+    )
+    assert unsatisfiable.status_code == 416
+
+    assert calls == [cid]
+    assert client.get("/storage/..%2Fetc").status_code in (400, 404)
+
+
+def test_cache_rejects_corrupt_content_and_evicts_lru(tmp_path):
+    cache = ContentCache(tmp_path, max_bytes=10, max_entry_bytes=10)
+
+    bad = cache.begin(_raw_cid(b"expected"))
+    bad.write(b"tampered")
+    with pytest.raises(ContentIntegrityError):
+        bad.commit()
+    assert len(cache) == 0
+    # CIDv0 hashes the UnixFS DAG, not the bytes: never cached.
+    assert cache.begin("QmAAAAAAAA") is None
+
+    a, b, c = (_raw_cid(body) for body in (b"aaaa", b"bbbb", b"cccc"))
+    for cid, body in ((a, b"aaaa"), (b, b"bbbb"), (c, b"cccc")):
+        writer = cache.begin(cid)
+        writer.write(body)
+        writer.commit()
+    assert cache.lookup(a) is None
+    assert cache.total_bytes == 8
+
+    (tmp_path / c[-2:] / c).write_bytes(b"xxxx")
+    reloaded = ContentCache(tmp_path, max_bytes=10)
+    assert reloaded.lookup(c) is None
+    assert reloaded.lookup(b) is not None
+
+    # An entry evicted between lookup and open is a miss, not an error.
+    (tmp_path / b[-2:] / b).unlink()
+    assert reloaded.open_entry(b) is None
+    assert len(reloaded) == 0
+
+
+def test_corrupt_upstream_range_read_is_a_bad_gateway(client, tmp_path):
+    ipfs = AsyncIPFSStorage(
+        httpx.AsyncClient(
+            transport=httpx.MockTransport(
+                lambda request: httpx.Response(200, content=b"tampered")
+            )
+        ),
+        cache=ContentCache(tmp_path, max_bytes=1024),
+    )
+    app.dependency_overrides[get_ipfs] = lambda: ipfs
+
+    resp = client.get(
+        f"/storage/{_raw_cid(b'expected')}", headers={"Range": "bytes=0-3"}
+    )
+    assert resp.status_code == 502
+    assert len(ipfs.cache) == 0